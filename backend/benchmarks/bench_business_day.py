@@ -0,0 +1,61 @@
+"""
+业务日分桶微基准: 12pm 边界按日求和
+
+对比计算器原先的 Series.apply(lambda ts: ... strftime(...)) 逐行分桶
+与 utils.business_day.daily_sum 的向量化分桶 (仅对聚合后的日期格式化字符串)。
+
+用法 (在 backend 目录下):
+    python -m benchmarks.bench_business_day            # 默认 100 万行
+    python -m benchmarks.bench_business_day 5000000
+"""
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+from utils.business_day import daily_sum, BOUNDARY_POS
+
+TIMESTAMP_COL = 'Timestamp(UTC+8)'
+
+
+def _legacy(df: pd.DataFrame) -> pd.Series:
+    """原计算器的逐行业务日分桶"""
+    dates = df[TIMESTAMP_COL].apply(
+        lambda ts: (ts - pd.Timedelta(days=1)).strftime('%Y-%m-%d') if ts.hour < 12 else ts.strftime('%Y-%m-%d')
+    ).rename('date')
+    return df.groupby(dates)['SOL Received'].sum()
+
+
+def _vectorised(df: pd.DataFrame) -> pd.Series:
+    return daily_sum(df, 'SOL Received', BOUNDARY_POS)
+
+
+def _timeit(fn, df: pd.DataFrame, repeat: int = 3) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(df)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main(rows: int) -> None:
+    rng = np.random.default_rng(0)
+    start = pd.Timestamp('2025-01-01').value
+    df = pd.DataFrame({
+        TIMESTAMP_COL: pd.to_datetime(np.sort(rng.integers(start, start + 90 * 86400 * 10**9, rows))),
+        'SOL Received': rng.random(rows)
+    })
+
+    pd.testing.assert_series_equal(_legacy(df), _vectorised(df), check_index_type=False)
+
+    legacy = _timeit(_legacy, df, repeat=1)
+    fast = _timeit(_vectorised, df)
+    print(f"rows={rows:,}")
+    print(f"apply + strftime      : {legacy * 1000:8.2f} ms")
+    print(f"daily_sum (datetime64): {fast * 1000:8.2f} ms")
+    print(f"speedup               : {legacy / fast:8.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,54 @@
+"""
+时间戳规范化微基准: UTC -> UTC+8
+
+对比加载器原先的 tz_localize('UTC') -> tz_convert('Asia/Shanghai') -> tz_localize(None)
+与 utils.db_loader.to_utc8 的固定偏移 int64 运算。
+
+用法 (在 backend 目录下):
+    python -m benchmarks.bench_timestamp            # 默认 100 万行
+    python -m benchmarks.bench_timestamp 5000000
+"""
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+from utils.db_loader import to_utc8
+
+
+def _legacy(ts: pd.Series) -> pd.Series:
+    """原加载器的时区转换链"""
+    ts = pd.to_datetime(ts)
+    if ts.dt.tz is None:
+        ts = ts.dt.tz_localize('UTC')
+    else:
+        ts = ts.dt.tz_convert('UTC')
+    return ts.dt.tz_convert('Asia/Shanghai').dt.tz_localize(None)
+
+
+def _timeit(fn, ts: pd.Series, repeat: int = 5) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(ts)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main(rows: int) -> None:
+    rng = np.random.default_rng(0)
+    start = pd.Timestamp('2025-01-01').value
+    ts = pd.Series(pd.to_datetime(np.sort(rng.integers(start, start + 90 * 86400 * 10**9, rows))))
+    
+    assert _legacy(ts).equals(to_utc8(ts).rename(None))
+    
+    legacy = _timeit(_legacy, ts)
+    fast = _timeit(to_utc8, ts)
+    print(f"rows={rows:,}")
+    print(f"tz_localize/tz_convert : {legacy * 1000:8.2f} ms")
+    print(f"to_utc8 (int64 offset) : {fast * 1000:8.2f} ms")
+    print(f"speedup                : {legacy / fast:8.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -1,221 +1,898 @@
 """
 异常检测计算模块
 使用 SQL 直接聚合数据并应用异常判定规则
+
+规则以数据形式定义 (AnomalyRule)，同一份定义编译为 SQL HAVING 谓词 (在数据库中预筛地址)
+和 pandas 向量化判定 (对预筛结果分类)，阈值只写一次。
 """
+import hashlib
+import operator
+import os
+import time
+import asyncio
 import pandas as pd
+import numpy as np
 import logging
-from typing import Dict, Any, List
+from concurrent.futures import wait
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Tuple
 from sqlalchemy import text
 from utils.db_loader import get_db_engine
+from utils.async_db_loader import get_async_db_engine, async_connect
+from utils.concurrent_fetch import get_fetch_executor
+from utils.business_day import format_days
+from utils import anomaly_store
 
 logger = logging.getLogger(__name__)
 
+
+# ============================================
+# 规则定义
+# ============================================
+
+# 比较运算符 -> (SQL 运算符, Python 运算)
+_OPERATORS = {
+    '>': ('>', operator.gt),
+    '>=': ('>=', operator.ge),
+    '<': ('<', operator.lt),
+    '<=': ('<=', operator.le),
+    '==': ('=', operator.eq),
+    '!=': ('<>', operator.ne),
+}
+
+
+def _business_day_sql(col: str, utc_offset_hours: int) -> str:
+    """UTC 时间列 -> 业务日 (UTC 时间减去业务日起点偏移后取日期)"""
+    if utc_offset_hours > 0:
+        return f"DATE({col} - INTERVAL {utc_offset_hours} HOUR)"
+    if utc_offset_hours < 0:
+        return f"DATE({col} + INTERVAL {-utc_offset_hours} HOUR)"
+    return f"DATE({col})"
+
+
+def _window(start_date: str, end_date: str, utc_offset_hours: int) -> Tuple[pd.Timestamp, pd.Timestamp]:
+    """业务日 [start_date, end_date] 对应的 UTC 查询窗口 [start, end)"""
+    start = pd.to_datetime(start_date) + pd.Timedelta(hours=utc_offset_hours)
+    end = pd.to_datetime(end_date) + pd.Timedelta(days=1, hours=utc_offset_hours)
+    return start, end
+
+
+def _sql_time(ts: pd.Timestamp) -> str:
+    return ts.strftime('%Y-%m-%d %H:%M:%S')
+
+
+class AnomalyRule:
+    """
+    单条异常判定规则
+
+    Args:
+        type: 异常类型，如 TS_OVER_CLAIM
+        severity: high / medium / low
+        when: 判定条件 (析取范式)，外层列表为 OR，内层为 AND，
+              每项为 (指标名, 运算符, 阈值)，如 [[('claims', '<', 5), ('draws', '>=', 1)]]
+        description: 描述模板，用指标名填充，如 "领取{claims}次"
+        exclusive: 命中后不再判定同一检测器中后续的规则
+    """
+
+    def __init__(
+        self,
+        type: str,
+        severity: str,
+        when: List[List[Tuple[str, str, float]]],
+        description: str,
+        exclusive: bool = False
+    ) -> None:
+        self.type = type
+        self.severity = severity
+        self.when = when
+        self.description = description
+        self.exclusive = exclusive
+
+    def to_sql(self) -> str:
+        """编译为 SQL 谓词 (可用于 HAVING，指标名为 SELECT 别名)"""
+        return " OR ".join(
+            "(" + " AND ".join(f"{metric} {_OPERATORS[op][0]} {value}" for metric, op, value in clause) + ")"
+            for clause in self.when
+        )
+
+    def evaluate(self, df: pd.DataFrame) -> np.ndarray:
+        """对聚合结果向量化判定，返回布尔数组"""
+        hit = np.zeros(len(df), dtype=bool)
+        for clause in self.when:
+            match = np.ones(len(df), dtype=bool)
+            for metric, op, value in clause:
+                match &= _OPERATORS[op][1](df[metric].to_numpy(), value)
+            hit |= match
+        return hit
+
+
+class BaseAnomalyDetector:
+    """
+    检测器公共部分: 规则、输出映射、版本与业务日关闭判断
+
+    子类负责生成查询 (to_sql) 及其参数 (params)，查询结果需包含 biz_date、address 和全部 metrics 列。
+
+    Args:
+        label: 检测器名称 (日志、持久化使用)
+        utc_offset_hours: 业务日起点相对目标日期 UTC 00:00 的偏移，用于判断业务日是否已关闭
+        metrics: 按 (业务日, 地址) 聚合的计数指标 {指标名: SQL 聚合表达式}
+        rules: 判定规则，按顺序判定
+        data: 输出 data 字段 {输出键: 指标名}
+        detail_col: 若给定，查询额外返回命中行的该列逐条取值 (detail 列)
+    """
+
+    def __init__(
+        self,
+        label: str,
+        utc_offset_hours: int,
+        metrics: Dict[str, str],
+        rules: List[AnomalyRule],
+        data: Dict[str, str],
+        detail_col: Optional[str] = None
+    ) -> None:
+        self.label = label
+        self.utc_offset_hours = utc_offset_hours
+        self.metrics = metrics
+        self.rules = rules
+        self.data = data
+        self.detail_col = detail_col
+
+    @property
+    def version(self) -> str:
+        """检测器版本: 由查询与规则定义计算，定义变更后已持久化的旧结果自动失效"""
+        return hashlib.sha1(repr(self._definition()).encode('utf-8')).hexdigest()[:12]
+
+    def _definition(self) -> tuple:
+        raise NotImplementedError
+
+    def _rule_definition(self) -> list:
+        return [(r.type, r.severity, r.when, r.description, r.exclusive) for r in self.rules]
+
+    def last_closed_day(self, now_utc: pd.Timestamp, lag: pd.Timedelta) -> str:
+        """截至 now_utc 已关闭 (且超过 lag 的迟到缓冲) 的最后一个业务日"""
+        day = (now_utc - lag - pd.Timedelta(hours=self.utc_offset_hours)).normalize() - pd.Timedelta(days=1)
+        return day.strftime('%Y-%m-%d')
+
+    def params(self, start_date: str, end_date: str) -> Dict[str, str]:
+        raise NotImplementedError
+
+    def to_sql(self) -> str:
+        raise NotImplementedError
+
+
+class AnomalyDetector(BaseAnomalyDetector):
+    """
+    单个模块 (单表) 的异常检测器
+
+    Args:
+        label: 模块名称 (日志使用)
+        table: 数据库表名 (按 to_user 聚合，按 block_time_dt 过滤)
+        utc_offset_hours: 业务日起点相对目标日期 UTC 00:00 的偏移 (TS 8:00 -> 0, POS 12:00 -> 4)
+        metrics: 按地址聚合的计数指标 {指标名: SQL 聚合表达式}
+        rules: 判定规则，按顺序判定
+        data: 输出 data 字段 {输出键: 指标名}
+        detail_col: 若给定，额外返回命中地址的该列逐条取值 (按时间排序)，
+            以逗号拼接的文本 (与 GROUP_CONCAT 一致) 作为 amounts，数值列表作为 amountList
+    """
+
+    def __init__(
+        self,
+        label: str,
+        table: str,
+        utc_offset_hours: int,
+        metrics: Dict[str, str],
+        rules: List[AnomalyRule],
+        data: Dict[str, str],
+        detail_col: Optional[str] = None
+    ) -> None:
+        super().__init__(label, utc_offset_hours, metrics, rules, data, detail_col)
+        self.table = table
+
+    def _definition(self) -> tuple:
+        return (
+            self.table, self.utc_offset_hours, self.metrics, self.data, self.detail_col,
+            self._rule_definition()
+        )
+
+    def params(self, start_date: str, end_date: str) -> Dict[str, str]:
+        """业务日 [start_date, end_date] 对应的查询参数 (UTC 窗口)"""
+        start, end = _window(start_date, end_date, self.utc_offset_hours)
+        return {"start": _sql_time(start), "end": _sql_time(end)}
+
+    def day_sql(self, col: str) -> str:
+        return _business_day_sql(col, self.utc_offset_hours)
+
+    def to_sql(self) -> str:
+        """按 (业务日, 地址) 一次聚合整个日期范围，并用全部规则的并集预筛"""
+        select = ",\n        ".join(f"{expr} as {name}" for name, expr in self.metrics.items())
+        having = " OR\n        ".join(f"({rule.to_sql()})" for rule in self.rules)
+        query = f"""
+    SELECT
+        {self.day_sql('block_time_dt')} as biz_date,
+        to_user as address,
+        {select}
+    FROM {self.table}
+    WHERE block_time_dt >= :start AND block_time_dt < :end
+    GROUP BY biz_date, to_user
+    HAVING
+        {having}
+    """
+        if self.detail_col is None:
+            return query + "ORDER BY biz_date, address\n    "
+        # 命中 (业务日, 地址) 的逐条明细，按业务日、地址和时间排序
+        return f"""
+    SELECT d.*, CAST(r.{self.detail_col} AS CHAR) as detail
+    FROM ({query}) d
+    JOIN {self.table} r
+      ON r.to_user = d.address AND {self.day_sql('r.block_time_dt')} = d.biz_date
+    WHERE r.block_time_dt >= :start AND r.block_time_dt < :end
+    ORDER BY d.biz_date, d.address, r.block_time_dt
+    """
+
+
+TS_DETECTOR = AnomalyDetector(
+    label='TS',
+    table='take_a_SHIT',
+    utc_offset_hours=0,
+    metrics={
+        # TS 领取次数 (Claims): amount IN (500, 1500)
+        'claims': "SUM(CASE WHEN amount IN (500, 1500) THEN 1 ELSE 0 END)",
+        # 抽奖次数 (Draws): amount NOT IN (500, 1500, 50, 150, 25, 75)
+        'draws': "SUM(CASE WHEN amount NOT IN (500, 1500, 50, 150, 25, 75) THEN 1 ELSE 0 END)",
+    },
+    rules=[
+        # 1. 严重错误 (High Risk)，优先于后续逻辑错误
+        AnomalyRule(
+            'TS_LUCKY_DRAW_OVER', 'high',
+            [[('draws', '>', 3)]],
+            "严重错误: 抽奖次数溢出 ({draws}次, 标准上限3次)",
+            exclusive=True
+        ),
+        # 2. 次数超限 (Medium Risk)
+        AnomalyRule(
+            'TS_OVER_CLAIM', 'medium',
+            [[('claims', '>', 20)]],
+            "TS 领取次数超限: {claims}次 (标准上限20次)"
+        ),
+        # 3. 抽奖逻辑错误 (Medium Risk)
+        AnomalyRule(
+            'TS_LOGIC_ERROR', 'medium',
+            [
+                [('claims', '<', 5), ('draws', '>=', 1)],
+                [('claims', '>=', 5), ('claims', '<', 10), ('draws', '>=', 2)],
+                [('claims', '>=', 10), ('claims', '<', 20), ('draws', '==', 3)],
+            ],
+            "抽奖逻辑不匹配: 领取{claims}次但抽奖{draws}次 (未达预期收益)"
+        ),
+    ],
+    data={'luckyDraws': 'draws', 'claims': 'claims'}
+)
+
+POS_DETECTOR = AnomalyDetector(
+    label='POS',
+    table='shit_pos_rewards',
+    utc_offset_hours=4,
+    metrics={'count': "COUNT(*)"},
+    rules=[
+        AnomalyRule(
+            'POS_DUPLICATE', 'high',
+            [[('count', '>', 1)]],
+            "POS 同日重复领取: {count}次 (金额: {amounts})"
+        ),
+    ],
+    data={'count': 'count', 'amounts': 'amounts', 'amountList': 'amountList'},
+    detail_col='amount'
+)
+
+STAKING_DETECTOR = AnomalyDetector(
+    label='Staking',
+    table='shit_staking_rewards',
+    utc_offset_hours=4,
+    metrics={'count': "COUNT(*)"},
+    rules=[
+        AnomalyRule(
+            'STAKING_DUPLICATE', 'high',
+            [[('count', '>', 1)]],
+            "质押奖励同日重复领取: {count}次 (金额: {amounts})"
+        ),
+    ],
+    data={'count': 'count', 'amounts': 'amounts', 'amountList': 'amountList'},
+    detail_col='amount'
+)
+
+
+class AnomalySource:
+    """
+    跨模块检测器的一个数据来源 (一张表按 (业务日, 地址) 的预聚合)
+
+    Args:
+        table: 数据库表名 (按 to_user 聚合，按 block_time_dt 过滤)
+        utc_offset_hours: 该模块业务日起点相对 UTC 00:00 的偏移 (ShitCode 自然日为 -8)
+        metrics: 该表贡献的计数指标 {指标名: SQL 聚合表达式}
+    """
+
+    def __init__(self, table: str, utc_offset_hours: int, metrics: Dict[str, str]) -> None:
+        self.table = table
+        self.utc_offset_hours = utc_offset_hours
+        self.metrics = metrics
+
+
+class CrossModuleDetector(BaseAnomalyDetector):
+    """
+    跨模块检测器: 各来源表按自身业务日边界预聚合为 (业务日, 地址) 活动向量，
+    UNION ALL 后在同一次查询中合并并按规则预筛。
+
+    每个来源的指标在其他来源的分支中补 0；modules 为同日有记录 (COUNT(*) > 0) 的模块数。
+    业务日关闭时间取各来源中最晚的边界。
+    """
+
+    def __init__(
+        self,
+        label: str,
+        sources: List[AnomalySource],
+        rules: List[AnomalyRule],
+        data: Dict[str, str]
+    ) -> None:
+        self.sources = sources
+        # 分支列加 src_ 前缀，避免与外层同名别名在 HAVING 中产生歧义
+        metrics = {name: f"SUM(src_{name})" for name in self._source_metric_names(sources)}
+        metrics['modules'] = " + ".join(
+            f"CASE WHEN SUM(src_rows_{i}) > 0 THEN 1 ELSE 0 END" for i in range(len(sources))
+        )
+        super().__init__(
+            label=label,
+            utc_offset_hours=max(source.utc_offset_hours for source in sources),
+            metrics=metrics,
+            rules=rules,
+            data=data
+        )
+
+    @staticmethod
+    def _source_metric_names(sources: List[AnomalySource]) -> List[str]:
+        return [name for source in sources for name in source.metrics]
+
+    def _definition(self) -> tuple:
+        return (
+            self.utc_offset_hours, self.metrics, self.data, self._rule_definition(),
+            [(source.table, source.utc_offset_hours, source.metrics) for source in self.sources]
+        )
+
+    def params(self, start_date: str, end_date: str) -> Dict[str, str]:
+        """每个来源各自的 UTC 窗口 (start_i / end_i)"""
+        params = {}
+        for i, source in enumerate(self.sources):
+            start, end = _window(start_date, end_date, source.utc_offset_hours)
+            params[f"start_{i}"] = _sql_time(start)
+            params[f"end_{i}"] = _sql_time(end)
+        return params
+
+    def to_sql(self) -> str:
+        names = self._source_metric_names(self.sources)
+        branches = []
+        for i, source in enumerate(self.sources):
+            columns = [
+                f"{source.metrics[name]} as src_{name}" if name in source.metrics else f"0 as src_{name}"
+                for name in names
+            ]
+            # 模块是否有活动按该表的全部记录判断
+            columns += [
+                f"COUNT(*) as src_rows_{j}" if j == i else f"0 as src_rows_{j}"
+                for j in range(len(self.sources))
+            ]
+            branches.append(f"""
+        SELECT {_business_day_sql('block_time_dt', source.utc_offset_hours)} as biz_date, to_user as address, {", ".join(columns)}
+        FROM {source.table}
+        WHERE block_time_dt >= :start_{i} AND block_time_dt < :end_{i}
+        GROUP BY biz_date, to_user""")
+        union = "\n        UNION ALL".join(branches)
+        select = ",\n        ".join(f"{expr} as {name}" for name, expr in self.metrics.items())
+        having = " OR\n        ".join(f"({rule.to_sql()})" for rule in self.rules)
+        return f"""
+    SELECT
+        biz_date,
+        address,
+        {select}
+    FROM ({union}
+    ) activity
+    GROUP BY biz_date, address
+    HAVING
+        {having}
+    ORDER BY biz_date, address
+    """
+
+
+CROSS_MODULE_DETECTOR = CrossModuleDetector(
+    label='Cross',
+    sources=[
+        AnomalySource('take_a_SHIT', 0, {
+            'ts_claims': "SUM(CASE WHEN amount IN (500, 1500) THEN 1 ELSE 0 END)",
+            'ts_draws': "SUM(CASE WHEN amount NOT IN (500, 1500, 50, 150, 25, 75) THEN 1 ELSE 0 END)",
+        }),
+        AnomalySource('shit_pos_rewards', 4, {'pos_claims': "COUNT(*)"}),
+        AnomalySource('shit_staking_rewards', 4, {'staking_claims': "COUNT(*)"}),
+        # ShitCode 为自然日 (UTC+8 00:00)，对应 UTC 前一日 16:00
+        AnomalySource('SHIT_code', -8, {'shitcode_claims': "COUNT(*)"}),
+    ],
+    rules=[
+        # 同一地址同一业务日在多个模块同时异常: 单模块检测器各自只看到一半，
+        # 这里把相关联的异常合并为一条记录。每个条件都要求至少两个模块越过各自的单模块上限
+        # (POS / 质押重复领取、TS 领取超过 20 次或抽奖超过 3 次)，合规使用不会命中。
+        # 1. POS 与质押奖励同日都重复领取 (High Risk)，命中后不再判定下一条
+        AnomalyRule(
+            'CROSS_MODULE_DUPLICATE', 'high',
+            [[('pos_claims', '>', 1), ('staking_claims', '>', 1)]],
+            "跨模块重复领取: 同日 POS {pos_claims}次、质押 {staking_claims}次 "
+            "(TS 领取{ts_claims}次/抽奖{ts_draws}次, ShitCode {shitcode_claims}次)",
+            exclusive=True
+        ),
+        # 2. POS 或质押重复领取的同时 TS 超限 (Medium Risk)
+        AnomalyRule(
+            'CROSS_MODULE_ANOMALY', 'medium',
+            [
+                [('pos_claims', '>', 1), ('ts_claims', '>', 20)],
+                [('pos_claims', '>', 1), ('ts_draws', '>', 3)],
+                [('staking_claims', '>', 1), ('ts_claims', '>', 20)],
+                [('staking_claims', '>', 1), ('ts_draws', '>', 3)],
+            ],
+            "跨模块同日异常: 奖励重复领取 (POS {pos_claims}次, 质押 {staking_claims}次) "
+            "且 TS 超限 (领取{ts_claims}次/抽奖{ts_draws}次)"
+        ),
+    ],
+    data={
+        'modules': 'modules',
+        'claims': 'ts_claims',
+        'luckyDraws': 'ts_draws',
+        'posClaims': 'pos_claims',
+        'stakingClaims': 'staking_claims',
+        'shitcodeClaims': 'shitcode_claims',
+    }
+)
+
+# TS 周期: T 08:00 到 T+1 08:00 (UTC+8)，对应 UTC T 00:00 到 T+1 00:00
+# POS / Staking 周期: T 12:00 到 T+1 12:00 (UTC+8)，对应 UTC T 04:00 到 T+1 04:00
+# ShitCode 周期: 自然日 (UTC+8)，对应 UTC T-1 16:00 到 T 16:00 (仅跨模块检测器使用)
+DETECTORS = [TS_DETECTOR, POS_DETECTOR, STAKING_DETECTOR, CROSS_MODULE_DETECTOR]
+
+
+
+def _detector_timeout() -> float:
+    """单次检测的时间上限 (秒)，ANOMALY_DETECTOR_TIMEOUT 配置，默认 30"""
+    return float(os.getenv("ANOMALY_DETECTOR_TIMEOUT", 30))
+
+
+def _fill_timeout() -> float:
+    """后台填充单个检测器的查询时间上限 (秒)，ANOMALY_STORE_FILL_TIMEOUT 配置，默认 300"""
+    return float(os.getenv("ANOMALY_STORE_FILL_TIMEOUT", 300))
+
+
+def _with_time_limit(sql: str, seconds: float, dialect=None) -> str:
+    """
+    给查询加数据库执行时间上限，超时由数据库终止查询 (抛出异常)
+
+    MySQL 在最外层 SELECT 上加 MAX_EXECUTION_TIME 优化器提示；
+    MariaDB 忽略该提示，改用 SET STATEMENT max_statement_time=... FOR。
+    dialect 取自已建立的连接 (首次连接后才能区分 MariaDB)；/*+ ... */ 在其他数据库中只是注释。
+    """
+    if getattr(dialect, 'is_mariadb', False):
+        return f"SET STATEMENT max_statement_time={seconds:g} FOR {sql.strip()}"
+    head, sep, tail = sql.partition("SELECT")
+    return f"{head}{sep} /*+ MAX_EXECUTION_TIME({int(seconds * 1000)}) */{tail}"
+
+
+# ============================================
+# 检测
+# ============================================
+
 def calculate_anomalies(date_str: str) -> Dict[str, Any]:
     """
     计算指定日期的异常记录 (SQL 版)
-    
+
     Args:
         date_str: 目标日期 YYYY-MM-DD
-        
+
     Returns:
         包含 summary 和 anomalies 列表的字典
     """
+    return calculate_anomalies_range(date_str, date_str)
+
+
+def calculate_anomalies_range(start_date: str, end_date: str) -> Dict[str, Any]:
+    """
+    计算日期范围内每个业务日的异常记录 (SQL 版)
+
+    每个检测器对整个范围只执行一次按 (业务日, 地址) 分组的查询，
+    TS 以 08:00 为业务日边界，POS / Staking 以 12:00 为边界，
+    跨模块检测器中 ShitCode 以 00:00 (自然日) 为边界。
+
+    Args:
+        start_date: 开始日期 YYYY-MM-DD
+        end_date: 结束日期 YYYY-MM-DD (包含)
+
+    Returns:
+        包含 summary 和 anomalies 列表的字典，anomalies 按业务日排序，同日内按检测器顺序
+    """
     engine = get_db_engine()
     if engine is None:
-        return {"summary": {"totalCount": 0, "highRiskCount": 0, "mediumRiskCount": 0, "lowRiskCount": 0}, "anomalies": []}
-    
+        return {"summary": _summarize([]), "anomalies": []}
+
+    # 检测器之间相互独立，在进程级共享的有界线程池中并行执行，并发请求不会额外创建线程。
+    # 查询带数据库执行时间上限，超时由数据库终止后线程即归还线程池；
+    # 这里最多等待 timeout 秒 (多等 1 秒，让数据库终止的查询以错误形式返回)，
+    # 仍在排队未开始的检测器取消，未返回的检测器跳过。
+    start_total = time.time()
+    timeout = _detector_timeout()
+    executor = get_fetch_executor()
+    futures = [
+        executor.submit(_run_detector, engine, detector, start_date, end_date, timeout)
+        for detector in DETECTORS
+    ]
+    _, not_done = wait(futures, timeout=timeout + 1)
+    for future in not_done:
+        future.cancel()
+
+    # 按检测器顺序收集结果；未按时返回的检测器记录日志并跳过，不影响其他检测器
     anomalies = []
-    
-    # 基础日期对象
-    base_dt = pd.to_datetime(date_str)
-    
-    # 1. TS 异常检测 (8:00 AM 边界)
-    # TS 周期: T 08:00 到 T+1 08:00 (UTC+8)
-    # 数据库存储的是 UTC，所以对应 UTC: T 00:00 到 T+1 00:00
-    ts_start_utc = base_dt  # UTC+8 08:00 -> UTC 00:00
-    ts_end_utc = base_dt + pd.Timedelta(days=1)
-    
-    ts_anomalies = _detect_ts_anomalies_sql(engine, ts_start_utc, ts_end_utc, date_str)
-    anomalies.extend(ts_anomalies)
-    
-    # 2. POS 异常检测 (12:00 PM 边界)
-    # POS 周期: T 12:00 到 T+1 12:00 (UTC+8)
-    # 对应 UTC: T 04:00 到 T+1 04:00
-    pos_start_utc = base_dt + pd.Timedelta(hours=4)
-    pos_end_utc = pos_start_utc + pd.Timedelta(days=1)
-    
-    pos_anomalies = _detect_pos_anomalies_sql(engine, pos_start_utc, pos_end_utc, date_str)
-    anomalies.extend(pos_anomalies)
-    
-    # 3. Staking 异常检测 (12:00 PM 边界)
-    # Staking 周期: T 12:00 到 T+1 12:00 (UTC+8)
-    # 对应 UTC: T 04:00 到 T+1 04:00
-    staking_start_utc = base_dt + pd.Timedelta(hours=4)
-    staking_end_utc = staking_start_utc + pd.Timedelta(days=1)
-    
-    staking_anomalies = _detect_staking_anomalies_sql(engine, staking_start_utc, staking_end_utc, date_str)
-    anomalies.extend(staking_anomalies)
-    
-    # 汇总统计
-    summary = {
-        "totalCount": len(anomalies),
-        "highRiskCount": len([a for a in anomalies if a["severity"] == "high"]),
-        "mediumRiskCount": len([a for a in anomalies if a["severity"] == "medium"]),
-        "lowRiskCount": len([a for a in anomalies if a["severity"] == "low"])
+    for detector, future in zip(DETECTORS, futures):
+        if future.cancelled() or not future.done():
+            logger.error(f"{detector.label} 异常检测超时 (>{timeout:.0f}s)，本次结果不包含该检测器")
+            continue
+        anomalies.extend(future.result())
+    logger.info(f"[Perf] 异常检测总计耗时: {time.time() - start_total:.2f}s")
+
+    # 稳定排序: 同一业务日内保持检测器顺序
+    anomalies.sort(key=lambda a: a["date"])
+
+    return {
+        "summary": _summarize(anomalies),
+        "anomalies": anomalies
     }
-    
+
+
+async def calculate_anomalies_async(date_str: str) -> Dict[str, Any]:
+    """calculate_anomalies 的异步版本，参数与返回值相同"""
+    return await calculate_anomalies_range_async(date_str, date_str)
+
+
+async def calculate_anomalies_range_async(start_date: str, end_date: str) -> Dict[str, Any]:
+    """
+    calculate_anomalies_range 的异步版本，参数与返回值相同
+
+    各检测器的查询经异步引擎并发执行，不占用线程；每个检测器以 asyncio.wait_for 限时，
+    超时即取消查询并归还连接。异常存储 (本地 SQLite) 的读写在线程中执行。
+    异步引擎不可用时在线程中执行同步版本。
+    """
+    engine = get_async_db_engine()
+    if engine is None:
+        return await asyncio.to_thread(calculate_anomalies_range, start_date, end_date)
+
+    start_total = time.time()
+    timeout = _detector_timeout()
+    results = await asyncio.gather(*(
+        _run_detector_async(engine, detector, start_date, end_date, timeout)
+        for detector in DETECTORS
+    ))
+    anomalies = [record for records in results for record in records]
+    logger.info(f"[Perf] 异常检测总计耗时: {time.time() - start_total:.2f}s")
+
+    # 稳定排序: 同一业务日内保持检测器顺序
+    anomalies.sort(key=lambda a: a["date"])
+
     return {
-        "summary": summary,
+        "summary": _summarize(anomalies),
         "anomalies": anomalies
     }
 
-def _detect_ts_anomalies_sql(engine, start_utc, end_utc, date_label):
-    """使用 SQL 检测 TS 异常"""
-    # SQL 逻辑：聚合 draw 次数和 claim 次数
-    # TS 领取次数 (Claims): amount IN (500, 1500)
-    # 抽奖次数 (Draws): amount NOT IN (500, 1500, 50, 150, 25, 75)
-    query = """
-    SELECT 
-        to_user as address,
-        SUM(CASE WHEN amount IN (500, 1500) THEN 1 ELSE 0 END) as claims,
-        SUM(CASE WHEN amount NOT IN (500, 1500, 50, 150, 25, 75) THEN 1 ELSE 0 END) as draws
-    FROM take_a_SHIT
-    WHERE block_time_dt >= :start AND block_time_dt < :end
-    GROUP BY to_user
-    HAVING 
-        draws > 3 OR 
-        claims > 20 OR
-        (claims < 5 AND draws >= 1) OR
-        (claims >= 5 AND claims < 10 AND draws >= 2) OR
-        (claims >= 10 AND claims < 20 AND draws = 3)
-    """
-    
-    res = []
+
+def get_address_anomalies(
+    address: str,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    查询某地址的全部异常记录 (TS / POS / Staking 单模块检测器及跨模块检测器)
+
+    从异常存储按地址索引点查询 (覆盖后台已填充的已关闭业务日，当前规则版本)，
+    不扫描原始日志。
+
+    Args:
+        address: 钱包地址
+        start_date / end_date: 可选的业务日范围 YYYY-MM-DD (包含)
+
+    Returns:
+        包含 summary 和 anomalies 列表的字典，anomalies 按业务日排序
+    """
+    if not anomaly_store.is_store_enabled():
+        logger.warning("异常存储未启用 (需设置 ANOMALY_STORE=1)，无法查询地址历史")
+        return {"summary": _summarize([]), "anomalies": []}
+
+    versions = {detector.label: detector.version for detector in DETECTORS}
+    anomalies = anomaly_store.load_address(address, versions, start_date, end_date)
+    return {
+        "summary": _summarize(anomalies),
+        "anomalies": anomalies
+    }
+
+
+def _summarize(anomalies: List[Dict[str, Any]]) -> Dict[str, int]:
+    """汇总统计"""
+    severities = pd.Series([a["severity"] for a in anomalies], dtype=object)
+    counts = severities.value_counts()
+    return {
+        "totalCount": len(anomalies),
+        "highRiskCount": int(counts.get("high", 0)),
+        "mediumRiskCount": int(counts.get("medium", 0)),
+        "lowRiskCount": int(counts.get("low", 0))
+    }
+
+
+def _run_detector(
+    engine, detector: BaseAnomalyDetector, start_date: str, end_date: str, time_limit: float
+) -> List[Dict[str, Any]]:
+    """执行检测器 (已关闭的业务日优先读取持久化结果)，失败或超时时记录日志并返回空列表"""
+    t0 = time.time()
     try:
-        with engine.connect() as conn:
-            df = pd.read_sql(text(query), conn, params={
-                "start": start_utc.strftime('%Y-%m-%d %H:%M:%S'),
-                "end": end_utc.strftime('%Y-%m-%d %H:%M:%S')
-            })
-            
-        for _, row in df.iterrows():
-            addr = row['address']
-            claims = int(row['claims'])
-            draws = int(row['draws'])
-            
-            # 1. 严重错误 (High Risk)
-            if draws > 3:
-                res.append({
-                    "date": date_label,
-                    "address": addr,
-                    "type": "TS_LUCKY_DRAW_OVER",
-                    "description": f"严重错误: 抽奖次数溢出 ({draws}次, 标准上限3次)",
-                    "severity": "high",
-                    "data": {"luckyDraws": draws, "claims": claims}
-                })
-                # 严重错误优先，不再判定后续逻辑错误
-                continue
-
-            # 2. 次数超限 (Medium Risk)
-            if claims > 20:
-                res.append({
-                    "date": date_label,
-                    "address": addr,
-                    "type": "TS_OVER_CLAIM",
-                    "description": f"TS 领取次数超限: {claims}次 (标准上限20次)",
-                    "severity": "medium",
-                    "data": {"luckyDraws": draws, "claims": claims}
-                })
-
-            # 3. 抽奖逻辑错误 (Medium Risk) - 合并检测
-            is_logic_error = (
-                (claims < 5 and draws >= 1) or
-                (5 <= claims < 10 and draws >= 2) or
-                (10 <= claims < 20 and draws == 3)
-            )
-
-            if is_logic_error:
-                res.append({
-                    "date": date_label,
-                    "address": addr,
-                    "type": "TS_LOGIC_ERROR",
-                    "description": f"抽奖逻辑不匹配: 领取{claims}次但抽奖{draws}次 (未达预期收益)",
-                    "severity": "medium",
-                    "data": {"luckyDraws": draws, "claims": claims}
-                })
+        if anomaly_store.is_store_enabled():
+            result = _detect_with_store(engine, detector, start_date, end_date, time_limit)
+        else:
+            result = _detect(engine, detector, start_date, end_date, time_limit)
+        logger.info(f"[Perf] {detector.label} 异常检测耗时: {time.time() - t0:.2f}s ({len(result)} 条)")
+        return result
     except Exception as e:
-        logger.error(f"TS 异常 SQL 查询失败: {e}")
-        
-    return res
-
-def _detect_pos_anomalies_sql(engine, start_utc, end_utc, date_label):
-    """使用 SQL 检测 POS 异常"""
-    query = """
-    SELECT 
-        to_user as address,
-        COUNT(*) as count,
-        GROUP_CONCAT(amount ORDER BY block_time_dt ASC) as amounts
-    FROM shit_pos_rewards
-    WHERE block_time_dt >= :start AND block_time_dt < :end
-    GROUP BY to_user
-    HAVING count > 1
-    """
-    
-    res = []
+        logger.error(f"{detector.label} 异常 SQL 查询失败 ({time.time() - t0:.2f}s): {e}")
+        return []
+
+
+async def _run_detector_async(
+    engine, detector: BaseAnomalyDetector, start_date: str, end_date: str, time_limit: float
+) -> List[Dict[str, Any]]:
+    """_run_detector 的异步版本: 超过 time_limit 秒 (多等 1 秒，让数据库终止的查询以错误形式返回) 时取消并返回空列表"""
+    t0 = time.time()
     try:
-        with engine.connect() as conn:
-            df = pd.read_sql(text(query), conn, params={
-                "start": start_utc.strftime('%Y-%m-%d %H:%M:%S'),
-                "end": end_utc.strftime('%Y-%m-%d %H:%M:%S')
-            })
-            
-        for _, row in df.iterrows():
-            count = int(row['count'])
-            amounts_str = str(row['amounts'])
-            res.append({
-                "date": date_label,
-                "address": row['address'],
-                "type": "POS_DUPLICATE",
-                "description": f"POS 同日重复领取: {count}次 (金额: {amounts_str})",
-                "severity": "high",
-                "data": {"count": count, "amounts": amounts_str}
-            })
+        if anomaly_store.is_store_enabled():
+            detect = _detect_with_store_async(engine, detector, start_date, end_date, time_limit)
+        else:
+            detect = _detect_async(engine, detector, start_date, end_date, time_limit)
+        result = await asyncio.wait_for(detect, timeout=time_limit + 1)
+        logger.info(f"[Perf] {detector.label} 异常检测耗时: {time.time() - t0:.2f}s ({len(result)} 条)")
+        return result
+    except asyncio.TimeoutError:
+        logger.error(f"{detector.label} 异常检测超时 (>{time_limit:.0f}s)，本次结果不包含该检测器")
+        return []
     except Exception as e:
-        logger.error(f"POS 异常 SQL 查询失败: {e}")
-    return res
+        logger.error(f"{detector.label} 异常 SQL 查询失败 ({time.time() - t0:.2f}s): {e}")
+        return []
 
-def _detect_staking_anomalies_sql(engine, start_utc, end_utc, date_label):
-    """使用 SQL 检测 Staking 异常"""
-    query = """
-    SELECT 
-        to_user as address,
-        COUNT(*) as count,
-        GROUP_CONCAT(amount ORDER BY block_time_dt ASC) as amounts
-    FROM shit_staking_rewards
-    WHERE block_time_dt >= :start AND block_time_dt < :end
-    GROUP BY to_user
-    HAVING count > 1
-    """
-    
-    res = []
+
+def _detect(
+    engine, detector: BaseAnomalyDetector, start_date: str, end_date: str, time_limit: float
+) -> List[Dict[str, Any]]:
+    """SQL 预筛 -> 向量化分类 -> 输出记录 (查询失败或超过 time_limit 秒时抛出异常)"""
+    with engine.connect() as conn:
+        sql = _with_time_limit(detector.to_sql(), time_limit, conn.dialect)
+        df = pd.read_sql(text(sql), conn, params=detector.params(start_date, end_date))
+    return _classify(_prepare_metrics(df, detector), detector)
+
+
+async def _detect_async(
+    engine, detector: BaseAnomalyDetector, start_date: str, end_date: str, time_limit: float
+) -> List[Dict[str, Any]]:
+    """_detect 的异步版本 (经异步引擎查询)"""
+    async with async_connect(engine) as conn:
+        sql = _with_time_limit(detector.to_sql(), time_limit, conn.dialect)
+        result = await conn.execute(text(sql), detector.params(start_date, end_date))
+        # 与 pd.read_sql 相同: Decimal 转为 float
+        df = pd.DataFrame.from_records(result.fetchall(), columns=list(result.keys()), coerce_float=True)
+    return _classify(_prepare_metrics(df, detector), detector)
+
+
+def _store_lag() -> pd.Timedelta:
+    """业务日结束后等待迟到数据入库的缓冲 (ANOMALY_STORE_LAG_MINUTES，默认 10)"""
+    return pd.Timedelta(minutes=int(os.getenv("ANOMALY_STORE_LAG_MINUTES", 10)))
+
+
+def _utc_now() -> pd.Timestamp:
+    return pd.Timestamp(datetime.now(timezone.utc)).tz_localize(None)
+
+
+def _group_by_day(records: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    by_day: Dict[str, List[Dict[str, Any]]] = {}
+    for record in records:
+        by_day.setdefault(record["date"], []).append(record)
+    return by_day
+
+
+def _contiguous_runs(days: List[str], max_days: Optional[int] = None) -> List[Tuple[str, str]]:
+    """把升序业务日列表切分为连续区间 [(首日, 末日)]，max_days 限制每个区间的天数"""
+    runs: List[List[pd.Timestamp]] = []
+    for day in pd.to_datetime(days):
+        run = runs[-1] if runs else None
+        if run and day - run[-1] == pd.Timedelta(days=1) and (max_days is None or len(run) < max_days):
+            run.append(day)
+        else:
+            runs.append([day])
+    return [(run[0].strftime('%Y-%m-%d'), run[-1].strftime('%Y-%m-%d')) for run in runs]
+
+
+def _load_stored(detector: BaseAnomalyDetector, days: List[str], closed_day: str) -> Dict[str, List[Dict[str, Any]]]:
+    """读取 days 中已关闭且已存储的业务日，读取失败时返回空 (改为实时计算)"""
+    if days[0] > closed_day:
+        return {}
+    try:
+        return anomaly_store.load_days(detector.label, detector.version, days[0], min(days[-1], closed_day))
+    except Exception as e:
+        logger.warning(f"{detector.label} 读取异常存储失败，改为实时计算: {e}")
+        return {}
+
+
+def _save_computed(
+    detector: BaseAnomalyDetector, pending: List[str], computed: Dict[str, List[Dict[str, Any]]], closed_day: str
+) -> None:
+    """把实时计算的日期中已关闭的业务日写入存储 (无异常的日期写入空列表)"""
+    to_save = {day: computed.get(day, []) for day in pending if day <= closed_day}
+    if not to_save:
+        return
     try:
-        with engine.connect() as conn:
-            df = pd.read_sql(text(query), conn, params={
-                "start": start_utc.strftime('%Y-%m-%d %H:%M:%S'),
-                "end": end_utc.strftime('%Y-%m-%d %H:%M:%S')
-            })
-            
-        for _, row in df.iterrows():
-            count = int(row['count'])
-            amounts_str = str(row['amounts'])
-            res.append({
-                "date": date_label,
-                "address": row['address'],
-                "type": "STAKING_DUPLICATE",
-                "description": f"质押奖励同日重复领取: {count}次 (金额: {amounts_str})",
-                "severity": "high",
-                "data": {"count": count, "amounts": amounts_str}
-            })
+        anomaly_store.save_days(detector.label, detector.version, to_save)
     except Exception as e:
-        logger.error(f"Staking 异常 SQL 查询失败: {e}")
-    return res
+        logger.warning(f"{detector.label} 写入异常存储失败: {e}")
+
+
+def _detect_with_store(
+    engine, detector: BaseAnomalyDetector, start_date: str, end_date: str, time_limit: float
+) -> List[Dict[str, Any]]:
+    """
+    已关闭的业务日从持久化结果读取；缺失的日期按连续区间分段查询 (不重复扫描已存储的日期)，
+    查询后把其中已关闭日期的结果写入存储。
+    """
+    days = pd.date_range(start_date, end_date).strftime('%Y-%m-%d').tolist()
+    if not days:
+        return []
+    closed_day = detector.last_closed_day(_utc_now(), _store_lag())
+    stored = _load_stored(detector, days, closed_day)
+
+    pending = [day for day in days if day not in stored]
+    computed: Dict[str, List[Dict[str, Any]]] = {}
+    for run_start, run_end in _contiguous_runs(pending):
+        computed.update(_group_by_day(_detect(engine, detector, run_start, run_end, time_limit)))
+    _save_computed(detector, pending, computed, closed_day)
+
+    return [record for day in days for record in stored.get(day, computed.get(day, []))]
+
+
+async def _detect_with_store_async(
+    engine, detector: BaseAnomalyDetector, start_date: str, end_date: str, time_limit: float
+) -> List[Dict[str, Any]]:
+    """_detect_with_store 的异步版本: 缺失区间经异步引擎并发查询，存储读写在线程中执行"""
+    days = pd.date_range(start_date, end_date).strftime('%Y-%m-%d').tolist()
+    if not days:
+        return []
+    closed_day = detector.last_closed_day(_utc_now(), _store_lag())
+    stored = await asyncio.to_thread(_load_stored, detector, days, closed_day)
+
+    pending = [day for day in days if day not in stored]
+    computed: Dict[str, List[Dict[str, Any]]] = {}
+    for records in await asyncio.gather(*(
+        _detect_async(engine, detector, run_start, run_end, time_limit)
+        for run_start, run_end in _contiguous_runs(pending)
+    )):
+        computed.update(_group_by_day(records))
+    await asyncio.to_thread(_save_computed, detector, pending, computed, closed_day)
+
+    return [record for day in days for record in stored.get(day, computed.get(day, []))]
+
+
+def fill_anomaly_store() -> List[Dict[str, Any]]:
+    """
+    把各检测器尚未存储的已关闭业务日写入存储
+
+    填充范围从 ANOMALY_STORE_START 开始，未配置时为最近 ANOMALY_STORE_BACKFILL_DAYS 天 (默认 30)；
+    范围内减去已存储的日期 (包括用户查询时顺带写入的早期日期) 即为缺失日期，
+    按连续区间分批查询，每批不超过 ANOMALY_STORE_BACKFILL_DAYS 天，每批查询后立即写入。
+    单个检测器失败不影响其他检测器。
+
+    Returns:
+        每个检测器的结果 {'detector', 'days', 'anomalies'}
+    """
+    engine = get_db_engine()
+    if engine is None or not anomaly_store.is_store_enabled():
+        return []
+
+    now_utc = _utc_now()
+    batch_days = int(os.getenv("ANOMALY_STORE_BACKFILL_DAYS", 30))
+    results = []
+    for detector in DETECTORS:
+        filled_days, filled_records = 0, 0
+        try:
+            closed_day = detector.last_closed_day(now_utc, _store_lag())
+            if os.getenv("ANOMALY_STORE_START"):
+                start_day = pd.Timestamp(os.getenv("ANOMALY_STORE_START")).strftime('%Y-%m-%d')
+            else:
+                start_day = (pd.Timestamp(closed_day) - pd.Timedelta(days=batch_days - 1)).strftime('%Y-%m-%d')
+
+            stored = anomaly_store.stored_days(detector.label, detector.version, start_day, closed_day)
+            missing = [day for day in pd.date_range(start_day, closed_day).strftime('%Y-%m-%d') if day not in stored]
+            for run_start, run_end in _contiguous_runs(missing, batch_days):
+                records = _detect(engine, detector, run_start, run_end, _fill_timeout())
+                by_day = _group_by_day(records)
+                days = pd.date_range(run_start, run_end).strftime('%Y-%m-%d')
+                anomaly_store.save_days(detector.label, detector.version, {day: by_day.get(day, []) for day in days})
+                logger.info(f"异常存储已填充: {detector.label} {run_start} ~ {run_end} ({len(records)} 条)")
+                filled_days += len(days)
+                filled_records += len(records)
+            results.append({'detector': detector.label, 'days': filled_days, 'anomalies': filled_records})
+        except Exception as e:
+            logger.error(f"异常存储填充失败 ({detector.label}): {e}")
+            results.append({'detector': detector.label, 'days': filled_days, 'anomalies': filled_records, 'error': str(e)})
+    return results
+
+
+async def run_store_fill_loop() -> None:
+    """后台定期填充任务 (间隔 ANOMALY_STORE_INTERVAL 秒，默认 600)"""
+    interval = int(os.getenv("ANOMALY_STORE_INTERVAL", 600))
+    while True:
+        try:
+            await asyncio.to_thread(fill_anomaly_store)
+        except Exception as e:
+            logger.error(f"异常存储后台填充异常: {e}")
+        await asyncio.sleep(interval)
+
+
+def _prepare_metrics(df: pd.DataFrame, detector: BaseAnomalyDetector) -> pd.DataFrame:
+    """
+    规整查询结果: 业务日转为 'YYYY-MM-DD'，指标转为 int64；
+    有明细列时把逐条明细折叠为每个 (业务日, 地址) 一行: amounts 为逗号拼接的原始文本
+    (与 GROUP_CONCAT 输出一致)，amountList 为对应的数值列表
+    """
+    if df.empty:
+        return df
+    df['biz_date'] = format_days(pd.to_datetime(df['biz_date']).to_numpy())
+    if detector.detail_col is not None:
+        keys = ['biz_date', 'address']
+        # 与 GROUP_CONCAT 相同，跳过 NULL
+        details = df.groupby(keys, sort=False)['detail'].agg(lambda values: list(values.dropna()))
+        df = df.drop(columns='detail').drop_duplicates(keys).set_index(keys)
+        df['amounts'] = details.map(lambda values: ",".join(str(v) for v in values))
+        df['amountList'] = details.map(lambda values: [float(v) for v in values])
+        df = df.reset_index()
+    for metric in detector.metrics:
+        df[metric] = pd.to_numeric(df[metric]).fillna(0).astype('int64')
+    return df
+
+
+def _classify(df: pd.DataFrame, detector: BaseAnomalyDetector) -> List[Dict[str, Any]]:
+    """
+    向量化应用检测器规则
+
+    每条规则对整列求布尔掩码；exclusive 规则命中的行不再参与后续规则。
+    输出按行原顺序、同一行内按规则顺序排列。
+    """
+    if df.empty:
+        return []
+
+    blocked = np.zeros(len(df), dtype=bool)
+    hits = []
+    for order, rule in enumerate(detector.rules):
+        mask = rule.evaluate(df) & ~blocked
+        rows = np.flatnonzero(mask)
+        if len(rows) > 0:
+            hits.append(pd.DataFrame({'row': rows, 'order': order}))
+        if rule.exclusive:
+            blocked |= mask
+    if not hits:
+        return []
+
+    hits = pd.concat(hits, ignore_index=True).sort_values(['row', 'order'], kind='stable')
+    records = df.to_dict('records')
+    result = []
+    for row, order in zip(hits['row'].to_numpy(), hits['order'].to_numpy()):
+        rule = detector.rules[order]
+        record = records[row]
+        result.append({
+            "date": record['biz_date'],
+            "address": record['address'],
+            "type": rule.type,
+            "description": rule.description.format(**record),
+            "severity": rule.severity,
+            "data": {key: record[metric] for key, metric in detector.data.items()}
+        })
+    return result
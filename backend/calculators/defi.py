@@ -1,39 +1,66 @@
 """
 DeFi 数据计算模块
 计算 DeFi 相关的指标和日数据
-纯函数式实现 - 直接接收 df_current 和 df_prev
+纯函数式实现 - 接收覆盖本期与前期的单个 DataFrame，按本期起始时间一次分组得到两个周期的指标
+也支持流式分块输入 (calculate_defi_chunked)，逐块折叠部分聚合结果
+SQL 版 (calculate_defi_sql / calculate_defi_sql_async) 在数据库中完成活动聚合和K线，不拉取原始记录与价格 tick
+K线周期可选 1m / 5m / 15m / 1h / 4h / 1d (默认 1h)
 """
-from typing import Dict, Any, List, Optional
+import logging
+from typing import Dict, Any, List, Optional, Iterable
+import numpy as np
 import pandas as pd
+from utils.sql_query import SqlQuery, run_sql_calculation, run_sql_calculation_async
+from utils.business_day import business_day_key, format_day_index
+from utils.time_index import time_slice
+
+logger = logging.getLogger(__name__)
 
 
 TIMESTAMP_COL = 'Timestamp(UTC+8)'
 
+# K线周期 -> 分钟数
+CANDLE_RESOLUTIONS = {
+    '1m': 1,
+    '5m': 5,
+    '15m': 15,
+    '1h': 60,
+    '4h': 240,
+    '1d': 1440,
+}
+DEFAULT_RESOLUTION = '1h'
+
 
 def calculate_defi(
-    df_current: pd.DataFrame,
-    df_prev: pd.DataFrame,
-    df_price: Optional[pd.DataFrame] = None
+    df: pd.DataFrame,
+    current_start: pd.Timestamp,
+    df_price: Optional[pd.DataFrame] = None,
+    resolution: str = DEFAULT_RESOLUTION
 ) -> Dict[str, Any]:
     """
     计算 DeFi 数据（纯函数式）
     
+    两个周期的活动指标由 (周期标签, 活动类型) 一次分组聚合得到，日数据只取本期行。
+    
     Args:
-        df_current: 当前周期的 Liq_Pool_Activity
-        df_prev: 前一周期的 Liq_Pool_Activity
+        df: 覆盖 [prev_start, current_end) 的 Liq_Pool_Activity
+        current_start: 本期起始时间，早于此时间的行属于前一周期
         df_price: SHIT_Price_Log 数据（可选，用于K线图）
+        resolution: K线周期 (CANDLE_RESOLUTIONS 的键)
     
     Returns:
-        包含 metrics, dailyData, 以及可选的 hourlyPrice 的字典
+        包含 metrics, dailyData, 以及可选的 hourlyPrice (K线) 的字典
     """
+    is_current = df[TIMESTAMP_COL] >= current_start
+    
     # 计算指标
-    metrics = _compute_metrics(df_current, df_prev)
+    metrics = _combine_metrics(*_compute_period_metrics_pair(df, is_current))
     
     # 计算日数据
-    daily_data = _calculate_daily_data(df_current)
+    daily_data = _calculate_daily_data(time_slice(df, current_start))
     
-    # 计算小时级别的价格K线（仅当有价格数据时）
-    hourly_price = _calculate_hourly_price(df_price) if df_price is not None and len(df_price) > 0 else []
+    # 计算价格K线（仅当有价格数据时）
+    hourly_price = _calculate_candles(df_price, resolution) if df_price is not None and len(df_price) > 0 else []
     
     return {
         'metrics': metrics,
@@ -42,17 +69,59 @@ def calculate_defi(
     }
 
 
-def _compute_metrics(
-    df_current: pd.DataFrame,
-    df_prev: pd.DataFrame
+def calculate_defi_chunked(
+    chunks: Iterable[pd.DataFrame],
+    current_start: pd.Timestamp,
+    df_price: Optional[pd.DataFrame] = None,
+    resolution: str = DEFAULT_RESOLUTION
 ) -> Dict[str, Any]:
-    """计算当前周期和前一周期的指标及 Delta"""
+    """
+    计算 DeFi 数据（流式分块版本）
+    
+    周期指标全部为可加量，逐块求和；日数据逐块按日期聚合后合并。
+    
+    Args:
+        chunks: Liq_Pool_Activity 分块迭代器，覆盖 [prev_start, current_end)
+        current_start: 本期起始时间，早于此时间的行属于前一周期
+        df_price: SHIT_Price_Log 数据（可选，用于K线图）
+        resolution: K线周期 (CANDLE_RESOLUTIONS 的键)
+    
+    Returns:
+        与 calculate_defi 相同结构的字典
+    """
+    metrics_current = _compute_period_metrics(pd.DataFrame())
+    metrics_prev = _compute_period_metrics(pd.DataFrame())
+    daily_parts = []
     
-    # 当前周期指标
-    metrics_current = _compute_period_metrics(df_current)
+    for chunk in chunks:
+        is_current = chunk[TIMESTAMP_COL] >= current_start
+        chunk_current = time_slice(chunk, current_start)
+        chunk_metrics_current, chunk_metrics_prev = _compute_period_metrics_pair(chunk, is_current)
+        metrics_current = _merge_partials(metrics_current, chunk_metrics_current)
+        metrics_prev = _merge_partials(metrics_prev, chunk_metrics_prev)
+        if len(chunk_current) > 0:
+            daily_parts.append(_daily_partial(chunk_current))
     
-    # 前一周期指标
-    metrics_prev = _compute_period_metrics(df_prev)
+    daily = pd.concat(daily_parts).groupby(level=0).sum() if daily_parts else None
+    hourly_price = _calculate_candles(df_price, resolution) if df_price is not None and len(df_price) > 0 else []
+    
+    return {
+        'metrics': _combine_metrics(metrics_current, metrics_prev),
+        'dailyData': _finalize_daily(daily),
+        'hourlyPrice': hourly_price
+    }
+
+
+def _merge_partials(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
+    """合并两个周期指标 (全部为可加量)"""
+    return {key: a[key] + b[key] for key in a}
+
+
+def _combine_metrics(
+    metrics_current: Dict[str, Any],
+    metrics_prev: Dict[str, Any]
+) -> Dict[str, Any]:
+    """合并本期和前期指标并计算 Delta"""
     
     # 计算 Delta（百分比）
     def calc_delta(current: Any, prev: Any) -> Optional[float]:
@@ -113,67 +182,59 @@ def _compute_metrics(
 
 def _compute_period_metrics(df: pd.DataFrame) -> Dict[str, Any]:
     """计算单个周期的指标"""
-    
+    return _compute_period_metrics_pair(df, pd.Series(True, index=df.index))[0]
+
+
+def _compute_period_metrics_pair(df: pd.DataFrame, is_current: pd.Series) -> tuple:
+    """按 (周期标签, 活动类型) 一次分组聚合，返回 (本期, 前期) 的指标"""
+    empty = {
+        'buyShitAmount': 0.0,
+        'buyCount': 0,
+        'buyUsdtAmount': 0.0,
+        'sellShitAmount': 0.0,
+        'sellCount': 0,
+        'sellUsdtAmount': 0.0,
+        'tsSellShitAmount': 0.0,
+        'tsSellUsdtAmount': 0.0,
+        'liqAddUsdt': 0.0,
+        'liqAddCount': 0,
+        'liqRemoveUsdt': 0.0,
+        'liqRemoveCount': 0,
+    }
     if len(df) == 0:
+        return dict(empty), dict(empty)
+    
+    is_current = is_current.rename('isCurrent')
+    values = pd.DataFrame({'shit': df['SHIT Change'].abs(), 'usdt': df['USDT Change'].abs()})
+    stats = values.groupby([is_current, df['Activity']], observed=True).agg(
+        shit=('shit', 'sum'),
+        usdt=('usdt', 'sum'),
+        count=('shit', 'size')
+    )
+    
+    # TS Sell (13k-20k 范围) 只对 SELL 子集再分组
+    is_ts_sell = (df['Activity'] == 'SELL') & (values['shit'] >= 13000) & (values['shit'] <= 20000)
+    ts_sell = values[is_ts_sell].groupby(is_current[is_ts_sell]).sum()
+    
+    def period(flag: bool) -> Dict[str, Any]:
+        def get(kind: str, col: str):
+            return stats[col].get((flag, kind), 0)
         return {
-            'buyShitAmount': 0.0,
-            'buyCount': 0,
-            'buyUsdtAmount': 0.0,
-            'sellShitAmount': 0.0,
-            'sellCount': 0,
-            'sellUsdtAmount': 0.0,
-            'tsSellShitAmount': 0.0,
-            'tsSellUsdtAmount': 0.0,
-            'liqAddUsdt': 0.0,
-            'liqAddCount': 0,
-            'liqRemoveUsdt': 0.0,
-            'liqRemoveCount': 0,
+            'buyShitAmount': float(get('BUY', 'shit')),
+            'buyCount': int(get('BUY', 'count')),
+            'buyUsdtAmount': float(get('BUY', 'usdt')),
+            'sellShitAmount': float(get('SELL', 'shit')),
+            'sellCount': int(get('SELL', 'count')),
+            'sellUsdtAmount': float(get('SELL', 'usdt')),
+            'tsSellShitAmount': float(ts_sell['shit'].get(flag, 0.0)),
+            'tsSellUsdtAmount': float(ts_sell['usdt'].get(flag, 0.0)),
+            'liqAddUsdt': float(get('LIQ_ADD', 'usdt')),
+            'liqAddCount': int(get('LIQ_ADD', 'count')),
+            'liqRemoveUsdt': float(get('LIQ_REMOVE', 'usdt')),
+            'liqRemoveCount': int(get('LIQ_REMOVE', 'count')),
         }
     
-    # BUY 交易
-    buy_df = df[df['Activity'] == 'BUY']
-    buy_shit_amount = float((buy_df['SHIT Change'].abs()).sum()) if not buy_df.empty else 0.0
-    buy_count = len(buy_df)
-    buy_usdt_amount = float((buy_df['USDT Change'].abs()).sum()) if not buy_df.empty else 0.0
-    
-    # SELL 交易
-    sell_df = df[df['Activity'] == 'SELL']
-    sell_shit_amount = float((sell_df['SHIT Change'].abs()).sum()) if not sell_df.empty else 0.0
-    sell_count = len(sell_df)
-    sell_usdt_amount = float((sell_df['USDT Change'].abs()).sum()) if not sell_df.empty else 0.0
-    
-    # TS Sell (13k-20k 范围)
-    ts_sell_df = sell_df[
-        (sell_df['SHIT Change'].abs() >= 13000) & 
-        (sell_df['SHIT Change'].abs() <= 20000)
-    ]
-    ts_sell_shit_amount = float((ts_sell_df['SHIT Change'].abs()).sum()) if not ts_sell_df.empty else 0.0
-    ts_sell_usdt_amount = float((ts_sell_df['USDT Change'].abs()).sum()) if not ts_sell_df.empty else 0.0
-    
-    # Liquidity Add
-    liq_add_df = df[df['Activity'] == 'LIQ_ADD']
-    liq_add_usdt = float((liq_add_df['USDT Change'].abs()).sum()) if not liq_add_df.empty else 0.0
-    liq_add_count = len(liq_add_df)
-    
-    # Liquidity Remove
-    liq_remove_df = df[df['Activity'] == 'LIQ_REMOVE']
-    liq_remove_usdt = float((liq_remove_df['USDT Change'].abs()).sum()) if not liq_remove_df.empty else 0.0
-    liq_remove_count = len(liq_remove_df)
-    
-    return {
-        'buyShitAmount': buy_shit_amount,
-        'buyCount': buy_count,
-        'buyUsdtAmount': buy_usdt_amount,
-        'sellShitAmount': sell_shit_amount,
-        'sellCount': sell_count,
-        'sellUsdtAmount': sell_usdt_amount,
-        'tsSellShitAmount': ts_sell_shit_amount,
-        'tsSellUsdtAmount': ts_sell_usdt_amount,
-        'liqAddUsdt': liq_add_usdt,
-        'liqAddCount': liq_add_count,
-        'liqRemoveUsdt': liq_remove_usdt,
-        'liqRemoveCount': liq_remove_count,
-    }
+    return period(True), period(False)
 
 
 def _calculate_daily_data(
@@ -184,51 +245,64 @@ def _calculate_daily_data(
     if len(df) == 0:
         return []
     
-    # 复制并添加日期列
-    data = df.copy()
-    data['date'] = data[TIMESTAMP_COL].dt.strftime('%Y-%m-%d')
+    return _finalize_daily(_daily_partial(df))
+
+
+def _daily_partial(df: pd.DataFrame) -> pd.DataFrame:
+    """按日期聚合各类活动的 USDT 绝对值总额及 TS Sell，索引为 date"""
+    
+    dates = business_day_key(df[TIMESTAMP_COL])
+    usdt_abs = df['USDT Change'].abs()
     
     # 按日期和活动类型聚合
-    daily_activity = data.groupby(['date', 'Activity'])['USDT Change'].apply(
-        lambda x: float(abs(x).sum())
-    ).unstack(fill_value=0.0)
+    daily_activity = usdt_abs.groupby([dates, df['Activity']]).sum().unstack(fill_value=0.0)
     
     # 确保所有列都存在
     for col in ['BUY', 'SELL', 'LIQ_ADD', 'LIQ_REMOVE']:
         if col not in daily_activity.columns:
             daily_activity[col] = 0.0
     
-    # 重置索引并重命名列，避免硬编码顺序
-    daily_activity = daily_activity.reset_index()
     daily_activity = daily_activity.rename(columns={
         'BUY': 'buyUsdt',
         'SELL': 'sellUsdt',
         'LIQ_ADD': 'liqAddUsdt',
         'LIQ_REMOVE': 'liqRemoveUsdt'
-    })
+    })[['buyUsdt', 'sellUsdt', 'liqAddUsdt', 'liqRemoveUsdt']]
     
     # 计算 TS Sell（13k-20k范围）- 纯向量化，无循环
-    ts_sell_data = data[
-        (data['Activity'] == 'SELL') &
-        (data['SHIT Change'].abs() >= 13000) &
-        (data['SHIT Change'].abs() <= 20000)
-    ]
-    ts_sell_by_date = ts_sell_data.groupby('date')['USDT Change'].apply(
-        lambda x: float(abs(x).sum())
-    )
+    shit_abs = df['SHIT Change'].abs()
+    is_ts_sell = (df['Activity'] == 'SELL') & (shit_abs >= 13000) & (shit_abs <= 20000)
+    ts_sell_by_date = usdt_abs[is_ts_sell].groupby(dates[is_ts_sell]).sum()
     
-    daily_activity['tsSellUsdt'] = daily_activity['date'].map(ts_sell_by_date).fillna(0.0)
-    daily_activity['netFlow'] = daily_activity['buyUsdt'] - daily_activity['sellUsdt']
+    daily_activity['tsSellUsdt'] = ts_sell_by_date.reindex(daily_activity.index).fillna(0.0)
+    daily_activity.columns.name = None
+    return format_day_index(daily_activity)
+
+
+def _finalize_daily(daily: Optional[pd.DataFrame]) -> List[Dict[str, Any]]:
+    """日聚合结果 -> 输出记录"""
+    
+    if daily is None or len(daily) == 0:
+        return []
+    
+    daily = daily.sort_index().reset_index()
+    daily['netFlow'] = daily['buyUsdt'] - daily['sellUsdt']
     
-    return daily_activity[['date', 'buyUsdt', 'sellUsdt', 'netFlow', 'liqAddUsdt', 'liqRemoveUsdt', 'tsSellUsdt']].to_dict('records')
+    return daily[['date', 'buyUsdt', 'sellUsdt', 'netFlow', 'liqAddUsdt', 'liqRemoveUsdt', 'tsSellUsdt']].to_dict('records')
 
 
-def _calculate_hourly_price(df_price: pd.DataFrame) -> List[Dict]:
+def _calculate_candles(df_price: pd.DataFrame, resolution: str = DEFAULT_RESOLUTION) -> List[Dict]:
     """
-    Calculate hourly OHLC (Open, Close, Low, High) candlestick data from price log.
+    Calculate OHLC (Open, Close, Low, High) candlestick data from price log.
+    
+    Ticks are bucketed by flooring the int64 timestamp to the resolution, then reduced
+    per bucket on the sorted arrays (first / last / minimum.reduceat / maximum.reduceat),
+    so no Python code runs per bucket or per tick. Within a bucket, ticks keep their
+    original row order for open / close.
     
     Args:
         df_price: Price dataframe with columns [Timestamp(UTC+8), Price]
+        resolution: One of CANDLE_RESOLUTIONS ('1m', '5m', '15m', '1h', '4h', '1d')
         
     Returns:
         List of dicts with format: [{'time': '2025-12-17 10:00', 'ohlc': [open, close, low, high]}, ...]
@@ -250,25 +324,206 @@ def _calculate_hourly_price(df_price: pd.DataFrame) -> List[Dict]:
             return []
         price_col = numeric_cols[0]
     
-    # Ensure timestamp is datetime
-    df_price = df_price.copy()
-    df_price[timestamp_col] = pd.to_datetime(df_price[timestamp_col])
-    
-    # Group by hour and calculate OHLC
-    hourly_data = []
-    for hour_time, group in df_price.groupby(df_price[timestamp_col].dt.floor('H')):
-        if group.empty:
-            continue
-            
-        prices = group[price_col].astype(float)
-        open_price = float(prices.iloc[0])
-        close_price = float(prices.iloc[-1])
-        low_price = float(prices.min())
-        high_price = float(prices.max())
-        
-        hourly_data.append({
-            'time': hour_time.strftime('%Y-%m-%d %H:%M'),
-            'ohlc': [open_price, close_price, low_price, high_price]
-        })
+    step = np.int64(CANDLE_RESOLUTIONS[resolution] * 60 * 10**9)
+    ts = pd.to_datetime(df_price[timestamp_col]).to_numpy(dtype='datetime64[ns]')
+    prices = df_price[price_col].to_numpy(dtype=float, na_value=np.nan)
+    valid = ~np.isnat(ts) & ~np.isnan(prices)
+    if not valid.any():
+        return []
+    
+    # Bucket and sort (stable, so open / close follow row order within a bucket)
+    buckets = ts[valid].view('i8') // step * step
+    order = np.argsort(buckets, kind='stable')
+    buckets = buckets[order]
+    prices = prices[valid][order]
+    
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(buckets)] - 1
+    
+    times = pd.DatetimeIndex(buckets[starts].view('datetime64[ns]')).strftime('%Y-%m-%d %H:%M')
+    ohlc = np.column_stack([
+        prices[starts],
+        prices[ends],
+        np.minimum.reduceat(prices, starts),
+        np.maximum.reduceat(prices, starts)
+    ])
+    
+    return [{'time': t, 'ohlc': row} for t, row in zip(times, ohlc.tolist())]
+
+
+# ============================================
+# SQL 引擎
+# ============================================
+
+# TS Sell: 单笔卖出 SHIT 数量在 13k-20k 之间
+_TS_SELL_SQL = "activity = 'SELL' AND ABS(shit_change) BETWEEN 13000 AND 20000"
+
+# 周期指标: (指标键, 条件, 聚合表达式)
+_PERIOD_METRICS_SQL = [
+    ('buyShitAmount', "activity = 'BUY'", 'SUM', 'ABS(shit_change)'),
+    ('buyCount', "activity = 'BUY'", 'COUNT', '1'),
+    ('buyUsdtAmount', "activity = 'BUY'", 'SUM', 'ABS(usdt_change)'),
+    ('sellShitAmount', "activity = 'SELL'", 'SUM', 'ABS(shit_change)'),
+    ('sellCount', "activity = 'SELL'", 'COUNT', '1'),
+    ('sellUsdtAmount', "activity = 'SELL'", 'SUM', 'ABS(usdt_change)'),
+    ('tsSellShitAmount', _TS_SELL_SQL, 'SUM', 'ABS(shit_change)'),
+    ('tsSellUsdtAmount', _TS_SELL_SQL, 'SUM', 'ABS(usdt_change)'),
+    ('liqAddUsdt', "activity = 'LIQ_ADD'", 'SUM', 'ABS(usdt_change)'),
+    ('liqAddCount', "activity = 'LIQ_ADD'", 'COUNT', '1'),
+    ('liqRemoveUsdt', "activity = 'LIQ_REMOVE'", 'SUM', 'ABS(usdt_change)'),
+    ('liqRemoveCount', "activity = 'LIQ_REMOVE'", 'COUNT', '1'),
+]
+
+
+def calculate_defi_sql(start_date: str, end_date: str, resolution: str = DEFAULT_RESOLUTION) -> Dict[str, Any]:
+    """
+    计算 DeFi 数据 (完全基于 SQL 聚合，多线程并行优化)
+    
+    业务日以 UTC+8 00:00 为界，即前一天 UTC 16:00；返回结构与 calculate_defi 相同。
+    """
+    return run_sql_calculation('DeFi', lambda: _sql_queries(start_date, end_date, resolution), _assemble_sql, _get_empty_response)
+
+
+async def calculate_defi_sql_async(start_date: str, end_date: str, resolution: str = DEFAULT_RESOLUTION) -> Dict[str, Any]:
+    """calculate_defi_sql 的异步版本 (同一组查询经异步引擎并发执行)，参数与返回值相同"""
+    return await run_sql_calculation_async('DeFi', lambda: _sql_queries(start_date, end_date, resolution), _assemble_sql, _get_empty_response)
+
+
+def _sql_queries(start_date: str, end_date: str, resolution: str) -> Dict[str, SqlQuery]:
+    """两个周期的活动指标、日数据、K线三条互不依赖的查询"""
+    # 日期边界 (UTC+8 00:00 -> UTC 前一天 16:00)
+    period_days = (pd.to_datetime(end_date) - pd.to_datetime(start_date)).days + 1
+    current_start = pd.to_datetime(start_date) - pd.Timedelta(hours=8)
+    current_end = current_start + pd.Timedelta(days=period_days)
+    prev_start = current_start - pd.Timedelta(days=period_days)
+    
+    logger.info(f"[Perf] 开始计算 DeFi 数据: {start_date} ~ {end_date} (环比从 {prev_start.date()})")
+    
+    return {
+        'metrics': _period_metrics_query(prev_start, current_start, current_end),
+        'daily': _daily_data_query(current_start, current_end),
+        'candles': _candles_query(current_start, current_end, resolution),
+    }
+
+
+def _assemble_sql(results: Dict[str, Any]) -> Dict[str, Any]:
+    metrics_current, metrics_prev = results['metrics']
+    return {
+        'metrics': _combine_metrics(metrics_current, metrics_prev),
+        'dailyData': results['daily'],
+        'hourlyPrice': results['candles']
+    }
+
+
+def _sql_params(start_utc: pd.Timestamp, end_utc: pd.Timestamp, split_utc: Optional[pd.Timestamp] = None) -> Dict[str, str]:
+    params = {
+        "start": start_utc.strftime('%Y-%m-%d %H:%M:%S'),
+        "end": end_utc.strftime('%Y-%m-%d %H:%M:%S')
+    }
+    if split_utc is not None:
+        params["split"] = split_utc.strftime('%Y-%m-%d %H:%M:%S')
+    return params
+
+
+def _period_metrics_query(start_utc, split_utc, end_utc) -> SqlQuery:
+    """条件聚合: 一次查询得到 (本期, 前期) 的全部活动指标"""
+    columns = []
+    for suffix, period in (('Curr', 'timestamp_utc >= :split'), ('Prev', 'timestamp_utc < :split')):
+        for key, condition, agg, expr in _PERIOD_METRICS_SQL:
+            columns.append(f"{agg}(CASE WHEN {period} AND {condition} THEN {expr} END) as {key}{suffix}")
+    
+    query = f"""
+    SELECT
+        {', '.join(columns)}
+    FROM liq_pool_activity
+    WHERE timestamp_utc >= :start AND timestamp_utc < :end
+        AND activity IN ('BUY', 'SELL', 'LIQ_ADD', 'LIQ_REMOVE')
+    """
+    def period_metrics(values) -> Dict[str, Any]:
+        return {
+            key: int(value or 0) if agg == 'COUNT' else float(value or 0.0)
+            for (key, _, agg, _), value in zip(_PERIOD_METRICS_SQL, values)
+        }
+    
+    def finalize(row) -> tuple:
+        n = len(_PERIOD_METRICS_SQL)
+        return period_metrics(row[:n]), period_metrics(row[n:])
+    
+    return SqlQuery(query, _sql_params(start_utc, end_utc, split_utc), finalize, one_row=True)
+
+
+def _daily_data_query(start_utc, end_utc) -> SqlQuery:
+    """日数据 SQL 聚合 (业务日 = UTC 时间 + 8 小时 的日期)"""
+    query = f"""
+    SELECT
+        DATE(timestamp_utc + INTERVAL 8 HOUR) as date,
+        SUM(CASE WHEN activity = 'BUY' THEN ABS(usdt_change) ELSE 0 END) as buyUsdt,
+        SUM(CASE WHEN activity = 'SELL' THEN ABS(usdt_change) ELSE 0 END) as sellUsdt,
+        SUM(CASE WHEN activity = 'LIQ_ADD' THEN ABS(usdt_change) ELSE 0 END) as liqAddUsdt,
+        SUM(CASE WHEN activity = 'LIQ_REMOVE' THEN ABS(usdt_change) ELSE 0 END) as liqRemoveUsdt,
+        SUM(CASE WHEN {_TS_SELL_SQL} THEN ABS(usdt_change) ELSE 0 END) as tsSellUsdt
+    FROM liq_pool_activity
+    WHERE timestamp_utc >= :start AND timestamp_utc < :end
+        AND activity IN ('BUY', 'SELL', 'LIQ_ADD', 'LIQ_REMOVE')
+    GROUP BY date
+    ORDER BY date
+    """
+    def finalize(df: pd.DataFrame) -> List[Dict[str, Any]]:
+        if df.empty:
+            return []
+        df['date'] = df['date'].astype(str)
+        return _finalize_daily(df.set_index('date').astype(float).fillna(0.0))
     
-    return hourly_data
+    return SqlQuery(query, _sql_params(start_utc, end_utc), finalize)
+
+
+def _candles_query(start_utc, end_utc, resolution: str = DEFAULT_RESOLUTION) -> SqlQuery:
+    """
+    K线 SQL 聚合 (按 timestamp_utc8 分桶)
+    
+    桶号为自 1970-01-01 起的分钟数整除周期分钟数 (与会话时区无关)，
+    开盘 / 收盘价由 ROW_NUMBER 窗口函数取每桶第一条 / 最后一条记录。
+    """
+    query = """
+    SELECT
+        bucket,
+        MAX(CASE WHEN rn_first = 1 THEN price END) as open,
+        MAX(CASE WHEN rn_last = 1 THEN price END) as close,
+        MIN(price) as low,
+        MAX(price) as high
+    FROM (
+        SELECT
+            bucket,
+            price,
+            ROW_NUMBER() OVER (PARTITION BY bucket ORDER BY timestamp_utc8 ASC) as rn_first,
+            ROW_NUMBER() OVER (PARTITION BY bucket ORDER BY timestamp_utc8 DESC) as rn_last
+        FROM (
+            SELECT TIMESTAMPDIFF(MINUTE, '1970-01-01 00:00:00', timestamp_utc8) DIV :step as bucket, timestamp_utc8, price
+            FROM shit_price_history
+            WHERE timestamp_utc >= :start AND timestamp_utc < :end
+                AND price IS NOT NULL
+        ) p
+    ) t
+    GROUP BY bucket
+    ORDER BY bucket
+    """
+    step = CANDLE_RESOLUTIONS[resolution]
+    params = _sql_params(start_utc, end_utc)
+    params["step"] = step
+    def finalize(df: pd.DataFrame) -> List[Dict[str, Any]]:
+        if df.empty:
+            return []
+        times = pd.to_datetime(df['bucket'].astype('int64') * step, unit='m').dt.strftime('%Y-%m-%d %H:%M')
+        ohlc = df[['open', 'close', 'low', 'high']].astype(float).to_numpy().tolist()
+        return [{'time': t, 'ohlc': row} for t, row in zip(times, ohlc)]
+    
+    return SqlQuery(query, params, finalize)
+
+
+def _get_empty_response() -> Dict[str, Any]:
+    empty = _compute_period_metrics(pd.DataFrame())
+    return {
+        'metrics': _combine_metrics(empty, empty),
+        'dailyData': [],
+        'hourlyPrice': []
+    }
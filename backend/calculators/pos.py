@@ -1,31 +1,46 @@
 """
 POS 数据计算模块
 计算 POS 分红相关的指标、日数据、巨鲸排行
-纯函数式实现 - 直接接收 df_current 和 df_prev
+纯函数式实现 - 接收覆盖本期与前期的单个 DataFrame，按本期起始时间一次分组得到两个周期的指标
+也支持流式分块输入 (calculate_pos_chunked)，逐块折叠部分聚合结果
+SQL 版 (calculate_pos_sql / calculate_pos_sql_async) 直接在数据库中聚合，不拉取原始记录
 """
-from typing import Dict, Any, List, Optional
+import logging
+from typing import Dict, Any, List, Optional, Iterable
 import pandas as pd
+from utils.sql_query import SqlQuery, run_sql_calculation, run_sql_calculation_async
+from utils.business_day import daily_sum, BOUNDARY_POS
+from utils.time_index import time_slice
+
+logger = logging.getLogger(__name__)
 
 
 TIMESTAMP_COL = 'Timestamp(UTC+8)'
 
 
 def calculate_pos(
-    df_current: pd.DataFrame,
-    df_prev: pd.DataFrame
+    df_pos: pd.DataFrame,
+    current_start: pd.Timestamp
 ) -> Dict[str, Any]:
     """
     计算 POS 数据（纯函数式）
     
+    本期 / 前期不再拆分为两个副本: 按 current_start 生成周期标签，
+    两个周期的指标在一次分组聚合中得到，日数据和排行只取本期行。
+    
     Args:
-        df_current: 当前周期的 DataFrame
-        df_prev: 前一周期的 DataFrame
+        df_pos: 覆盖 [prev_start, current_end) 的 DataFrame
+        current_start: 本期起始时间，早于此时间的行属于前一周期
     
     Returns:
         包含 metrics, dailyData, topUsers 的字典
     """
+    is_current = df_pos[TIMESTAMP_COL] >= current_start
+    df_current = time_slice(df_pos, current_start)
+    
     # 计算指标
-    metrics = _compute_metrics(df_current, df_prev)
+    partial_current, partial_prev = _period_partials(df_pos, is_current)
+    metrics = _combine_metrics(_finalize_period(partial_current), _finalize_period(partial_prev))
     
     # 计算日数据
     daily_data = _calculate_daily_data(df_current)
@@ -40,16 +55,53 @@ def calculate_pos(
     }
 
 
-def _compute_metrics(
-    df_current: pd.DataFrame,
-    df_prev: pd.DataFrame
+def calculate_pos_chunked(
+    chunks: Iterable[pd.DataFrame],
+    current_start: pd.Timestamp
 ) -> Dict[str, Any]:
-    """计算 POS 指标及 Delta"""
+    """
+    计算 POS 数据（流式分块版本）
     
-    # 当前周期指标
-    metrics_current = _compute_period_metrics(df_current)
-    # 前一周期指标
-    metrics_prev = _compute_period_metrics(df_prev)
+    每个分块按 current_start 划分本期/前期，只保留部分聚合结果，
+    内存占用与分块大小和地址数相关，与时间跨度无关。
+    
+    Args:
+        chunks: 覆盖 [prev_start, current_end) 的 DataFrame 分块迭代器
+        current_start: 本期起始时间，早于此时间的行属于前一周期
+    
+    Returns:
+        与 calculate_pos 相同结构的字典
+    """
+    partial_current = _period_partial(pd.DataFrame())
+    partial_prev = _period_partial(pd.DataFrame())
+    daily_parts = []
+    user_parts = []
+    
+    for chunk in chunks:
+        is_current = chunk[TIMESTAMP_COL] >= current_start
+        chunk_current = time_slice(chunk, current_start)
+        chunk_partial_current, chunk_partial_prev = _period_partials(chunk, is_current)
+        partial_current = _merge_partials(partial_current, chunk_partial_current)
+        partial_prev = _merge_partials(partial_prev, chunk_partial_prev)
+        if len(chunk_current) > 0:
+            daily_parts.append(_daily_partial(chunk_current))
+            user_parts.append(_user_partial(chunk_current))
+    
+    daily = pd.concat(daily_parts).groupby(level=0).sum() if daily_parts else None
+    users = pd.concat(user_parts).groupby(level=0, observed=True).sum() if user_parts else None
+    
+    return {
+        'metrics': _combine_metrics(_finalize_period(partial_current), _finalize_period(partial_prev)),
+        'dailyData': _finalize_daily(daily),
+        'topUsers': _finalize_top_users(users)
+    }
+
+
+def _combine_metrics(
+    metrics_current: Dict[str, float],
+    metrics_prev: Dict[str, float]
+) -> Dict[str, Any]:
+    """合并本期和前期指标并计算 Delta"""
     
     # 计算 Delta
     def calc_delta(current: float, prev: float) -> Optional[float]:
@@ -73,12 +125,76 @@ def _compute_metrics(
     return result
 
 
-def _compute_period_metrics(df_pos: pd.DataFrame) -> Dict[str, float]:
-    """计算单个周期的所有指标"""
+def _period_partial(df_pos: pd.DataFrame) -> Dict[str, Optional[float]]:
+    """单个周期（或分块）的可合并部分聚合"""
+    
+    if len(df_pos) == 0:
+        return {'totalTx': 0, 'totalAmount': 0.0, 'maxAmount': None, 'minAmount': None, 'totalRevenue': 0.0}
     
-    total_tx = len(df_pos)
+    amounts = df_pos['SHIT Sent'].dropna()
+    return {
+        'totalTx': len(df_pos),
+        'totalAmount': float(amounts.sum()),
+        'maxAmount': float(amounts.max()) if len(amounts) > 0 else None,
+        'minAmount': float(amounts.min()) if len(amounts) > 0 else None,
+        'totalRevenue': float(df_pos['SOL Received'].sum()),
+    }
+
+
+def _period_partials(df_pos: pd.DataFrame, is_current: pd.Series) -> tuple:
+    """按周期标签一次分组聚合，返回 (本期, 前期) 的部分聚合"""
     
-    # 处理空 DataFrame
+    if len(df_pos) == 0:
+        return _period_partial(pd.DataFrame()), _period_partial(pd.DataFrame())
+    
+    stats = df_pos.groupby(is_current.rename('isCurrent')).agg(
+        totalTx=('SHIT Sent', 'size'),
+        totalAmount=('SHIT Sent', 'sum'),
+        maxAmount=('SHIT Sent', 'max'),
+        minAmount=('SHIT Sent', 'min'),
+        totalRevenue=('SOL Received', 'sum'),
+    )
+    
+    def partial(flag: bool) -> Dict[str, Optional[float]]:
+        if flag not in stats.index:
+            return _period_partial(pd.DataFrame())
+        row = stats.loc[flag]
+        return {
+            'totalTx': int(row['totalTx']),
+            'totalAmount': float(row['totalAmount']),
+            'maxAmount': float(row['maxAmount']) if pd.notna(row['maxAmount']) else None,
+            'minAmount': float(row['minAmount']) if pd.notna(row['minAmount']) else None,
+            'totalRevenue': float(row['totalRevenue']),
+        }
+    
+    return partial(True), partial(False)
+
+
+def _merge_partials(a: Dict[str, Optional[float]], b: Dict[str, Optional[float]]) -> Dict[str, Optional[float]]:
+    """合并两个部分聚合"""
+    
+    def pick(x, y, fn):
+        if x is None:
+            return y
+        if y is None:
+            return x
+        return fn(x, y)
+    
+    return {
+        'totalTx': a['totalTx'] + b['totalTx'],
+        'totalAmount': a['totalAmount'] + b['totalAmount'],
+        'maxAmount': pick(a['maxAmount'], b['maxAmount'], max),
+        'minAmount': pick(a['minAmount'], b['minAmount'], min),
+        'totalRevenue': a['totalRevenue'] + b['totalRevenue'],
+    }
+
+
+def _finalize_period(partial: Dict[str, Optional[float]]) -> Dict[str, float]:
+    """由部分聚合得到最终指标"""
+    
+    total_tx = partial['totalTx']
+    
+    # 处理空周期
     if total_tx == 0:
         return {
             'totalTx': 0.0,
@@ -89,23 +205,13 @@ def _compute_period_metrics(df_pos: pd.DataFrame) -> Dict[str, float]:
             'avgReward': 0.0,
         }
     
-    # SHIT 相关指标
-    amounts = df_pos['SHIT Sent'].dropna()
-    total_amount = float(amounts.sum())
-    max_amount = float(amounts.max()) if len(amounts) > 0 else 0.0
-    min_amount = float(amounts.min()) if len(amounts) > 0 else 0.0
-    
-    # 收入相关指标
-    total_revenue = float(df_pos['SOL Received'].sum())
-    avg_reward = total_amount / total_tx if total_tx > 0 else 0.0
-    
     return {
         'totalTx': float(total_tx),
-        'totalAmount': total_amount,
-        'maxAmount': max_amount,
-        'minAmount': min_amount,
-        'totalRevenue': total_revenue,
-        'avgReward': avg_reward,
+        'totalAmount': partial['totalAmount'],
+        'maxAmount': partial['maxAmount'] if partial['maxAmount'] is not None else 0.0,
+        'minAmount': partial['minAmount'] if partial['minAmount'] is not None else 0.0,
+        'totalRevenue': partial['totalRevenue'],
+        'avgReward': partial['totalAmount'] / total_tx,
     }
 
 
@@ -115,18 +221,21 @@ def _calculate_daily_data(df_pos: pd.DataFrame) -> List[Dict[str, Any]]:
     if len(df_pos) == 0:
         return []
     
-    # 复制并添加日期列
-    df = df_pos.copy()
-    df['date'] = df[TIMESTAMP_COL].apply(
-        lambda ts: (ts - pd.Timedelta(days=1)).strftime('%Y-%m-%d') if ts.hour < 12 else ts.strftime('%Y-%m-%d')
-    )
+    return _finalize_daily(_daily_partial(df_pos))
+
+
+def _daily_partial(df_pos: pd.DataFrame) -> pd.DataFrame:
+    """按业务日期 (12pm 边界) 聚合，索引为 date"""
+    return daily_sum(df_pos, ['SHIT Sent', 'SOL Received'], BOUNDARY_POS)
+
+
+def _finalize_daily(daily: Optional[pd.DataFrame]) -> List[Dict[str, Any]]:
+    """日聚合结果 -> 输出记录"""
     
-    # 按日期聚合
-    daily = df.groupby('date').agg({
-        'SHIT Sent': 'sum',
-        'SOL Received': 'sum'
-    }).reset_index()
+    if daily is None or len(daily) == 0:
+        return []
     
+    daily = daily.sort_index().reset_index()
     daily.columns = ['date', 'shitSent', 'solReceived']
     
     return daily.astype({
@@ -141,16 +250,26 @@ def _calculate_top_users(df_pos: pd.DataFrame, top_n: int = 10) -> List[Dict[str
     if len(df_pos) == 0:
         return []
     
-    # 按地址聚合 - 分别处理每个聚合
-    user_shit = df_pos.groupby('Receiver Address')['SHIT Sent'].sum()
-    user_tx = df_pos.groupby('Receiver Address').size()
+    return _finalize_top_users(_user_partial(df_pos), top_n)
+
+
+def _user_partial(df_pos: pd.DataFrame) -> pd.DataFrame:
+    """按地址聚合 SHIT 总额和交易次数，索引为地址"""
     
-    # 合并结果
-    user_stats = pd.DataFrame({
-        'fullAddress': user_shit.index,
-        'shitSent': user_shit.values,
-        'txCount': user_tx.values
+    grouped = df_pos.groupby('Receiver Address', observed=True)
+    return pd.DataFrame({
+        'shitSent': grouped['SHIT Sent'].sum(),
+        'txCount': grouped.size()
     })
+
+
+def _finalize_top_users(user_stats: Optional[pd.DataFrame], top_n: int = 10) -> List[Dict[str, Any]]:
+    """地址聚合结果 -> 巨鲸排行"""
+    
+    if user_stats is None or len(user_stats) == 0:
+        return []
+    
+    user_stats = user_stats.rename_axis('fullAddress').reset_index()
     
     # 排序并取前 N
     user_stats = user_stats.sort_values('shitSent', ascending=False).head(top_n).reset_index(drop=True)
@@ -164,3 +283,137 @@ def _calculate_top_users(df_pos: pd.DataFrame, top_n: int = 10) -> List[Dict[str
         'shitSent': 'float',
         'txCount': 'int'
     }).to_dict('records')
+
+
+# ============================================
+# SQL 引擎
+# ============================================
+
+def calculate_pos_sql(start_date: str, end_date: str, top_n: int = 10) -> Dict[str, Any]:
+    """
+    计算 POS 数据 (完全基于 SQL 聚合，多线程并行优化)
+    
+    业务日以 UTC+8 12:00 为界，即 UTC 04:00；返回结构与 calculate_pos 相同。
+    """
+    return run_sql_calculation('POS', lambda: _sql_queries(start_date, end_date, top_n), _assemble_sql, _get_empty_response)
+
+
+async def calculate_pos_sql_async(start_date: str, end_date: str, top_n: int = 10) -> Dict[str, Any]:
+    """calculate_pos_sql 的异步版本 (同一组查询经异步引擎并发执行)，参数与返回值相同"""
+    return await run_sql_calculation_async('POS', lambda: _sql_queries(start_date, end_date, top_n), _assemble_sql, _get_empty_response)
+
+
+def _sql_queries(start_date: str, end_date: str, top_n: int) -> Dict[str, SqlQuery]:
+    """本期 / 前期指标、日数据、排行四条互不依赖的查询"""
+    # 日期边界 (UTC+8 12:00 -> UTC 04:00)
+    period_days = (pd.to_datetime(end_date) - pd.to_datetime(start_date)).days + 1
+    current_start = pd.to_datetime(start_date) + pd.Timedelta(hours=4)
+    current_end = current_start + pd.Timedelta(days=period_days)
+    prev_start = current_start - pd.Timedelta(days=period_days)
+    
+    logger.info(f"[Perf] 开始计算 POS 数据: {start_date} ~ {end_date} (环比从 {prev_start.date()})")
+    
+    return {
+        'current': _period_partial_query(current_start, current_end),
+        'prev': _period_partial_query(prev_start, current_start),
+        'daily': _daily_data_query(current_start, current_end),
+        'top': _top_users_query(current_start, current_end, top_n),
+    }
+
+
+def _assemble_sql(results: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'metrics': _combine_metrics(_finalize_period(results['current']), _finalize_period(results['prev'])),
+        'dailyData': results['daily'],
+        'topUsers': results['top']
+    }
+
+
+def _sql_params(start_utc: pd.Timestamp, end_utc: pd.Timestamp) -> Dict[str, str]:
+    return {
+        "start": start_utc.strftime('%Y-%m-%d %H:%M:%S'),
+        "end": end_utc.strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+
+def _period_partial_query(start_utc, end_utc) -> SqlQuery:
+    """单周期 SQL 聚合，返回与 _period_partial 相同结构的部分聚合"""
+    query = """
+    SELECT
+        COUNT(*) as totalTx,
+        SUM(amount) as totalAmount,
+        MAX(amount) as maxAmount,
+        MIN(amount) as minAmount,
+        SUM(SolSentToTreasury) as totalRevenue
+    FROM shit_pos_rewards
+    WHERE block_time_dt >= :start AND block_time_dt < :end
+    """
+    def finalize(row) -> Dict[str, Optional[float]]:
+        return {
+            'totalTx': int(row[0] or 0),
+            'totalAmount': float(row[1] or 0.0),
+            'maxAmount': float(row[2]) if row[2] is not None else None,
+            'minAmount': float(row[3]) if row[3] is not None else None,
+            'totalRevenue': float(row[4] or 0.0),
+        }
+    
+    return SqlQuery(query, _sql_params(start_utc, end_utc), finalize, one_row=True)
+
+
+def _daily_data_query(start_utc, end_utc) -> SqlQuery:
+    """日数据 SQL 聚合 (业务日 = UTC 时间 - 4 小时 的日期)"""
+    query = """
+    SELECT
+        DATE(block_time_dt - INTERVAL 4 HOUR) as date,
+        SUM(amount) as shitSent,
+        SUM(SolSentToTreasury) as solReceived
+    FROM shit_pos_rewards
+    WHERE block_time_dt >= :start AND block_time_dt < :end
+    GROUP BY date
+    ORDER BY date
+    """
+    def finalize(df: pd.DataFrame) -> List[Dict[str, Any]]:
+        if df.empty:
+            return []
+        df['date'] = df['date'].astype(str)
+        return df.fillna(0.0).astype({
+            'shitSent': 'float',
+            'solReceived': 'float'
+        }).to_dict('records')
+    
+    return SqlQuery(query, _sql_params(start_utc, end_utc), finalize)
+
+
+def _top_users_query(start_utc, end_utc, top_n: int = 10) -> SqlQuery:
+    """巨鲸排行 SQL 聚合"""
+    query = """
+    SELECT
+        to_user as fullAddress,
+        SUM(amount) as shitSent,
+        COUNT(*) as txCount
+    FROM shit_pos_rewards
+    WHERE block_time_dt >= :start AND block_time_dt < :end
+        AND to_user IS NOT NULL
+    GROUP BY to_user
+    ORDER BY shitSent DESC
+    LIMIT :limit
+    """
+    def finalize(df: pd.DataFrame) -> List[Dict[str, Any]]:
+        if df.empty:
+            return []
+        df['address'] = df['fullAddress'].apply(lambda x: f"{x[:4]}...{x[-4:]}")
+        return df[['address', 'fullAddress', 'shitSent', 'txCount']].fillna({'shitSent': 0.0}).astype({
+            'shitSent': 'float',
+            'txCount': 'int'
+        }).to_dict('records')
+    
+    return SqlQuery(query, {**_sql_params(start_utc, end_utc), "limit": top_n}, finalize)
+
+
+def _get_empty_response() -> Dict[str, Any]:
+    empty = _finalize_period(_period_partial(pd.DataFrame()))
+    return {
+        'metrics': _combine_metrics(empty, empty),
+        'dailyData': [],
+        'topUsers': []
+    }
@@ -1,48 +1,59 @@
 """
 Revenue 数据计算模块
 汇总各个模块的 SOL 收入
-纯函数式实现 - 直接接收各模块的 df_current 和 df_prev
+纯函数式实现 - 接收各模块覆盖本期与前期的单个 DataFrame，按各自本期起始时间一次分组求和
+SQL 版 (calculate_revenue_sql / calculate_revenue_sql_async) 用一条 UNION ALL 查询按来源各自的业务日边界聚合
 """
+import logging
 from typing import Dict, Any, List, Optional
 import pandas as pd
+from utils.sql_query import SqlQuery, run_sql_calculation, run_sql_calculation_async
+from utils.business_day import daily_sum, BOUNDARY_TS, BOUNDARY_POS, BOUNDARY_STAKING
+from utils.time_index import time_slice
+
+logger = logging.getLogger(__name__)
 
 
 TIMESTAMP_COL = 'Timestamp(UTC+8)'
 
 
 def calculate_revenue(
-    df_ts_current: pd.DataFrame,
-    df_ts_prev: pd.DataFrame,
-    df_pos_current: pd.DataFrame,
-    df_pos_prev: pd.DataFrame,
-    df_staking_current: pd.DataFrame,
-    df_staking_prev: pd.DataFrame,
-    df_shitcode_current: pd.DataFrame,
-    df_shitcode_prev: pd.DataFrame
+    df_ts: pd.DataFrame,
+    df_pos: pd.DataFrame,
+    df_staking: pd.DataFrame,
+    df_shitcode: pd.DataFrame,
+    ts_start: pd.Timestamp,
+    pos_start: pd.Timestamp,
+    staking_start: pd.Timestamp,
+    shitcode_start: pd.Timestamp
 ) -> Dict[str, Any]:
     """
     计算 Revenue 数据（纯函数式）
     
+    每个来源传入覆盖 [prev_start, current_end) 的单个 DataFrame 及其本期起始时间，
+    两个周期的收入由一次按周期标签的分组求和得到。
+    
     Args:
-        df_ts_current: 当前周期的 TS_Log
-        df_ts_prev: 前一周期的 TS_Log
-        df_pos_current: 当前周期的 POS_Log
-        df_pos_prev: 前一周期的 POS_Log
-        df_staking_current: 当前周期的 Staking_Log
-        df_staking_prev: 前一周期的 Staking_Log
-        df_shitcode_current: 当前周期的 ShitCode_Log
-        df_shitcode_prev: 前一周期的 ShitCode_Log
+        df_ts: TS_Log
+        df_pos: POS_Log
+        df_staking: Staking_Log
+        df_shitcode: ShitCode_Log
+        ts_start: TS 本期起始时间
+        pos_start: POS 本期起始时间
+        staking_start: Staking 本期起始时间
+        shitcode_start: ShitCode 本期起始时间
     
     Returns:
         包含 metrics, dailyData, composition 的字典
     """
+    df_ts_current, ts_current, ts_prev = _split_period_revenue(df_ts, 'SOL_Received', ts_start)
+    df_pos_current, pos_current, pos_prev = _split_period_revenue(df_pos, 'SOL Received', pos_start)
+    df_staking_current, staking_current, staking_prev = _split_period_revenue(df_staking, 'SOL Received', staking_start)
+    df_shitcode_current, shitcode_current, shitcode_prev = _split_period_revenue(df_shitcode, 'SOL Received', shitcode_start)
+    
     # 计算指标
-    metrics = _compute_metrics(
-        df_ts_current, df_ts_prev,
-        df_pos_current, df_pos_prev,
-        df_staking_current, df_staking_prev,
-        df_shitcode_current, df_shitcode_prev
-    )
+    metrics_current = _period_metrics(ts_current, pos_current, staking_current, shitcode_current)
+    metrics_prev = _period_metrics(ts_prev, pos_prev, staking_prev, shitcode_prev)
     
     # 计算日数据
     daily_data = _calculate_daily_data(
@@ -50,42 +61,29 @@ def calculate_revenue(
         df_staking_current, df_shitcode_current
     )
     
-    # 计算收入构成
-    composition = _calculate_composition(
-        df_ts_current, df_pos_current,
-        df_staking_current, df_shitcode_current
-    )
-    
     return {
-        'metrics': metrics,
+        'metrics': _combine_metrics(metrics_current, metrics_prev),
         'dailyData': daily_data,
-        'composition': composition
+        'composition': _build_composition(metrics_current)
     }
 
 
-def _compute_metrics(
-    df_ts_current: pd.DataFrame,
-    df_ts_prev: pd.DataFrame,
-    df_pos_current: pd.DataFrame,
-    df_pos_prev: pd.DataFrame,
-    df_staking_current: pd.DataFrame,
-    df_staking_prev: pd.DataFrame,
-    df_shitcode_current: pd.DataFrame,
-    df_shitcode_prev: pd.DataFrame
-) -> Dict[str, Any]:
-    """计算当前周期和前一周期的指标及 Delta"""
+def _split_period_revenue(df: pd.DataFrame, value_col: str, current_start: pd.Timestamp) -> tuple:
+    """按周期标签一次分组求和，返回 (本期行, 本期收入, 前期收入)"""
     
-    # 当前周期指标
-    metrics_current = _compute_period_metrics(
-        df_ts_current, df_pos_current,
-        df_staking_current, df_shitcode_current
-    )
+    if len(df) == 0 or value_col not in df.columns:
+        return df, 0.0, 0.0
     
-    # 前一周期指标
-    metrics_prev = _compute_period_metrics(
-        df_ts_prev, df_pos_prev,
-        df_staking_prev, df_shitcode_prev
-    )
+    is_current = df[TIMESTAMP_COL] >= current_start
+    sums = df[value_col].groupby(is_current).sum()
+    return time_slice(df, current_start), float(sums.get(True, 0.0)), float(sums.get(False, 0.0))
+
+
+def _combine_metrics(
+    metrics_current: Dict[str, float],
+    metrics_prev: Dict[str, float]
+) -> Dict[str, Any]:
+    """合并本期和前期指标并计算 Delta"""
     
     # 计算 Delta（百分比）
     def calc_delta(current: float, prev: float) -> Optional[float]:
@@ -117,34 +115,20 @@ def _compute_metrics(
     }
 
 
-def _compute_period_metrics(
-    df_ts: pd.DataFrame,
-    df_pos: pd.DataFrame,
-    df_staking: pd.DataFrame,
-    df_shitcode: pd.DataFrame
+def _period_metrics(
+    ts_revenue: float,
+    pos_revenue: float,
+    staking_revenue: float,
+    shitcode_revenue: float
 ) -> Dict[str, float]:
-    """计算单个周期的指标"""
-    
-    # TS Revenue
-    ts_revenue = float(df_ts['SOL_Received'].sum()) if len(df_ts) > 0 and 'SOL_Received' in df_ts.columns else 0.0
-    
-    # POS Revenue
-    pos_revenue = float(df_pos['SOL Received'].sum()) if len(df_pos) > 0 and 'SOL Received' in df_pos.columns else 0.0
-    
-    # Staking Revenue
-    staking_revenue = float(df_staking['SOL Received'].sum()) if len(df_staking) > 0 and 'SOL Received' in df_staking.columns else 0.0
-    
-    # ShitCode Revenue
-    shitcode_revenue = float(df_shitcode['SOL Received'].sum()) if len(df_shitcode) > 0 and 'SOL Received' in df_shitcode.columns else 0.0
-    
-    total_revenue = ts_revenue + pos_revenue + staking_revenue + shitcode_revenue
+    """由各来源收入构建单个周期的指标"""
     
     return {
         'tsRevenue': ts_revenue,
         'posRevenue': pos_revenue,
         'stakingRevenue': staking_revenue,
         'shitCodeRevenue': shitcode_revenue,
-        'totalRevenue': total_revenue,
+        'totalRevenue': ts_revenue + pos_revenue + staking_revenue + shitcode_revenue,
     }
 
 
@@ -154,27 +138,13 @@ def _calculate_daily_data(
     df_staking: pd.DataFrame,
     df_shitcode: pd.DataFrame
 ) -> List[Dict[str, Any]]:
-    """计算日数据"""
-    
-    def apply_boundary(df: pd.DataFrame, boundary_hour: int) -> pd.DataFrame:
-        """应用时间边界"""
-        result = df.copy()
-        result['date'] = result[TIMESTAMP_COL].apply(
-            lambda ts: (ts - pd.Timedelta(days=1)).strftime('%Y-%m-%d') 
-            if ts.hour < boundary_hour else ts.strftime('%Y-%m-%d')
-        )
-        return result
+    """计算日数据 (各来源按自己的业务日边界分桶: TS 08:00, POS / Staking 12:00, ShitCode 00:00)"""
     
     # 应用各自的边界，聚合收入
-    ts_daily = apply_boundary(df_ts, 8).groupby('date')['SOL_Received'].sum() if len(df_ts) > 0 else pd.Series()
-    pos_daily = apply_boundary(df_pos, 12).groupby('date')['SOL Received'].sum() if len(df_pos) > 0 else pd.Series()
-    staking_daily = df_staking.copy()
-    staking_daily['date'] = staking_daily[TIMESTAMP_COL].dt.strftime('%Y-%m-%d')
-    staking_daily = staking_daily.groupby('date')['SOL Received'].sum() if len(df_staking) > 0 else pd.Series()
-    
-    shitcode_daily = df_shitcode.copy()
-    shitcode_daily['date'] = shitcode_daily[TIMESTAMP_COL].dt.strftime('%Y-%m-%d')
-    shitcode_daily = shitcode_daily.groupby('date')['SOL Received'].sum() if len(df_shitcode) > 0 else pd.Series()
+    ts_daily = daily_sum(df_ts, 'SOL_Received', BOUNDARY_TS) if len(df_ts) > 0 else pd.Series()
+    pos_daily = daily_sum(df_pos, 'SOL Received', BOUNDARY_POS) if len(df_pos) > 0 else pd.Series()
+    staking_daily = daily_sum(df_staking, 'SOL Received', BOUNDARY_STAKING) if len(df_staking) > 0 else pd.Series()
+    shitcode_daily = daily_sum(df_shitcode, 'SOL Received') if len(df_shitcode) > 0 else pd.Series()
     
     # 合并所有日期
     all_dates = sorted(set(ts_daily.index) | set(pos_daily.index) | set(staking_daily.index) | set(shitcode_daily.index))
@@ -197,15 +167,8 @@ def _calculate_daily_data(
     return result
 
 
-def _calculate_composition(
-    df_ts: pd.DataFrame,
-    df_pos: pd.DataFrame,
-    df_staking: pd.DataFrame,
-    df_shitcode: pd.DataFrame
-) -> List[Dict[str, Any]]:
-    """计算收入来源构成"""
-    
-    metrics = _compute_period_metrics(df_ts, df_pos, df_staking, df_shitcode)
+def _build_composition(metrics: Dict[str, float]) -> List[Dict[str, Any]]:
+    """由单周期指标构建收入构成 (过滤零项，按金额降序)"""
     
     # 构建构成数据
     composition_data = [
@@ -224,3 +187,129 @@ def _calculate_composition(
     result.sort(key=lambda x: x['amount'], reverse=True)
     
     return result
+
+
+# ============================================
+# SQL 引擎
+# ============================================
+
+# (来源, 表, 业务日起始小时 UTC+8, 指标键)
+_REVENUE_SOURCES = [
+    ('TS', 'take_a_SHIT', 8, 'tsRevenue'),
+    ('POS', 'shit_pos_rewards', 12, 'posRevenue'),
+    ('Staking', 'shit_staking_rewards', 12, 'stakingRevenue'),
+    ('ShitCode', 'SHIT_code', 0, 'shitCodeRevenue'),
+]
+
+
+def _business_date_sql(boundary_hour: int) -> str:
+    """UTC 时间列 -> 业务日期 (UTC+8 在 boundary_hour 切日) 的 SQL 表达式"""
+    offset = 8 - boundary_hour
+    if offset == 0:
+        return "DATE(block_time_dt)"
+    sign = '+' if offset > 0 else '-'
+    return f"DATE(block_time_dt {sign} INTERVAL {abs(offset)} HOUR)"
+
+
+def calculate_revenue_sql(start_date: str, end_date: str) -> Dict[str, Any]:
+    """
+    计算 Revenue 数据 (单次 SQL 扫描)
+    
+    四张表通过 UNION ALL 合并为一条查询，每个来源使用各自的业务日边界
+    (TS 08:00, POS / Staking 12:00, ShitCode 00:00) 划分周期和日期，
+    返回 (来源, 周期, 日期) 粒度的 SOL 汇总，在 Python 中组装为与 calculate_revenue 相同的结构。
+    """
+    return run_sql_calculation('Revenue', lambda: _sql_queries(start_date, end_date), _assemble_sql, _get_empty_response)
+
+
+async def calculate_revenue_sql_async(start_date: str, end_date: str) -> Dict[str, Any]:
+    """calculate_revenue_sql 的异步版本 (经异步引擎查询)，参数与返回值相同"""
+    return await run_sql_calculation_async('Revenue', lambda: _sql_queries(start_date, end_date), _assemble_sql, _get_empty_response)
+
+
+def _sql_queries(start_date: str, end_date: str) -> Dict[str, SqlQuery]:
+    """四个来源合并的单条 UNION ALL 查询"""
+    period_days = (pd.to_datetime(end_date) - pd.to_datetime(start_date)).days + 1
+    
+    branches = []
+    params = {}
+    for source, table, boundary_hour, _ in _REVENUE_SOURCES:
+        # 业务日起点 (UTC+8 boundary_hour) 转为 UTC
+        current_start = pd.to_datetime(start_date) + pd.Timedelta(hours=boundary_hour - 8)
+        current_end = current_start + pd.Timedelta(days=period_days)
+        prev_start = current_start - pd.Timedelta(days=period_days)
+        key = source.lower()
+        params.update({
+            f"{key}_start": prev_start.strftime('%Y-%m-%d %H:%M:%S'),
+            f"{key}_split": current_start.strftime('%Y-%m-%d %H:%M:%S'),
+            f"{key}_end": current_end.strftime('%Y-%m-%d %H:%M:%S'),
+        })
+        branches.append(f"""
+        SELECT
+            '{source}' as source,
+            CASE WHEN block_time_dt >= :{key}_split THEN 1 ELSE 0 END as is_current,
+            {_business_date_sql(boundary_hour)} as date,
+            SolSentToTreasury as sol
+        FROM {table}
+        WHERE block_time_dt >= :{key}_start AND block_time_dt < :{key}_end""")
+    
+    query = f"""
+    SELECT source, is_current, date, SUM(sol) as sol
+    FROM ({' UNION ALL '.join(branches)}
+    ) t
+    GROUP BY source, is_current, date
+    """
+    
+    def finalize(df: pd.DataFrame) -> pd.DataFrame:
+        logger.info(f"[Perf] Revenue 单次扫描得到 {len(df)} 行聚合结果")
+        return df
+    
+    return {'revenue': SqlQuery(query, params, finalize)}
+
+
+def _assemble_sql(results: Dict[str, Any]) -> Dict[str, Any]:
+    return _assemble_revenue(results['revenue'])
+
+
+def _assemble_revenue(df: pd.DataFrame) -> Dict[str, Any]:
+    """(来源, 周期, 日期, SOL) 聚合结果 -> metrics / dailyData / composition"""
+    
+    df['sol'] = df['sol'].astype(float).fillna(0.0)
+    df['is_current'] = df['is_current'].astype(int)
+    df['date'] = df['date'].astype(str)
+    metric_key = {source: key for source, _, _, key in _REVENUE_SOURCES}
+    
+    def period_metrics(rows: pd.DataFrame) -> Dict[str, float]:
+        by_source = rows.groupby('source')['sol'].sum()
+        metrics = {key: float(by_source.get(source, 0.0)) for source, key in metric_key.items()}
+        metrics['totalRevenue'] = sum(metrics.values())
+        return metrics
+    
+    current = df[df['is_current'] == 1]
+    metrics_current = period_metrics(current)
+    metrics_prev = period_metrics(df[df['is_current'] == 0])
+    
+    # 日数据: 日期 x 来源
+    daily = current.pivot_table(index='date', columns='source', values='sol', aggfunc='sum', fill_value=0.0)
+    daily_data = []
+    for date, row in zip(daily.index, daily.to_dict('records')):
+        entry = {'date': date}
+        for source, key in metric_key.items():
+            entry[key] = float(row.get(source, 0.0))
+        entry['totalRevenue'] = sum(entry[key] for key in metric_key.values())
+        daily_data.append(entry)
+    
+    return {
+        'metrics': _combine_metrics(metrics_current, metrics_prev),
+        'dailyData': daily_data,
+        'composition': _build_composition(metrics_current)
+    }
+
+
+def _get_empty_response() -> Dict[str, Any]:
+    return _assemble_revenue(pd.DataFrame({
+        'source': pd.Series(dtype=object),
+        'is_current': pd.Series(dtype=int),
+        'date': pd.Series(dtype=object),
+        'sol': pd.Series(dtype=float)
+    }))
@@ -1,37 +1,50 @@
 """
 ShitCode 数据计算模块
 计算 ShitCode 相关的指标、日数据和用户排行
-纯函数式实现 - 直接接收 df_current 和 df_prev
+纯函数式实现 - 接收覆盖本期与前期的单个 DataFrame，按本期起始时间一次分组得到两个周期的指标
+也支持流式分块输入 (calculate_shitcode_chunked)，逐块折叠部分聚合结果
+SQL 版 (calculate_shitcode_sql / calculate_shitcode_sql_async) 直接在数据库中聚合，不拉取原始记录
 """
-from typing import Dict, Any, List, Optional
+import logging
+from typing import Dict, Any, List, Optional, Iterable
 import pandas as pd
+from utils.sql_query import SqlQuery, run_sql_calculation, run_sql_calculation_async
+from utils.business_day import business_day_key, format_day_index
+from utils.time_index import time_slice
+
+logger = logging.getLogger(__name__)
 
 
 TIMESTAMP_COL = 'Timestamp(UTC+8)'
 
 
 def calculate_shitcode(
-    df_current: pd.DataFrame,
-    df_prev: pd.DataFrame
+    df: pd.DataFrame,
+    current_start: pd.Timestamp
 ) -> Dict[str, Any]:
     """
     计算 ShitCode 数据（纯函数式）
     
+    按 (周期标签, 地址) 一次分组聚合，同时得到两个周期的指标和本期用户排行。
+    
     Args:
-        df_current: 当前周期的 ShitCode_Log
-        df_prev: 前一周期的 ShitCode_Log
+        df: 覆盖 [prev_start, current_end) 的 ShitCode_Log
+        current_start: 本期起始时间，早于此时间的行属于前一周期
     
     Returns:
         包含 metrics, dailyData, topUsers 的字典
     """
+    is_current = df[TIMESTAMP_COL] >= current_start
+    users_current, users_prev = _user_partials(df, is_current)
+    
     # 计算指标
-    metrics = _compute_metrics(df_current, df_prev)
+    metrics = _combine_metrics(_finalize_period(users_current), _finalize_period(users_prev))
     
     # 计算日数据
-    daily_data = _calculate_daily_data(df_current)
+    daily_data = _calculate_daily_data(time_slice(df, current_start))
     
     # 计算用户排行
-    top_users = _calculate_top_users(df_current)
+    top_users = _finalize_top_users(users_current)
     
     return {
         'metrics': metrics,
@@ -40,17 +53,51 @@ def calculate_shitcode(
     }
 
 
-def _compute_metrics(
-    df_current: pd.DataFrame,
-    df_prev: pd.DataFrame
+def calculate_shitcode_chunked(
+    chunks: Iterable[pd.DataFrame],
+    current_start: pd.Timestamp
 ) -> Dict[str, Any]:
-    """计算当前周期和前一周期的指标及 Delta"""
+    """
+    计算 ShitCode 数据（流式分块版本）
+    
+    每个周期只保留按地址聚合的 (金额, 次数)，独立地址数即聚合结果的行数。
+    
+    Args:
+        chunks: 覆盖 [prev_start, current_end) 的 DataFrame 分块迭代器
+        current_start: 本期起始时间，早于此时间的行属于前一周期
+    
+    Returns:
+        与 calculate_shitcode 相同结构的字典
+    """
+    user_parts_current = []
+    user_parts_prev = []
+    daily_parts = []
     
-    # 当前周期指标
-    metrics_current = _compute_period_metrics(df_current)
+    for chunk in chunks:
+        is_current = chunk[TIMESTAMP_COL] >= current_start
+        users_current, users_prev = _user_partials(chunk, is_current)
+        if users_current is not None:
+            user_parts_current.append(users_current)
+            daily_parts.append(_daily_partial(time_slice(chunk, current_start)))
+        if users_prev is not None:
+            user_parts_prev.append(users_prev)
     
-    # 前一周期指标
-    metrics_prev = _compute_period_metrics(df_prev)
+    users_current = _merge_user_partials(user_parts_current)
+    users_prev = _merge_user_partials(user_parts_prev)
+    daily = pd.concat(daily_parts).groupby(level=0).sum() if daily_parts else None
+    
+    return {
+        'metrics': _combine_metrics(_finalize_period(users_current), _finalize_period(users_prev)),
+        'dailyData': _finalize_daily(daily),
+        'topUsers': _finalize_top_users(users_current)
+    }
+
+
+def _combine_metrics(
+    metrics_current: Dict[str, Any],
+    metrics_prev: Dict[str, Any]
+) -> Dict[str, Any]:
+    """合并本期和前期指标并计算 Delta"""
     
     # 计算 Delta（百分比）
     def calc_delta(current: Any, prev: Any) -> Optional[float]:
@@ -82,10 +129,10 @@ def _compute_metrics(
     }
 
 
-def _compute_period_metrics(df: pd.DataFrame) -> Dict[str, Any]:
-    """计算单个周期的指标"""
+def _finalize_period(user_stats: Optional[pd.DataFrame]) -> Dict[str, Any]:
+    """由按地址聚合的结果计算单个周期的指标"""
     
-    if len(df) == 0:
+    if user_stats is None or len(user_stats) == 0:
         return {
             'claimCount': 0,
             'claimAmount': 0.0,
@@ -93,16 +140,14 @@ def _compute_period_metrics(df: pd.DataFrame) -> Dict[str, Any]:
             'avgClaimPerAddress': None,
         }
     
-    claim_count = len(df)
-    claim_amount = float(df['SHIT Sent'].sum())
-    unique_addresses = int(df['Receiver Address'].nunique())
-    avg_claim_per_address = claim_amount / unique_addresses if unique_addresses > 0 else None
+    claim_amount = float(user_stats['claimAmount'].sum())
+    unique_addresses = int(user_stats.index.notna().sum())
     
     return {
-        'claimCount': claim_count,
+        'claimCount': int(user_stats['rowCount'].sum()),
         'claimAmount': claim_amount,
         'uniqueAddresses': unique_addresses,
-        'avgClaimPerAddress': avg_claim_per_address,
+        'avgClaimPerAddress': claim_amount / unique_addresses if unique_addresses > 0 else None,
     }
 
 
@@ -114,23 +159,31 @@ def _calculate_daily_data(
     if len(df) == 0:
         return []
     
+    return _finalize_daily(_daily_partial(df))
+
+
+def _daily_partial(df: pd.DataFrame) -> pd.DataFrame:
+    """按自然日聚合次数、金额和 SOL 收入，索引为 date"""
+    
     # 提取日期
-    df = df.copy()
-    df['date'] = df[TIMESTAMP_COL].dt.strftime('%Y-%m-%d')
+    dates = business_day_key(df[TIMESTAMP_COL])
     
     # 按日期聚合
-    daily = df.groupby('date').agg({
-        TIMESTAMP_COL: 'count',  # claimCount
-        'SHIT Sent': 'sum',       # claimAmount
-        'SOL Received': 'sum'     # solReceived
-    }).reset_index()
-    
-    # 重命名列 - 直接赋值，避免多级列问题
-    daily = daily.rename(columns={
-        TIMESTAMP_COL: 'claimCount',
-        'SHIT Sent': 'claimAmount',
-        'SOL Received': 'solReceived'
-    })
+    grouped = df.groupby(dates)
+    return format_day_index(pd.DataFrame({
+        'claimCount': grouped.size(),
+        'claimAmount': grouped['SHIT Sent'].sum(),
+        'solReceived': grouped['SOL Received'].sum()
+    }))
+
+
+def _finalize_daily(daily: Optional[pd.DataFrame]) -> List[Dict[str, Any]]:
+    """日聚合结果 -> 输出记录"""
+    
+    if daily is None or len(daily) == 0:
+        return []
+    
+    daily = daily.sort_index().rename_axis('date').reset_index()
     
     return daily[['date', 'claimCount', 'claimAmount', 'solReceived']].astype({
         'claimCount': 'int',
@@ -139,22 +192,51 @@ def _calculate_daily_data(
     }).to_dict('records')
 
 
-def _calculate_top_users(
-    df: pd.DataFrame,
-    top_n: int = 10
-) -> List[Dict[str, Any]]:
-    """计算用户排行"""
+def _user_partials(df: pd.DataFrame, is_current: pd.Series) -> tuple:
+    """
+    按 (周期标签, 地址) 一次分组聚合，返回 (本期, 前期) 的地址聚合，空周期为 None
+
+    列: claimAmount (金额合计), claimCount (有金额的记录数，用户排行使用), rowCount (全部记录数)；
+    空地址的记录单独成组 (索引为 NaN)，只计入周期总量，不计入独立地址数和排行。
+    """
     
     if len(df) == 0:
-        return []
+        return None, None
     
-    # 按地址聚合
-    user_stats = df.groupby('Receiver Address', as_index=False).agg({
-        'SHIT Sent': ['sum', 'count']
+    # 保留空地址分组 (dropna=False)，周期总次数 / 总金额覆盖全部行，与 SQL 的 COUNT(*) 一致
+    grouped = df.groupby([is_current.rename('isCurrent'), 'Receiver Address'], observed=True, dropna=False)
+    amounts = grouped['SHIT Sent']
+    stats = pd.DataFrame({
+        'claimAmount': amounts.sum(),
+        'claimCount': amounts.count(),
+        'rowCount': grouped.size()
     })
+    periods = stats.index.get_level_values(0)
+    
+    def period(flag: bool) -> Optional[pd.DataFrame]:
+        part = stats[periods == flag].droplevel(0)
+        return part if len(part) > 0 else None
+    
+    return period(True), period(False)
+
+
+def _merge_user_partials(parts: List[pd.DataFrame]) -> Optional[pd.DataFrame]:
+    """合并分块的地址聚合 (保留空地址分组)"""
+    if not parts:
+        return None
+    return pd.concat(parts).groupby(level=0, observed=True, dropna=False).sum()
+
+
+def _finalize_top_users(
+    user_stats: Optional[pd.DataFrame],
+    top_n: int = 10
+) -> List[Dict[str, Any]]:
+    """地址聚合结果 -> 用户排行"""
     
-    # 扁平化多级列名
-    user_stats.columns = ['fullAddress', 'claimAmount', 'claimCount']
+    if user_stats is None or len(user_stats) == 0:
+        return []
+    
+    user_stats = user_stats[user_stats.index.notna()].rename_axis('fullAddress').reset_index()
     
     # 排序并取前 N
     user_stats = user_stats.sort_values('claimAmount', ascending=False).head(top_n)
@@ -169,3 +251,141 @@ def _calculate_top_users(
         'claimCount': 'int',
         'claimAmount': 'float'
     }).to_dict('records')
+
+
+# ============================================
+# SQL 引擎
+# ============================================
+
+def calculate_shitcode_sql(start_date: str, end_date: str, top_n: int = 10) -> Dict[str, Any]:
+    """
+    计算 ShitCode 数据 (完全基于 SQL 聚合，多线程并行优化)
+    
+    业务日以 UTC+8 00:00 为界，即前一天 UTC 16:00；返回结构与 calculate_shitcode 相同。
+    """
+    return run_sql_calculation('ShitCode', lambda: _sql_queries(start_date, end_date, top_n), _assemble_sql, _get_empty_response)
+
+
+async def calculate_shitcode_sql_async(start_date: str, end_date: str, top_n: int = 10) -> Dict[str, Any]:
+    """calculate_shitcode_sql 的异步版本 (同一组查询经异步引擎并发执行)，参数与返回值相同"""
+    return await run_sql_calculation_async('ShitCode', lambda: _sql_queries(start_date, end_date, top_n), _assemble_sql, _get_empty_response)
+
+
+def _sql_queries(start_date: str, end_date: str, top_n: int) -> Dict[str, SqlQuery]:
+    """本期 / 前期指标、日数据、排行四条互不依赖的查询"""
+    # 日期边界 (UTC+8 00:00 -> UTC 前一天 16:00)
+    period_days = (pd.to_datetime(end_date) - pd.to_datetime(start_date)).days + 1
+    current_start = pd.to_datetime(start_date) - pd.Timedelta(hours=8)
+    current_end = current_start + pd.Timedelta(days=period_days)
+    prev_start = current_start - pd.Timedelta(days=period_days)
+    
+    logger.info(f"[Perf] 开始计算 ShitCode 数据: {start_date} ~ {end_date} (环比从 {prev_start.date()})")
+    
+    return {
+        'current': _period_metrics_query(current_start, current_end),
+        'prev': _period_metrics_query(prev_start, current_start),
+        'daily': _daily_data_query(current_start, current_end),
+        'top': _top_users_query(current_start, current_end, top_n),
+    }
+
+
+def _assemble_sql(results: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'metrics': _combine_metrics(results['current'], results['prev']),
+        'dailyData': results['daily'],
+        'topUsers': results['top']
+    }
+
+
+def _sql_params(start_utc: pd.Timestamp, end_utc: pd.Timestamp) -> Dict[str, str]:
+    return {
+        "start": start_utc.strftime('%Y-%m-%d %H:%M:%S'),
+        "end": end_utc.strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+
+def _period_metrics_query(start_utc, end_utc) -> SqlQuery:
+    """单周期 SQL 聚合指标"""
+    query = """
+    SELECT
+        COUNT(*) as claimCount,
+        SUM(amount) as claimAmount,
+        COUNT(DISTINCT to_user) as uniqueAddresses
+    FROM SHIT_code
+    WHERE block_time_dt >= :start AND block_time_dt < :end
+    """
+    def finalize(row) -> Dict[str, Any]:
+        claim_count = int(row[0] or 0)
+        if claim_count == 0:
+            return _finalize_period(None)
+        
+        claim_amount = float(row[1] or 0.0)
+        unique_addresses = int(row[2] or 0)
+        return {
+            'claimCount': claim_count,
+            'claimAmount': claim_amount,
+            'uniqueAddresses': unique_addresses,
+            'avgClaimPerAddress': claim_amount / unique_addresses if unique_addresses > 0 else None,
+        }
+    
+    return SqlQuery(query, _sql_params(start_utc, end_utc), finalize, one_row=True)
+
+
+def _daily_data_query(start_utc, end_utc) -> SqlQuery:
+    """日数据 SQL 聚合 (业务日 = UTC 时间 + 8 小时 的日期)"""
+    query = """
+    SELECT
+        DATE(block_time_dt + INTERVAL 8 HOUR) as date,
+        COUNT(*) as claimCount,
+        SUM(amount) as claimAmount,
+        SUM(SolSentToTreasury) as solReceived
+    FROM SHIT_code
+    WHERE block_time_dt >= :start AND block_time_dt < :end
+    GROUP BY date
+    ORDER BY date
+    """
+    def finalize(df: pd.DataFrame) -> List[Dict[str, Any]]:
+        if df.empty:
+            return []
+        df['date'] = df['date'].astype(str)
+        return df.fillna(0.0).astype({
+            'claimCount': 'int',
+            'claimAmount': 'float',
+            'solReceived': 'float'
+        }).to_dict('records')
+    
+    return SqlQuery(query, _sql_params(start_utc, end_utc), finalize)
+
+
+def _top_users_query(start_utc, end_utc, top_n: int = 10) -> SqlQuery:
+    """用户排行 SQL 聚合"""
+    query = """
+    SELECT
+        to_user as fullAddress,
+        COUNT(amount) as claimCount,
+        SUM(amount) as claimAmount
+    FROM SHIT_code
+    WHERE block_time_dt >= :start AND block_time_dt < :end
+        AND to_user IS NOT NULL
+    GROUP BY to_user
+    ORDER BY claimAmount DESC
+    LIMIT :limit
+    """
+    def finalize(df: pd.DataFrame) -> List[Dict[str, Any]]:
+        if df.empty:
+            return []
+        df['address'] = df['fullAddress'].apply(lambda x: f"{x[:4]}...{x[-4:]}")
+        return df[['address', 'fullAddress', 'claimCount', 'claimAmount']].fillna({'claimAmount': 0.0}).astype({
+            'claimCount': 'int',
+            'claimAmount': 'float'
+        }).to_dict('records')
+    
+    return SqlQuery(query, {**_sql_params(start_utc, end_utc), "limit": top_n}, finalize)
+
+
+def _get_empty_response() -> Dict[str, Any]:
+    return {
+        'metrics': _combine_metrics(_finalize_period(None), _finalize_period(None)),
+        'dailyData': [],
+        'topUsers': []
+    }
@@ -1,37 +1,52 @@
 """
 Staking 数据计算模块
 计算质押相关的指标、日数据和大户排行
-纯函数式实现 - 直接接收 df_current 和 df_prev
+纯函数式实现 - 接收覆盖本期与前期的单个 DataFrame，按本期起始时间一次分组得到两个周期的指标
+也支持流式分块输入 (calculate_staking_chunked)，逐块折叠部分聚合结果
+SQL 版 (calculate_staking_sql / calculate_staking_sql_async) 用条件聚合在数据库中一次算出两个周期的指标
 """
-from typing import Dict, Any, List, Optional
+import logging
+from typing import Dict, Any, List, Optional, Iterable
 import pandas as pd
+from utils.sql_query import SqlQuery, run_sql_calculation, run_sql_calculation_async
+from utils.business_day import daily_sum, BOUNDARY_STAKING
+from utils.time_index import time_slice
+
+logger = logging.getLogger(__name__)
 
 
 TIMESTAMP_COL = 'Timestamp(UTC+8)'
 
 
 def calculate_staking(
-    df_amount_current: pd.DataFrame,
-    df_log_current: pd.DataFrame,
-    df_amount_prev: pd.DataFrame,
-    df_log_prev: pd.DataFrame
+    df_amount: pd.DataFrame,
+    df_log: pd.DataFrame,
+    current_start: pd.Timestamp
 ) -> Dict[str, Any]:
     """
     计算 Staking 数据（纯函数式）
     
+    两张表各按周期标签一次分组聚合得到两个周期的指标，日数据和排行只取本期行。
+    
     Args:
-        df_amount_current: 当前周期的 Staking_Amount_Log
-        df_log_current: 当前周期的 Staking_Log
-        df_amount_prev: 前一周期的 Staking_Amount_Log
-        df_log_prev: 前一周期的 Staking_Log
+        df_amount: 覆盖 [prev_start, current_end) 的 Staking_Amount_Log
+        df_log: 覆盖 [prev_start, current_end) 的 Staking_Log
+        current_start: 本期起始时间，早于此时间的行属于前一周期
     
     Returns:
         包含 metrics, dailyData, topStakers 的字典
     """
+    amount_is_current = df_amount[TIMESTAMP_COL] >= current_start
+    log_is_current = df_log[TIMESTAMP_COL] >= current_start
+    df_amount_current = time_slice(df_amount, current_start)
+    df_log_current = time_slice(df_log, current_start)
+    
     # 计算指标
-    metrics = _compute_metrics(
-        df_amount_current, df_log_current,
-        df_amount_prev, df_log_prev
+    amount_current, amount_prev = _amount_partials(df_amount, amount_is_current)
+    reward_current, reward_prev = _reward_partials(df_log, log_is_current)
+    metrics = _combine_metrics(
+        _merge_partials(amount_current, reward_current),
+        _merge_partials(amount_prev, reward_prev)
     )
     
     # 计算日数据
@@ -47,41 +62,153 @@ def calculate_staking(
     }
 
 
-def _compute_metrics(
-    df_amount_current: pd.DataFrame,
-    df_log_current: pd.DataFrame,
-    df_amount_prev: pd.DataFrame,
-    df_log_prev: pd.DataFrame
+def calculate_staking_chunked(
+    amount_chunks: Iterable[pd.DataFrame],
+    log_chunks: Iterable[pd.DataFrame],
+    current_start: pd.Timestamp
 ) -> Dict[str, Any]:
-    """计算当前周期和前一周期的指标及 Delta"""
+    """
+    计算 Staking 数据（流式分块版本）
     
-    # 当前周期指标
-    total_stake_current = float(
-        df_amount_current[df_amount_current['Type'] == 'STAKE']['SHIT Amount'].sum()
-    )
-    total_unstake_current = float(
-        df_amount_current[df_amount_current['Type'] == 'UNSTAKE']['SHIT Amount'].sum()
-    )
+    Args:
+        amount_chunks: Staking_Amount_Log 分块迭代器，覆盖 [prev_start, current_end)
+        log_chunks: Staking_Log 分块迭代器，覆盖 [prev_start, current_end)
+        current_start: 本期起始时间，早于此时间的行属于前一周期
+    
+    Returns:
+        与 calculate_staking 相同结构的字典
+    """
+    partial_current = _amount_partial(pd.DataFrame())
+    partial_prev = _amount_partial(pd.DataFrame())
+    stake_daily_parts = []
+    staker_parts = []
+    
+    for chunk in amount_chunks:
+        is_current = chunk[TIMESTAMP_COL] >= current_start
+        chunk_current = time_slice(chunk, current_start)
+        chunk_partial_current, chunk_partial_prev = _amount_partials(chunk, is_current)
+        partial_current = _merge_partials(partial_current, chunk_partial_current)
+        partial_prev = _merge_partials(partial_prev, chunk_partial_prev)
+        stake_current = chunk_current[chunk_current['Type'] == 'STAKE']
+        if not stake_current.empty:
+            stake_daily_parts.append(_daily_sum(stake_current, 'SHIT Amount'))
+            staker_parts.append(stake_current.groupby('Address', observed=True)['SHIT Amount'].sum())
+    
+    reward_daily_parts = []
+    for chunk in log_chunks:
+        is_current = chunk[TIMESTAMP_COL] >= current_start
+        chunk_current = time_slice(chunk, current_start)
+        chunk_partial_current, chunk_partial_prev = _reward_partials(chunk, is_current)
+        partial_current = _merge_partials(partial_current, chunk_partial_current)
+        partial_prev = _merge_partials(partial_prev, chunk_partial_prev)
+        if not chunk_current.empty:
+            reward_daily_parts.append(_daily_sum(chunk_current, 'SHIT Sent'))
+    
+    stake_agg = pd.concat(stake_daily_parts).groupby(level=0).sum() if stake_daily_parts else pd.Series(dtype=float)
+    reward_agg = pd.concat(reward_daily_parts).groupby(level=0).sum() if reward_daily_parts else pd.Series(dtype=float)
+    stakers = pd.concat(staker_parts).groupby(level=0, observed=True).sum() if staker_parts else None
+    
+    return {
+        'metrics': _combine_metrics(partial_current, partial_prev),
+        'dailyData': _merge_daily(stake_agg, reward_agg),
+        'topStakers': _finalize_top_stakers(stakers)
+    }
+
+
+def _amount_partial(df_amount: pd.DataFrame) -> Dict[str, Any]:
+    """质押事件的可合并部分聚合"""
+    
+    if len(df_amount) == 0:
+        return {'totalStake': 0.0, 'totalUnstake': 0.0, 'stakeCount': 0, 'rewardCount': 0, 'rewardAmount': 0.0}
+    
+    is_stake = df_amount['Type'] == 'STAKE'
+    return {
+        'totalStake': float(df_amount.loc[is_stake, 'SHIT Amount'].sum()),
+        'totalUnstake': float(df_amount.loc[df_amount['Type'] == 'UNSTAKE', 'SHIT Amount'].sum()),
+        'stakeCount': int(is_stake.sum()),
+        'rewardCount': 0,
+        'rewardAmount': 0.0,
+    }
+
+
+def _reward_partial(df_log: pd.DataFrame) -> Dict[str, Any]:
+    """质押奖励的可合并部分聚合"""
+    
+    return {
+        'totalStake': 0.0,
+        'totalUnstake': 0.0,
+        'stakeCount': 0,
+        'rewardCount': int(len(df_log)),
+        'rewardAmount': float(df_log['SHIT Sent'].sum()) if len(df_log) > 0 else 0.0,
+    }
+
+
+def _amount_partials(df_amount: pd.DataFrame, is_current: pd.Series) -> tuple:
+    """按 (周期标签, 类型) 一次分组聚合质押事件，返回 (本期, 前期) 的部分聚合"""
+    
+    if len(df_amount) == 0:
+        return _amount_partial(pd.DataFrame()), _amount_partial(pd.DataFrame())
+    
+    stats = df_amount.groupby([is_current.rename('isCurrent'), 'Type'], observed=True)['SHIT Amount'].agg(['sum', 'size'])
+    
+    def partial(flag: bool) -> Dict[str, Any]:
+        def get(kind: str, col: str):
+            return stats[col].get((flag, kind), 0)
+        return {
+            'totalStake': float(get('STAKE', 'sum')),
+            'totalUnstake': float(get('UNSTAKE', 'sum')),
+            'stakeCount': int(get('STAKE', 'size')),
+            'rewardCount': 0,
+            'rewardAmount': 0.0,
+        }
+    
+    return partial(True), partial(False)
+
+
+def _reward_partials(df_log: pd.DataFrame, is_current: pd.Series) -> tuple:
+    """按周期标签一次分组聚合质押奖励，返回 (本期, 前期) 的部分聚合"""
+    
+    if len(df_log) == 0:
+        return _reward_partial(pd.DataFrame()), _reward_partial(pd.DataFrame())
+    
+    stats = df_log.groupby(is_current.rename('isCurrent'))['SHIT Sent'].agg(['sum', 'size'])
+    
+    def partial(flag: bool) -> Dict[str, Any]:
+        return {
+            'totalStake': 0.0,
+            'totalUnstake': 0.0,
+            'stakeCount': 0,
+            'rewardCount': int(stats['size'].get(flag, 0)),
+            'rewardAmount': float(stats['sum'].get(flag, 0.0)),
+        }
+    
+    return partial(True), partial(False)
+
+
+def _merge_partials(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
+    """合并两个部分聚合 (全部为可加指标)"""
+    return {key: a[key] + b[key] for key in a}
+
+
+def _combine_metrics(
+    metrics_current: Dict[str, Any],
+    metrics_prev: Dict[str, Any]
+) -> Dict[str, Any]:
+    """由两个周期的部分聚合计算指标及 Delta"""
+    
+    total_stake_current = metrics_current['totalStake']
+    total_unstake_current = metrics_current['totalUnstake']
     net_stake_current = total_stake_current - total_unstake_current
-    stake_count_current = int(
-        len(df_amount_current[df_amount_current['Type'] == 'STAKE'])
-    )
-    reward_count_current = int(len(df_log_current))
-    reward_amount_current = float(df_log_current['SHIT Sent'].sum())
+    stake_count_current = metrics_current['stakeCount']
+    reward_count_current = metrics_current['rewardCount']
+    reward_amount_current = metrics_current['rewardAmount']
     
-    # 前一周期指标
-    total_stake_prev = float(
-        df_amount_prev[df_amount_prev['Type'] == 'STAKE']['SHIT Amount'].sum()
-    )
-    total_unstake_prev = float(
-        df_amount_prev[df_amount_prev['Type'] == 'UNSTAKE']['SHIT Amount'].sum()
-    )
+    total_stake_prev = metrics_prev['totalStake']
+    total_unstake_prev = metrics_prev['totalUnstake']
     net_stake_prev = total_stake_prev - total_unstake_prev
-    stake_count_prev = int(
-        len(df_amount_prev[df_amount_prev['Type'] == 'STAKE'])
-    )
-    reward_count_prev = int(len(df_log_prev))
-    reward_amount_prev = float(df_log_prev['SHIT Sent'].sum())
+    stake_count_prev = metrics_prev['stakeCount']
+    reward_count_prev = metrics_prev['rewardCount']
+    reward_amount_prev = metrics_prev['rewardAmount']
     
     # 计算 Delta（百分比）
     def calc_delta(current: float, prev: float) -> Optional[float]:
@@ -116,35 +243,30 @@ def _compute_metrics(
     }
 
 
+def _daily_sum(df: pd.DataFrame, value_col: str) -> pd.Series:
+    """按业务日期 (12pm 边界) 对 value_col 求和，索引为 date"""
+    return daily_sum(df, value_col, BOUNDARY_STAKING)
+
+
 def _calculate_daily_data(
     df_amount: pd.DataFrame,
     df_log: pd.DataFrame
 ) -> List[Dict[str, Any]]:
     """计算日数据（遵循 12pm 边界逻辑）"""
     
-    # 辅助函数：根据 12pm 边界转换业务日期
-    def get_business_date(ts):
-        if ts.hour < 12:
-            return (ts - pd.Timedelta(days=1)).strftime('%Y-%m-%d')
-        return ts.strftime('%Y-%m-%d')
-
     # 聚合 STAKE 数据
-    stake_daily = df_amount[df_amount['Type'] == 'STAKE'].copy()
-    if not stake_daily.empty:
-        stake_daily['date'] = stake_daily[TIMESTAMP_COL].apply(get_business_date)
-        stake_agg = stake_daily.groupby('date')['SHIT Amount'].sum()
-    else:
-        stake_agg = pd.Series(dtype=float)
+    stake_daily = df_amount[df_amount['Type'] == 'STAKE'] if not df_amount.empty else df_amount
+    stake_agg = _daily_sum(stake_daily, 'SHIT Amount') if not stake_daily.empty else pd.Series(dtype=float)
     
     # 聚合奖励数据
-    reward_daily = df_log.copy()
-    if not reward_daily.empty:
-        reward_daily['date'] = reward_daily[TIMESTAMP_COL].apply(get_business_date)
-        reward_agg = reward_daily.groupby('date')['SHIT Sent'].sum()
-    else:
-        reward_agg = pd.Series(dtype=float)
-    
-    # 合并日期并构建结果
+    reward_agg = _daily_sum(df_log, 'SHIT Sent') if not df_log.empty else pd.Series(dtype=float)
+    
+    return _merge_daily(stake_agg, reward_agg)
+
+
+def _merge_daily(stake_agg: pd.Series, reward_agg: pd.Series) -> List[Dict[str, Any]]:
+    """合并日期并构建结果"""
+    
     all_dates = sorted(set(stake_agg.index) | set(reward_agg.index))
     result = [
         {
@@ -169,16 +291,201 @@ def _calculate_top_stakers(
     
     # 筛选 STAKE 记录并聚合
     stake_data = df_amount[df_amount['Type'] == 'STAKE']
-    staker_stats = stake_data.groupby('Address', as_index=False).agg({
-        'SHIT Amount': 'sum'
-    }).sort_values('SHIT Amount', ascending=False).head(top_n)
+    return _finalize_top_stakers(stake_data.groupby('Address', observed=True)['SHIT Amount'].sum(), top_n)
+
+
+def _finalize_top_stakers(
+    staker_totals: Optional[pd.Series],
+    top_n: int = 10
+) -> List[Dict[str, Any]]:
+    """地址质押总额 -> 大户排行"""
+    
+    if staker_totals is None:
+        return []
+    
+    staker_stats = staker_totals.rename('amount').rename_axis('fullAddress').reset_index()
+    staker_stats = staker_stats.sort_values('amount', ascending=False).head(top_n)
     
     # 添加缩写地址
-    staker_stats['address'] = staker_stats['Address'].apply(
+    staker_stats['address'] = staker_stats['fullAddress'].apply(
         lambda addr: f"{addr[:4]}...{addr[-4:]}"
     )
-    staker_stats = staker_stats.rename(columns={'Address': 'fullAddress', 'SHIT Amount': 'amount'})
     
     return staker_stats[['address', 'fullAddress', 'amount']].astype({
         'amount': 'float'
     }).to_dict('records')
+
+
+# ============================================
+# SQL 引擎
+# ============================================
+
+def calculate_staking_sql(start_date: str, end_date: str, top_n: int = 10) -> Dict[str, Any]:
+    """
+    计算 Staking 数据 (完全基于 SQL 聚合，多线程并行优化)
+    
+    业务日以 UTC+8 12:00 为界，即 UTC 04:00；返回结构与 calculate_staking 相同。
+    """
+    return run_sql_calculation('Staking', lambda: _sql_queries(start_date, end_date, top_n), _assemble_sql, _get_empty_response)
+
+
+async def calculate_staking_sql_async(start_date: str, end_date: str, top_n: int = 10) -> Dict[str, Any]:
+    """calculate_staking_sql 的异步版本 (同一组查询经异步引擎并发执行)，参数与返回值相同"""
+    return await run_sql_calculation_async('Staking', lambda: _sql_queries(start_date, end_date, top_n), _assemble_sql, _get_empty_response)
+
+
+def _sql_queries(start_date: str, end_date: str, top_n: int) -> Dict[str, SqlQuery]:
+    """质押事件、奖励、日数据、排行四条互不依赖的查询 (两个周期的指标各由一条条件聚合查询得出)"""
+    # 日期边界 (UTC+8 12:00 -> UTC 04:00)
+    period_days = (pd.to_datetime(end_date) - pd.to_datetime(start_date)).days + 1
+    current_start = pd.to_datetime(start_date) + pd.Timedelta(hours=4)
+    current_end = current_start + pd.Timedelta(days=period_days)
+    prev_start = current_start - pd.Timedelta(days=period_days)
+    
+    logger.info(f"[Perf] 开始计算 Staking 数据: {start_date} ~ {end_date} (环比从 {prev_start.date()})")
+    
+    return {
+        'events': _event_partials_query(prev_start, current_start, current_end),
+        'rewards': _reward_partials_query(prev_start, current_start, current_end),
+        'daily': _daily_data_query(current_start, current_end),
+        'top': _top_stakers_query(current_start, current_end, top_n),
+    }
+
+
+def _assemble_sql(results: Dict[str, Any]) -> Dict[str, Any]:
+    events_current, events_prev = results['events']
+    rewards_current, rewards_prev = results['rewards']
+    return {
+        'metrics': _combine_metrics(
+            _merge_partials(events_current, rewards_current),
+            _merge_partials(events_prev, rewards_prev)
+        ),
+        'dailyData': results['daily'],
+        'topStakers': results['top']
+    }
+
+
+def _sql_params(start_utc: pd.Timestamp, end_utc: pd.Timestamp, split_utc: Optional[pd.Timestamp] = None) -> Dict[str, str]:
+    params = {
+        "start": start_utc.strftime('%Y-%m-%d %H:%M:%S'),
+        "end": end_utc.strftime('%Y-%m-%d %H:%M:%S')
+    }
+    if split_utc is not None:
+        params["split"] = split_utc.strftime('%Y-%m-%d %H:%M:%S')
+    return params
+
+
+def _event_partials_query(start_utc, split_utc, end_utc) -> SqlQuery:
+    """质押事件条件聚合: 一次查询得到 (本期, 前期) 的 STAKE / UNSTAKE 部分聚合"""
+    query = """
+    SELECT
+        SUM(CASE WHEN block_time_dt >= :split AND event_type = 'STAKE' THEN amount END) as stakeCurr,
+        SUM(CASE WHEN block_time_dt >= :split AND event_type = 'UNSTAKE' THEN amount END) as unstakeCurr,
+        COUNT(CASE WHEN block_time_dt >= :split AND event_type = 'STAKE' THEN 1 END) as stakeCountCurr,
+        SUM(CASE WHEN block_time_dt < :split AND event_type = 'STAKE' THEN amount END) as stakePrev,
+        SUM(CASE WHEN block_time_dt < :split AND event_type = 'UNSTAKE' THEN amount END) as unstakePrev,
+        COUNT(CASE WHEN block_time_dt < :split AND event_type = 'STAKE' THEN 1 END) as stakeCountPrev
+    FROM shit_staking_events
+    WHERE block_time_dt >= :start AND block_time_dt < :end
+        AND event_type IN ('STAKE', 'UNSTAKE')
+    """
+    def partial(stake, unstake, count):
+        return {
+            'totalStake': float(stake or 0.0),
+            'totalUnstake': float(unstake or 0.0),
+            'stakeCount': int(count or 0),
+            'rewardCount': 0,
+            'rewardAmount': 0.0,
+        }
+    
+    def finalize(row) -> tuple:
+        return partial(row[0], row[1], row[2]), partial(row[3], row[4], row[5])
+    
+    return SqlQuery(query, _sql_params(start_utc, end_utc, split_utc), finalize, one_row=True)
+
+
+def _reward_partials_query(start_utc, split_utc, end_utc) -> SqlQuery:
+    """质押奖励条件聚合: 一次查询得到 (本期, 前期) 的奖励次数和金额"""
+    query = """
+    SELECT
+        COUNT(CASE WHEN block_time_dt >= :split THEN 1 END) as rewardCountCurr,
+        SUM(CASE WHEN block_time_dt >= :split THEN amount END) as rewardAmountCurr,
+        COUNT(CASE WHEN block_time_dt < :split THEN 1 END) as rewardCountPrev,
+        SUM(CASE WHEN block_time_dt < :split THEN amount END) as rewardAmountPrev
+    FROM shit_staking_rewards
+    WHERE block_time_dt >= :start AND block_time_dt < :end
+    """
+    def partial(count, amount):
+        return {
+            'totalStake': 0.0,
+            'totalUnstake': 0.0,
+            'stakeCount': 0,
+            'rewardCount': int(count or 0),
+            'rewardAmount': float(amount or 0.0),
+        }
+    
+    def finalize(row) -> tuple:
+        return partial(row[0], row[1]), partial(row[2], row[3])
+    
+    return SqlQuery(query, _sql_params(start_utc, end_utc, split_utc), finalize, one_row=True)
+
+
+def _daily_data_query(start_utc, end_utc) -> SqlQuery:
+    """日数据 SQL 聚合 (业务日 = UTC 时间 - 4 小时 的日期)，质押与奖励合并为一个序列"""
+    query = """
+    SELECT date, SUM(stake) as stake, SUM(rewards) as rewards
+    FROM (
+        SELECT DATE(block_time_dt - INTERVAL 4 HOUR) as date, amount as stake, 0 as rewards
+        FROM shit_staking_events
+        WHERE block_time_dt >= :start AND block_time_dt < :end AND event_type = 'STAKE'
+        UNION ALL
+        SELECT DATE(block_time_dt - INTERVAL 4 HOUR) as date, 0 as stake, amount as rewards
+        FROM shit_staking_rewards
+        WHERE block_time_dt >= :start AND block_time_dt < :end
+    ) t
+    GROUP BY date
+    ORDER BY date
+    """
+    def finalize(df: pd.DataFrame) -> List[Dict[str, Any]]:
+        if df.empty:
+            return []
+        df['date'] = df['date'].astype(str)
+        return df.fillna(0.0).astype({
+            'stake': 'float',
+            'rewards': 'float'
+        }).to_dict('records')
+    
+    return SqlQuery(query, _sql_params(start_utc, end_utc), finalize)
+
+
+def _top_stakers_query(start_utc, end_utc, top_n: int = 10) -> SqlQuery:
+    """质押大户 SQL 聚合"""
+    query = """
+    SELECT
+        user_address as fullAddress,
+        SUM(amount) as amount
+    FROM shit_staking_events
+    WHERE block_time_dt >= :start AND block_time_dt < :end
+        AND event_type = 'STAKE' AND user_address IS NOT NULL
+    GROUP BY user_address
+    ORDER BY amount DESC
+    LIMIT :limit
+    """
+    def finalize(df: pd.DataFrame) -> List[Dict[str, Any]]:
+        if df.empty:
+            return []
+        df['address'] = df['fullAddress'].apply(lambda x: f"{x[:4]}...{x[-4:]}")
+        return df[['address', 'fullAddress', 'amount']].fillna({'amount': 0.0}).astype({
+            'amount': 'float'
+        }).to_dict('records')
+    
+    return SqlQuery(query, {**_sql_params(start_utc, end_utc), "limit": top_n}, finalize)
+
+
+def _get_empty_response() -> Dict[str, Any]:
+    empty = _amount_partial(pd.DataFrame())
+    return {
+        'metrics': _combine_metrics(empty, empty),
+        'dailyData': [],
+        'topStakers': []
+    }
@@ -4,12 +4,8 @@ TS 数据计算模块 (SQL 版)
 """
 import pandas as pd
 import logging
-import traceback
-import time
 from typing import Dict, Any, List, Optional
-from sqlalchemy import text
-from utils.db_loader import get_db_engine
-from concurrent.futures import ThreadPoolExecutor
+from utils.sql_query import SqlQuery, run_sql_calculation, run_sql_calculation_async
 
 logger = logging.getLogger(__name__)
 
@@ -17,59 +13,48 @@ def calculate_ts_sql(start_date: str, end_date: str) -> Dict[str, Any]:
     """
     计算 TS 数据 (完全基于 SQL 聚合，多线程并行优化)
     """
-    engine = get_db_engine()
-    if engine is None:
-        return _get_empty_response()
-
-    start_total = time.time()
-    try:
-        # 1. 计算日期边界
-        current_start = pd.to_datetime(start_date)
-        current_end = pd.to_datetime(end_date) + pd.Timedelta(days=1)
-        
-        period_days = (current_end - current_start).days
-        prev_start = current_start - pd.Timedelta(days=period_days)
-        prev_end = current_start
-
-        logger.info(f"[Perf] 开始计算 TS 数据: {start_date} ~ {end_date} (环比从 {prev_start.date()})")
-
-        # 2. 获取平均价格 (一次性查出两个时段的价格)
-        t0 = time.time()
-        avg_prices = _fetch_combined_avg_prices(engine, prev_start, current_end, current_start)
-        avg_price_prev = avg_prices['prev']
-        avg_price_current = avg_prices['current']
-        logger.info(f"[Perf] 价格查询耗时: {time.time() - t0:.2f}s")
-
-        # 3. 使用线程池并行执行主要查询
-        t_parallel = time.time()
-        with ThreadPoolExecutor(max_workers=4) as executor:
-            future_curr = executor.submit(_fetch_period_metrics_sql, engine, current_start, current_end, avg_price_current)
-            future_prev = executor.submit(_fetch_period_metrics_sql, engine, prev_start, prev_end, avg_price_prev)
-            future_daily = executor.submit(_fetch_daily_data_sql, engine, current_start, current_end)
-            future_top = executor.submit(_fetch_top_users_sql, engine, current_start, current_end)
-
-            metrics_current = future_curr.result()
-            metrics_prev = future_prev.result()
-            daily_data = future_daily.result()
-            top_users = future_top.result()
-        
-        logger.info(f"[Perf] 并行查询部分总耗时: {time.time() - t_parallel:.2f}s")
+    return run_sql_calculation('TS', lambda: _sql_queries(start_date, end_date), _assemble_sql, _get_empty_response)
 
-        # 4. 计算综合指标和 Delta
-        final_metrics = _merge_metrics(metrics_current, metrics_prev)
+async def calculate_ts_sql_async(start_date: str, end_date: str) -> Dict[str, Any]:
+    """calculate_ts_sql 的异步版本 (同一组查询经异步引擎并发执行)，参数与返回值相同"""
+    return await run_sql_calculation_async('TS', lambda: _sql_queries(start_date, end_date), _assemble_sql, _get_empty_response)
 
-        logger.info(f"[Perf] TS 总计耗时: {time.time() - start_total:.2f}s")
-        
-        return {
-            'metrics': final_metrics,
-            'dailyData': daily_data,
-            'topUsers': top_users
-        }
-    except Exception as e:
-        logger.error(f"SQL 计算 TS 数据失败: {str(e)}\n{traceback.format_exc()}")
-        return _get_empty_response()
+def _sql_queries(start_date: str, end_date: str) -> Dict[str, SqlQuery]:
+    """平均价格、本期 / 前期指标、日数据、排行五条互不依赖的查询 (SHIT 成本在结果组装时按平均价格计算)"""
+    current_start = pd.to_datetime(start_date)
+    current_end = pd.to_datetime(end_date) + pd.Timedelta(days=1)
+    
+    period_days = (current_end - current_start).days
+    prev_start = current_start - pd.Timedelta(days=period_days)
+
+    logger.info(f"[Perf] 开始计算 TS 数据: {start_date} ~ {end_date} (环比从 {prev_start.date()})")
+
+    return {
+        'prices': _combined_avg_prices_query(prev_start, current_end, current_start),
+        'current': _period_metrics_query(current_start, current_end),
+        'prev': _period_metrics_query(prev_start, current_start),
+        'daily': _daily_data_query(current_start, current_end),
+        'top': _top_users_query(current_start, current_end),
+    }
+
+def _assemble_sql(results: Dict[str, Any]) -> Dict[str, Any]:
+    avg_prices = results['prices']
+    return {
+        'metrics': _merge_metrics(
+            _with_shit_cost(results['current'], avg_prices['current']),
+            _with_shit_cost(results['prev'], avg_prices['prev'])
+        ),
+        'dailyData': results['daily'],
+        'topUsers': results['top']
+    }
+
+def _sql_params(start_utc: pd.Timestamp, end_utc: pd.Timestamp) -> Dict[str, str]:
+    return {
+        "start": start_utc.strftime('%Y-%m-%d %H:%M:%S'),
+        "end": end_utc.strftime('%Y-%m-%d %H:%M:%S')
+    }
 
-def _fetch_combined_avg_prices(engine, start_utc, end_utc, split_utc) -> Dict[str, float]:
+def _combined_avg_prices_query(start_utc, end_utc, split_utc) -> SqlQuery:
     """一次性查询两个周期的平均价格"""
     query = """
     SELECT 
@@ -78,21 +63,16 @@ def _fetch_combined_avg_prices(engine, start_utc, end_utc, split_utc) -> Dict[st
     FROM shit_price_history 
     WHERE timestamp_utc >= :start AND timestamp_utc < :end
     """
-    try:
-        with engine.connect() as conn:
-            row = conn.execute(text(query), {
-                "start": start_utc.strftime('%Y-%m-%d %H:%M:%S'),
-                "end": end_utc.strftime('%Y-%m-%d %H:%M:%S'),
-                "split": split_utc.strftime('%Y-%m-%d %H:%M:%S')
-            }).fetchone()
-            return {
-                'prev': float(row[0]) if row and row[0] is not None else 1.0,
-                'current': float(row[1]) if row and row[1] is not None else 1.0
-            }
-    except Exception:
-        return {'prev': 1.0, 'current': 1.0}
-
-def _fetch_period_metrics_sql(engine, start_utc, end_utc, avg_price: float) -> Dict[str, float]:
+    def finalize(row) -> Dict[str, float]:
+        return {
+            'prev': float(row[0]) if row and row[0] is not None else 1.0,
+            'current': float(row[1]) if row and row[1] is not None else 1.0
+        }
+
+    params = {**_sql_params(start_utc, end_utc), "split": split_utc.strftime('%Y-%m-%d %H:%M:%S')}
+    return SqlQuery(query, params, finalize, one_row=True, on_error=lambda: {'prev': 1.0, 'current': 1.0})
+
+def _period_metrics_query(start_utc, end_utc) -> SqlQuery:
     """单周期 SQL 聚合指标计算"""
     # 核心 SQL: 一次性聚合所有基础计数和总和
     query = """
@@ -111,54 +91,52 @@ def _fetch_period_metrics_sql(engine, start_utc, end_utc, avg_price: float) -> D
     WHERE block_time_dt >= :start AND block_time_dt < :end
     """
 
-    try:
-        params = {
-            "start": start_utc.strftime('%Y-%m-%d %H:%M:%S'),
-            "end": end_utc.strftime('%Y-%m-%d %H:%M:%S')
+    def finalize(row) -> Dict[str, float]:
+        ts_claim = int(row[0] or 0)
+        total_amount = float(row[1] or 0.0)
+        unique_addresses = int(row[2] or 0)
+        lucky_draws = int(row[3] or 0)
+        lucky_draw_amount = float(row[4] or 0.0)
+        lucky_draw_addresses = int(row[5] or 0)
+        ref1 = int(row[6] or 0)
+        ref2 = int(row[7] or 0)
+        revenue = float(row[8] or 0.0)
+        total_tx = int(row[9] or 0)
+        
+        # 计算衍生指标 (层级逻辑: ref1 包含 ref2, tsClaim 包含 ref1)
+        two_ref_tx = ref2
+        one_ref_tx = ref1 - ref2
+        wolf_tx = ts_claim - ref1
+        
+        return {
+            'totalTx': total_tx,
+            'tsClaim': ts_claim,
+            'totalAmount': total_amount,
+            'uniqueAddresses': unique_addresses,
+            'meanClaims': (ts_claim / unique_addresses) if unique_addresses > 0 else 0.0,
+            'wolfTx': wolf_tx,
+            'oneRefTx': one_ref_tx,
+            'twoRefTx': two_ref_tx,
+            'luckyDraws': lucky_draws,
+            'luckyDrawAmount': lucky_draw_amount,
+            'luckyDrawAddresses': lucky_draw_addresses,
+            'revenue': revenue,
         }
-        with engine.connect() as conn:
-            row = conn.execute(text(query), params).fetchone()
-            
-            ts_claim = int(row[0] or 0)
-            total_amount = float(row[1] or 0.0)
-            unique_addresses = int(row[2] or 0)
-            lucky_draws = int(row[3] or 0)
-            lucky_draw_amount = float(row[4] or 0.0)
-            lucky_draw_addresses = int(row[5] or 0)
-            ref1 = int(row[6] or 0)
-            ref2 = int(row[7] or 0)
-            revenue = float(row[8] or 0.0)
-            total_tx = int(row[9] or 0)
-            
-            # 计算衍生指标 (层级逻辑: ref1 包含 ref2, tsClaim 包含 ref1)
-            two_ref_tx = ref2
-            one_ref_tx = ref1 - ref2
-            wolf_tx = ts_claim - ref1
-            
-            shit_cost = total_amount * avg_price
-            roi = (revenue / shit_cost) if shit_cost > 0 else 0.0
-            
-            return {
-                'totalTx': total_tx,
-                'tsClaim': ts_claim,
-                'totalAmount': total_amount,
-                'uniqueAddresses': unique_addresses,
-                'meanClaims': (ts_claim / unique_addresses) if unique_addresses > 0 else 0.0,
-                'wolfTx': wolf_tx,
-                'oneRefTx': one_ref_tx,
-                'twoRefTx': two_ref_tx,
-                'luckyDraws': lucky_draws,
-                'luckyDrawAmount': lucky_draw_amount,
-                'luckyDrawAddresses': lucky_draw_addresses,
-                'revenue': revenue,
-                'shitCost': shit_cost,
-                'roi': roi
-            }
-    except Exception as e:
-        logger.error(f"SQL 获取周期指标失败: {e}")
+
+    return SqlQuery(query, _sql_params(start_utc, end_utc), finalize, one_row=True, on_error=dict)
+
+def _with_shit_cost(metrics: Dict[str, float], avg_price: float) -> Dict[str, float]:
+    """按周期平均价格补充 SHIT 成本和 ROI"""
+    if not metrics:
         return {}
+    shit_cost = metrics['totalAmount'] * avg_price
+    return {
+        **metrics,
+        'shitCost': shit_cost,
+        'roi': (metrics['revenue'] / shit_cost) if shit_cost > 0 else 0.0
+    }
 
-def _fetch_daily_data_sql(engine, start_utc, end_utc) -> List[Dict[str, Any]]:
+def _daily_data_query(start_utc, end_utc) -> SqlQuery:
     """日数据 SQL 聚合"""
     query = """
     SELECT 
@@ -171,19 +149,14 @@ def _fetch_daily_data_sql(engine, start_utc, end_utc) -> List[Dict[str, Any]]:
     GROUP BY date
     ORDER BY date
     """
-    try:
-        with engine.connect() as conn:
-            df = pd.read_sql(text(query), conn, params={
-                "start": start_utc.strftime('%Y-%m-%d %H:%M:%S'),
-                "end": end_utc.strftime('%Y-%m-%d %H:%M:%S')
-            })
-            if df.empty: return []
-            df['date'] = df['date'].astype(str)
-            return df.to_dict('records')
-    except Exception:
-        return []
-
-def _fetch_top_users_sql(engine, start_utc, end_utc) -> List[Dict[str, Any]]:
+    def finalize(df: pd.DataFrame) -> List[Dict[str, Any]]:
+        if df.empty: return []
+        df['date'] = df['date'].astype(str)
+        return df.to_dict('records')
+
+    return SqlQuery(query, _sql_params(start_utc, end_utc), finalize, on_error=list)
+
+def _top_users_query(start_utc, end_utc) -> SqlQuery:
     """前10大户 SQL 聚合"""
     query = """
     SELECT 
@@ -197,17 +170,12 @@ def _fetch_top_users_sql(engine, start_utc, end_utc) -> List[Dict[str, Any]]:
     ORDER BY shitSent DESC
     LIMIT 10
     """
-    try:
-        with engine.connect() as conn:
-            df = pd.read_sql(text(query), conn, params={
-                "start": start_utc.strftime('%Y-%m-%d %H:%M:%S'),
-                "end": end_utc.strftime('%Y-%m-%d %H:%M:%S')
-            })
-            if df.empty: return []
-            df['address'] = df['fullAddress'].apply(lambda x: f"{x[:4]}...{x[-4:]}")
-            return df.to_dict('records')
-    except Exception:
-        return []
+    def finalize(df: pd.DataFrame) -> List[Dict[str, Any]]:
+        if df.empty: return []
+        df['address'] = df['fullAddress'].apply(lambda x: f"{x[:4]}...{x[-4:]}")
+        return df.to_dict('records')
+
+    return SqlQuery(query, _sql_params(start_utc, end_utc), finalize, on_error=list)
 
 def _merge_metrics(current: Dict[str, Any], prev: Dict[str, Any]) -> Dict[str, Any]:
     """合并本期和环比指标并计算 Delta"""
@@ -1,6 +1,7 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import os
+import asyncio
 import logging
 from dotenv import load_dotenv
 from data_cache import data_cache
@@ -63,6 +64,39 @@ async def startup_event():
     except Exception as e:
         print(f"\n⚠️ 启动时加载数据失败: {e}")
         print("💡 可以通过调用 POST /loadData 手动加载数据\n")
+    
+    # 启用本地 Parquet 镜像时，在后台定期增量同步
+    from utils.parquet_mirror import is_mirror_enabled, run_sync_loop
+    if is_mirror_enabled():
+        app.state.mirror_task = asyncio.create_task(run_sync_loop())
+        print("🗂️ 已启动 Parquet 镜像后台同步")
+
+    # 启用异常存储时，已关闭业务日的检测结果在后台持久化，页面请求只实时计算未关闭的日期
+    from utils.anomaly_store import is_store_enabled
+    from calculators.anomaly import run_store_fill_loop
+    if is_store_enabled():
+        app.state.anomaly_store_task = asyncio.create_task(run_store_fill_loop())
+        print("🧾 已启动异常检测结果后台填充")
+
+# 关闭事件：停止后台任务并释放数据库连接池
+@app.on_event("shutdown")
+async def shutdown_event():
+    """应用关闭时先停止后台同步 / 填充任务，再释放所有数据库连接"""
+    tasks = [
+        task for task in (getattr(app.state, 'mirror_task', None),
+                          getattr(app.state, 'anomaly_store_task', None))
+        if task is not None
+    ]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    from utils.db_loader import dispose_engines
+    from utils.async_db_loader import dispose_async_engines
+    from utils.concurrent_fetch import shutdown_fetch_executor
+    shutdown_fetch_executor()
+    dispose_engines()
+    await dispose_async_engines()
 
 app.include_router(calculate_router)
 app.include_router(data_router)
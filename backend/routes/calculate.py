@@ -3,7 +3,9 @@
 提供各个数据模块的计算 API
 """
 from fastapi import APIRouter, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from typing import Dict, Any, List, Optional
+import os
 import pandas as pd
 import logging
 import traceback
@@ -19,15 +21,21 @@ from .schemas import (
     POSMetrics, DailyPOSDataEntry, TopPOSUser, POSCalculateResponse,
     ShitCodeMetrics, DailyShitCodeDataEntry, TopShitCodeUser, ShitCodeCalculateResponse,
     RevenueMetrics, DailyRevenueDataEntry, RevenueCompositionEntry, RevenueCalculateResponse,
-    DeFiMetrics, DailyDeFiDataEntry, DeFiCalculateResponse,
-    AnomalyCalculateResponse, AnomalySummary, AnomalyDetail
+    DeFiRequest, DeFiMetrics, DailyDeFiDataEntry, DeFiCalculateResponse,
+    AnomalyAddressRequest, AnomalyCalculateResponse, AnomalySummary, AnomalyDetail
 )
 
 # 创建路由
 router = APIRouter(prefix="/calculate", tags=["calculate"])
 
+
+def _use_sql_engine() -> bool:
+    """计算引擎: CALC_ENGINE=sql (默认，经异步引擎在数据库中聚合) 或 pandas (加载原始记录后在内存中聚合)"""
+    return os.getenv("CALC_ENGINE", "sql").lower() != "pandas"
+
+
 @router.post("/staking", response_model=StakingCalculateResponse)
-def calculate_staking(request: DateRangeRequest):
+async def calculate_staking(request: DateRangeRequest):
     """
     计算 Staking 数据
     
@@ -39,8 +47,10 @@ def calculate_staking(request: DateRangeRequest):
     """
     try:
         from data_cache import data_cache
-        from calculators.staking import calculate_staking as staking_calc
-        from utils.db_loader import load_staking_amount_from_db, load_staking_reward_from_db
+        from calculators.staking import calculate_staking as staking_calc, calculate_staking_chunked, calculate_staking_sql_async
+        from utils.db_loader import iter_table_chunks, use_streaming
+        from utils.async_db_loader import load_staking_amount_async, load_staking_reward_async
+        from utils.concurrent_fetch import fetch_all_async
         
         if not data_cache.is_cached:
             raise HTTPException(
@@ -49,28 +59,51 @@ def calculate_staking(request: DateRangeRequest):
             )
         
         # 日期范围计算（UTC+8 12:00）
-        timestamp_col = 'Timestamp(UTC+8)'
         current_start = pd.to_datetime(request.start_date).replace(hour=12, minute=0, second=0, microsecond=0)
         current_end = (pd.to_datetime(request.end_date) + pd.Timedelta(days=1)).replace(hour=12, minute=0, second=0, microsecond=0)
         
         period_length = (pd.to_datetime(request.end_date) - pd.to_datetime(request.start_date)).days + 1
         prev_start = current_start - pd.Timedelta(days=period_length)
-        prev_end = current_start
         
-        # 从数据库加载数据
-        df_staking_amount_all = load_staking_amount_from_db(prev_start, current_end)
-        df_staking_log_all = load_staking_reward_from_db(prev_start, current_end)
+        # 在数据库中用条件聚合计算，只有聚合结果离开 MySQL
+        if _use_sql_engine():
+            result = await calculate_staking_sql_async(request.start_date, request.end_date)
+            return StakingCalculateResponse(
+                metrics=StakingMetrics(**result['metrics']),
+                dailyData=[DailyDataEntry(**item) for item in result['dailyData']],
+                topStakers=[TopStaker(**item) for item in result['topStakers']]
+            )
         
-        # 分割 Staking Amount 数据
-        df_amount_current = df_staking_amount_all[(df_staking_amount_all[timestamp_col] >= current_start) & (df_staking_amount_all[timestamp_col] < current_end)].copy()
-        df_amount_prev = df_staking_amount_all[(df_staking_amount_all[timestamp_col] >= prev_start) & (df_staking_amount_all[timestamp_col] < current_start)].copy()
+        # 长时间跨度：流式分块加载并折叠聚合，内存占用与跨度无关
+        if use_streaming(prev_start, current_end):
+            result = await run_in_threadpool(
+                calculate_staking_chunked,
+                iter_table_chunks(
+                    'staking_amount', prev_start, current_end,
+                    columns=['Address', 'SHIT Amount', 'Type'],
+                    filters={'Type': ['STAKE', 'UNSTAKE']}
+                ),
+                iter_table_chunks('staking_reward', prev_start, current_end, columns=['SHIT Sent']),
+                current_start
+            )
+            return StakingCalculateResponse(
+                metrics=StakingMetrics(**result['metrics']),
+                dailyData=[DailyDataEntry(**item) for item in result['dailyData']],
+                topStakers=[TopStaker(**item) for item in result['topStakers']]
+            )
         
-        # 分割 Staking Reward (Log) 数据
-        df_log_current = df_staking_log_all[(df_staking_log_all[timestamp_col] >= current_start) & (df_staking_log_all[timestamp_col] < current_end)].copy()
-        df_log_prev = df_staking_log_all[(df_staking_log_all[timestamp_col] >= prev_start) & (df_staking_log_all[timestamp_col] < current_start)].copy()
+        # 从数据库并发加载数据
+        frames = await fetch_all_async({
+            'staking_amount': load_staking_amount_async(
+                prev_start, current_end,
+                columns=['Address', 'SHIT Amount', 'Type'],
+                filters={'Type': ['STAKE', 'UNSTAKE']}
+            ),
+            'staking_reward': load_staking_reward_async(prev_start, current_end, columns=['SHIT Sent'])
+        })
         
-        # 调用纯函数
-        result = staking_calc(df_amount_current, df_log_current, df_amount_prev, df_log_prev)
+        # 调用纯函数 (两个周期在同一份数据上按 current_start 划分；CPU 计算放到线程池，不阻塞事件循环)
+        result = await run_in_threadpool(staking_calc, frames['staking_amount'], frames['staking_reward'], current_start)
         
         return StakingCalculateResponse(
             metrics=StakingMetrics(**result['metrics']),
@@ -92,13 +125,13 @@ def calculate_staking(request: DateRangeRequest):
 # ============================================
 
 @router.post("/ts", response_model=TSCalculateResponse)
-def calculate_ts(request: DateRangeRequest):
+async def calculate_ts(request: DateRangeRequest):
     """
     计算 TS 数据 (SQL 直接聚合模式)
     """
     try:
         from data_cache import data_cache
-        from calculators.ts import calculate_ts_sql
+        from calculators.ts import calculate_ts_sql_async
         
         if not data_cache.is_cached:
             raise HTTPException(
@@ -107,7 +140,7 @@ def calculate_ts(request: DateRangeRequest):
             )
         
         # 直接调用 SQL 计算逻辑
-        result = calculate_ts_sql(request.start_date, request.end_date)
+        result = await calculate_ts_sql_async(request.start_date, request.end_date)
         
         return TSCalculateResponse(
             metrics=TSMetrics(**result['metrics']),
@@ -137,7 +170,7 @@ def calculate_ts(request: DateRangeRequest):
 # ============================================
 
 @router.post("/pos", response_model=POSCalculateResponse)
-def calculate_pos(request: DateRangeRequest):
+async def calculate_pos(request: DateRangeRequest):
     """
     计算 POS 数据
     
@@ -150,8 +183,9 @@ def calculate_pos(request: DateRangeRequest):
     try:
         # 从 data_cache 获取数据
         from data_cache import data_cache
-        from calculators.pos import calculate_pos
-        from utils.db_loader import load_pos_log_from_db
+        from calculators.pos import calculate_pos, calculate_pos_chunked, calculate_pos_sql_async
+        from utils.db_loader import iter_table_chunks, use_streaming
+        from utils.async_db_loader import load_pos_log_async
         
         if not data_cache.is_cached:
             raise HTTPException(
@@ -160,23 +194,29 @@ def calculate_pos(request: DateRangeRequest):
             )
         
         # 获取日期范围（POS 使用 12pm 作为日期边界）
-        timestamp_col = 'Timestamp(UTC+8)'
         current_start = pd.to_datetime(request.start_date).replace(hour=12, minute=0, second=0, microsecond=0)
         current_end = (pd.to_datetime(request.end_date) + pd.Timedelta(days=1)).replace(hour=12, minute=0, second=0, microsecond=0)
         
         period_length = (pd.to_datetime(request.end_date) - pd.to_datetime(request.start_date)).days + 1
         prev_start = current_start - pd.Timedelta(days=period_length)
-        prev_end = current_start
-        
-        # 从数据库加载数据
-        df_pos_all = load_pos_log_from_db(prev_start, current_end)
-        
-        # 按日期范围分割数据
-        df_current = df_pos_all[(df_pos_all[timestamp_col] >= current_start) & (df_pos_all[timestamp_col] < current_end)].copy()
-        df_prev = df_pos_all[(df_pos_all[timestamp_col] >= prev_start) & (df_pos_all[timestamp_col] < current_start)].copy()
-        
-        # 调用纯函数
-        result = calculate_pos(df_current, df_prev)
+        pos_columns = ['Receiver Address', 'SHIT Sent', 'SOL Received']
+        
+        if _use_sql_engine():
+            # 在数据库中聚合，响应大小与记录数无关
+            result = await calculate_pos_sql_async(request.start_date, request.end_date)
+        elif use_streaming(prev_start, current_end):
+            # 长时间跨度：流式分块加载并折叠聚合
+            result = await run_in_threadpool(
+                calculate_pos_chunked,
+                iter_table_chunks('pos_log', prev_start, current_end, columns=pos_columns),
+                current_start
+            )
+        else:
+            # 从数据库加载数据
+            df_pos_all = await load_pos_log_async(prev_start, current_end, columns=pos_columns)
+            
+            # 调用纯函数 (按 current_start 划分本期/前期，一次分组聚合)
+            result = await run_in_threadpool(calculate_pos, df_pos_all, current_start)
         
         return POSCalculateResponse(
             metrics=POSMetrics(**result['metrics']),
@@ -199,7 +239,7 @@ def calculate_pos(request: DateRangeRequest):
 # ============================================
 
 @router.post("/shitcode", response_model=ShitCodeCalculateResponse)
-def calculate_shitcode(request: DateRangeRequest):
+async def calculate_shitcode(request: DateRangeRequest):
     """
     计算 ShitCode 数据
     
@@ -211,8 +251,9 @@ def calculate_shitcode(request: DateRangeRequest):
     """
     try:
         from data_cache import data_cache
-        from calculators.shitcode import calculate_shitcode as shitcode_calc
-        from utils.db_loader import load_shitcode_log_from_db
+        from calculators.shitcode import calculate_shitcode as shitcode_calc, calculate_shitcode_chunked, calculate_shitcode_sql_async
+        from utils.db_loader import iter_table_chunks, use_streaming
+        from utils.async_db_loader import load_shitcode_log_async
         
         if not data_cache.is_cached:
             raise HTTPException(
@@ -221,23 +262,29 @@ def calculate_shitcode(request: DateRangeRequest):
             )
         
         # 日期范围计算（UTC+8 00:00）
-        timestamp_col = 'Timestamp(UTC+8)'
         current_start = pd.to_datetime(request.start_date).replace(hour=0, minute=0, second=0, microsecond=0)
         current_end = (pd.to_datetime(request.end_date) + pd.Timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
         
         period_length = (pd.to_datetime(request.end_date) - pd.to_datetime(request.start_date)).days + 1
         prev_start = current_start - pd.Timedelta(days=period_length)
-        prev_end = current_start
-        
-        # 从数据库加载数据
-        df_shitcode_all = load_shitcode_log_from_db(prev_start, current_end)
-        
-        # 分割数据
-        df_current = df_shitcode_all[(df_shitcode_all[timestamp_col] >= current_start) & (df_shitcode_all[timestamp_col] < current_end)].copy()
-        df_prev = df_shitcode_all[(df_shitcode_all[timestamp_col] >= prev_start) & (df_shitcode_all[timestamp_col] < current_start)].copy()
-        
-        # 调用纯函数
-        result = shitcode_calc(df_current, df_prev)
+        shitcode_columns = ['Receiver Address', 'SHIT Sent', 'SOL Received']
+        
+        if _use_sql_engine():
+            # 在数据库中聚合，只有聚合结果离开 MySQL
+            result = await calculate_shitcode_sql_async(request.start_date, request.end_date)
+        elif use_streaming(prev_start, current_end):
+            # 长时间跨度：流式分块加载并折叠聚合
+            result = await run_in_threadpool(
+                calculate_shitcode_chunked,
+                iter_table_chunks('shitcode_log', prev_start, current_end, columns=shitcode_columns),
+                current_start
+            )
+        else:
+            # 从数据库加载数据
+            df_shitcode_all = await load_shitcode_log_async(prev_start, current_end, columns=shitcode_columns)
+            
+            # 调用纯函数 (按 current_start 划分本期/前期，一次分组聚合)
+            result = await run_in_threadpool(shitcode_calc, df_shitcode_all, current_start)
         
         return ShitCodeCalculateResponse(
             metrics=ShitCodeMetrics(**result['metrics']),
@@ -260,7 +307,7 @@ def calculate_shitcode(request: DateRangeRequest):
 # ============================================
 
 @router.post("/revenue", response_model=RevenueCalculateResponse)
-def calculate_revenue(request: DateRangeRequest):
+async def calculate_revenue(request: DateRangeRequest):
     """
     计算 Revenue 数据
     
@@ -272,13 +319,14 @@ def calculate_revenue(request: DateRangeRequest):
     """
     try:
         from data_cache import data_cache
-        from calculators.revenue import calculate_revenue as revenue_calc
-        from utils.db_loader import (
-            load_ts_log_from_db, 
-            load_pos_log_from_db, 
-            load_staking_reward_from_db, 
-            load_shitcode_log_from_db
+        from calculators.revenue import calculate_revenue as revenue_calc, calculate_revenue_sql_async
+        from utils.async_db_loader import (
+            load_ts_log_async,
+            load_pos_log_async,
+            load_staking_reward_async,
+            load_shitcode_log_async
         )
+        from utils.concurrent_fetch import fetch_all_async
         
         if not data_cache.is_cached:
             raise HTTPException(
@@ -286,7 +334,15 @@ def calculate_revenue(request: DateRangeRequest):
                 detail="数据未缓存，请先调用 /loadData"
             )
         
-        timestamp_col = 'Timestamp(UTC+8)'
+        if _use_sql_engine():
+            # 单条 UNION ALL 查询，各来源按自己的业务日边界聚合
+            result = await calculate_revenue_sql_async(request.start_date, request.end_date)
+            return RevenueCalculateResponse(
+                metrics=RevenueMetrics(**result['metrics']),
+                dailyData=[DailyRevenueDataEntry(**item) for item in result['dailyData']],
+                composition=[RevenueCompositionEntry(**item) for item in result['composition']]
+            )
+        
         
         # 计算时间范围
         ts_period = (pd.to_datetime(request.end_date) - pd.to_datetime(request.start_date)).days + 1
@@ -296,40 +352,34 @@ def calculate_revenue(request: DateRangeRequest):
         ts_end = (pd.to_datetime(request.end_date) + pd.Timedelta(days=1)).replace(hour=8, minute=0, second=0, microsecond=0)
         ts_prev_start = ts_start - pd.Timedelta(days=ts_period)
         
-        # 从数据库加载 TS 数据
-        df_ts_all = load_ts_log_from_db(ts_prev_start, ts_end)
-        df_ts_current = df_ts_all[(df_ts_all[timestamp_col] >= ts_start) & (df_ts_all[timestamp_col] < ts_end)].copy()
-        df_ts_prev = df_ts_all[(df_ts_all[timestamp_col] >= ts_prev_start) & (df_ts_all[timestamp_col] < ts_start)].copy()
-        
         # POS（12pm边界）
         pos_start = pd.to_datetime(request.start_date).replace(hour=12, minute=0, second=0, microsecond=0)
         pos_end = (pd.to_datetime(request.end_date) + pd.Timedelta(days=1)).replace(hour=12, minute=0, second=0, microsecond=0)
         pos_prev_start = pos_start - pd.Timedelta(days=ts_period)
         
-        df_pos_all = load_pos_log_from_db(pos_prev_start, pos_end)
-        df_pos_current = df_pos_all[(df_pos_all[timestamp_col] >= pos_start) & (df_pos_all[timestamp_col] < pos_end)].copy()
-        df_pos_prev = df_pos_all[(df_pos_all[timestamp_col] >= pos_prev_start) & (df_pos_all[timestamp_col] < pos_start)].copy()
-        
         # Staking（12:00pm边界）
         stake_start = pd.to_datetime(request.start_date).replace(hour=12, minute=0, second=0, microsecond=0)
         stake_end = (pd.to_datetime(request.end_date) + pd.Timedelta(days=1)).replace(hour=12, minute=0, second=0, microsecond=0)
         stake_prev_start = stake_start - pd.Timedelta(days=ts_period)
         
-        df_staking_all = load_staking_reward_from_db(stake_prev_start, stake_end)
-        df_staking_current = df_staking_all[(df_staking_all[timestamp_col] >= stake_start) & (df_staking_all[timestamp_col] < stake_end)].copy()
-        df_staking_prev = df_staking_all[(df_staking_all[timestamp_col] >= stake_prev_start) & (df_staking_all[timestamp_col] < stake_start)].copy()
-        
-        # ShitCode（00:00边界）
-        df_shitcode_all = load_shitcode_log_from_db(stake_prev_start, stake_end)
-        df_shitcode_current = df_shitcode_all[(df_shitcode_all[timestamp_col] >= stake_start) & (df_shitcode_all[timestamp_col] < stake_end)].copy()
-        df_shitcode_prev = df_shitcode_all[(df_shitcode_all[timestamp_col] >= stake_prev_start) & (df_shitcode_all[timestamp_col] < stake_start)].copy()
-        
-        # 调用纯函数
-        result = revenue_calc(
-            df_ts_current, df_ts_prev,
-            df_pos_current, df_pos_prev,
-            df_staking_current, df_staking_prev,
-            df_shitcode_current, df_shitcode_prev
+        # ShitCode（0点边界，自然日）
+        shitcode_start = pd.to_datetime(request.start_date).normalize()
+        shitcode_end = pd.to_datetime(request.end_date).normalize() + pd.Timedelta(days=1)
+        shitcode_prev_start = shitcode_start - pd.Timedelta(days=ts_period)
+        
+        # 四张表互不依赖，并发加载
+        frames = await fetch_all_async({
+            'ts': load_ts_log_async(ts_prev_start, ts_end, columns=['SOL_Received']),
+            'pos': load_pos_log_async(pos_prev_start, pos_end, columns=['SOL Received']),
+            'staking': load_staking_reward_async(stake_prev_start, stake_end, columns=['SOL Received']),
+            'shitcode': load_shitcode_log_async(shitcode_prev_start, shitcode_end, columns=['SOL Received'])
+        })
+        
+        # 调用纯函数 (各来源按自己的本期起始时间划分周期，与 SQL 版的业务日边界一致)
+        result = await run_in_threadpool(
+            revenue_calc,
+            frames['ts'], frames['pos'], frames['staking'], frames['shitcode'],
+            ts_start, pos_start, stake_start, shitcode_start
         )
         
         return RevenueCalculateResponse(
@@ -353,20 +403,23 @@ def calculate_revenue(request: DateRangeRequest):
 # ============================================
 
 @router.post("/defi", response_model=DeFiCalculateResponse)
-def calculate_defi(request: DateRangeRequest):
+async def calculate_defi(request: DeFiRequest):
     """
     计算 DeFi 数据
     
     Args:
-        request: 包含 start_date 和 end_date 的请求
+        request: 包含 start_date、end_date 和 K线周期 resolution (默认 1h) 的请求
     
     Returns:
-        DeFiCalculateResponse: 包含指标、日数据和小时级别的价格K线
+        DeFiCalculateResponse: 包含指标、日数据和指定周期的价格K线 (hourlyPrice)
     """
     try:
         from data_cache import data_cache
-        from calculators.defi import calculate_defi as defi_calc
-        from utils.db_loader import load_defi_from_db, load_price_history_from_db
+        from calculators.defi import calculate_defi as defi_calc, calculate_defi_chunked, calculate_defi_sql_async
+        from utils.db_loader import iter_table_chunks, use_streaming
+        from utils.time_index import time_slice
+        from utils.async_db_loader import load_defi_async, load_price_history_async
+        from utils.concurrent_fetch import fetch_all_async
         
         if not data_cache.is_cached:
             raise HTTPException(
@@ -375,31 +428,44 @@ def calculate_defi(request: DateRangeRequest):
             )
         
         # 日期范围计算（UTC+8 00:00）
-        timestamp_col = 'Timestamp(UTC+8)'
         current_start = pd.to_datetime(request.start_date).replace(hour=0, minute=0, second=0, microsecond=0)
         current_end = (pd.to_datetime(request.end_date) + pd.Timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
         
         period_length = (pd.to_datetime(request.end_date) - pd.to_datetime(request.start_date)).days + 1
         prev_start = current_start - pd.Timedelta(days=period_length)
-        prev_end = current_start
-
-        # 从数据库加载 DeFi 活动数据
-        df_defi_all = load_defi_from_db(prev_start, current_end)
-        
-        # 从数据库按需加载价格数据
-        df_price_all = load_price_history_from_db(current_start, current_end)
-        
-        # 分割数据
-        df_current = df_defi_all[(df_defi_all[timestamp_col] >= current_start) & (df_defi_all[timestamp_col] < current_end)].copy()
-        df_prev = df_defi_all[(df_defi_all[timestamp_col] >= prev_start) & (df_defi_all[timestamp_col] < current_start)].copy()
-        
-        # 分割价格数据（如果存在）
-        df_price_current = None
-        if not df_price_all.empty:
-            df_price_current = df_price_all[(df_price_all[timestamp_col] >= current_start) & (df_price_all[timestamp_col] < current_end)].copy()
-        
-        # 调用纯函数
-        result = defi_calc(df_current, df_prev, df_price_current)
+        defi_columns = ['Activity', 'SHIT Change', 'USDT Change']
+        defi_filters = {'Activity': ['BUY', 'SELL', 'LIQ_ADD', 'LIQ_REMOVE']}
+        
+        if _use_sql_engine():
+            # 在数据库中聚合活动指标与小时K线，不拉取原始记录与价格 tick
+            result = await calculate_defi_sql_async(request.start_date, request.end_date, request.resolution)
+        else:
+            streaming = use_streaming(prev_start, current_end)
+            
+            # 从数据库按需加载价格数据 (非流式时与活动数据并发加载)
+            tasks = {'price': load_price_history_async(current_start, current_end, columns=['Price'])}
+            if not streaming:
+                tasks['defi'] = load_defi_async(prev_start, current_end, columns=defi_columns, filters=defi_filters)
+            frames = await fetch_all_async(tasks)
+            df_price_all = frames['price']
+            
+            # 截取本期价格数据（如果存在），按时间二分切片，不复制
+            df_price_current = None
+            if not df_price_all.empty:
+                df_price_current = time_slice(df_price_all, current_start, current_end)
+            
+            if streaming:
+                # 长时间跨度：流式分块加载并折叠聚合
+                result = await run_in_threadpool(
+                    calculate_defi_chunked,
+                    iter_table_chunks('defi', prev_start, current_end, columns=defi_columns, filters=defi_filters),
+                    current_start,
+                    df_price_current,
+                    request.resolution
+                )
+            else:
+                # 调用纯函数 (按 current_start 划分本期/前期，一次分组聚合)
+                result = await run_in_threadpool(defi_calc, frames['defi'], current_start, df_price_current, request.resolution)
         
         return DeFiCalculateResponse(
             metrics=DeFiMetrics(**result['metrics']),
@@ -422,7 +488,7 @@ def calculate_defi(request: DateRangeRequest):
 # ============================================
 
 @router.post("/anomalies", response_model=AnomalyCalculateResponse)
-def calculate_anomalies(request: SingleDateRequest):
+async def calculate_anomalies(request: SingleDateRequest):
     """
     计算特定日期的异常行为检测
     
@@ -433,10 +499,10 @@ def calculate_anomalies(request: SingleDateRequest):
         AnomalyCalculateResponse: 汇总统计和异常明细
     """
     try:
-        from calculators.anomaly import calculate_anomalies as anomaly_calc
+        from calculators.anomaly import calculate_anomalies_async
         
-        # 直接调用计算函数
-        result = anomaly_calc(request.date)
+        # 检测查询经异步引擎并发执行
+        result = await calculate_anomalies_async(request.date)
         
         return AnomalyCalculateResponse(
             summary=AnomalySummary(**result['summary']),
@@ -449,3 +515,69 @@ def calculate_anomalies(request: SingleDateRequest):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
+
+
+@router.post("/anomalies/range", response_model=AnomalyCalculateResponse)
+async def calculate_anomalies_range(request: DateRangeRequest):
+    """
+    计算日期范围内每个业务日的异常行为检测
+    
+    每个检测器对整个范围只执行一次按 (业务日, 地址) 分组的查询，
+    结果与逐日调用 /anomalies 相同，每条明细的 date 为所属业务日。
+    
+    Args:
+        request: 包含 start_date 和 end_date (YYYY-MM-DD，包含) 的请求
+    
+    Returns:
+        AnomalyCalculateResponse: 整个范围的汇总统计和异常明细
+    """
+    try:
+        from calculators.anomaly import calculate_anomalies_range_async
+        
+        result = await calculate_anomalies_range_async(request.start_date, request.end_date)
+        
+        return AnomalyCalculateResponse(
+            summary=AnomalySummary(**result['summary']),
+            anomalies=[AnomalyDetail(**item) for item in result['anomalies']]
+        )
+    
+    except Exception as e:
+        logger.error(f"[Anomaly Range Error] {str(e)}\n{traceback.format_exc()}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+
+@router.post("/anomalies/address", response_model=AnomalyCalculateResponse)
+async def get_address_anomalies(request: AnomalyAddressRequest):
+    """
+    查询某地址的全部异常历史 (TS / POS / Staking 单模块检测及跨模块检测)
+    
+    基于异常存储的地址索引点查询，覆盖后台已填充的已关闭业务日。
+    
+    Args:
+        request: 包含 address 及可选 start_date / end_date 的请求
+    
+    Returns:
+        AnomalyCalculateResponse: 该地址的汇总统计和异常明细
+    """
+    try:
+        from calculators.anomaly import get_address_anomalies as address_anomalies
+        
+        # 本地 SQLite 索引点查询 (不访问 MySQL，没有异步驱动)，在线程池中执行
+        result = await run_in_threadpool(
+            address_anomalies, request.address, request.start_date, request.end_date
+        )
+        
+        return AnomalyCalculateResponse(
+            summary=AnomalySummary(**result['summary']),
+            anomalies=[AnomalyDetail(**item) for item in result['anomalies']]
+        )
+    
+    except Exception as e:
+        logger.error(f"[Anomaly Address Error] {str(e)}\n{traceback.format_exc()}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
@@ -4,7 +4,7 @@
 from fastapi import APIRouter, HTTPException, status
 from datetime import datetime
 from data_cache import data_cache
-from .schemas import LoadDataResponse, LoadDataRequest
+from .schemas import LoadDataResponse, LoadDataRequest, DBPoolStatsResponse, QueryCacheStatsResponse
 
 router = APIRouter(prefix="", tags=["Data"])
 
@@ -26,6 +26,9 @@ async def load_data(request: LoadDataRequest):
     """
     try:
         await data_cache.load_data(force_refresh=request.force_refresh)
+        if request.force_refresh:
+            from utils.interval_cache import query_cache
+            query_cache.clear()
         
         # 获取缓存信息
         cache_info = data_cache.get_cache_info()
@@ -44,3 +47,27 @@ async def load_data(request: LoadDataRequest):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
+
+
+@router.get("/dbPoolStats", response_model=DBPoolStatsResponse)
+def get_db_pool_stats():
+    """
+    获取数据库连接池状态 (每个数据库一个共享引擎)
+    
+    Returns:
+        DBPoolStatsResponse: 各数据库连接池的 checkout / overflow / 等待耗时统计
+    """
+    from utils.db_loader import get_pool_stats
+    return DBPoolStatsResponse(pools=get_pool_stats())
+
+
+@router.get("/queryCacheStats", response_model=QueryCacheStatsResponse)
+def get_query_cache_stats():
+    """
+    获取时间区间查询缓存的命中统计
+    
+    Returns:
+        QueryCacheStatsResponse: 命中 / 部分命中 / 未命中次数及缓存字节数
+    """
+    from utils.interval_cache import query_cache
+    return QueryCacheStatsResponse(stats=query_cache.get_stats())
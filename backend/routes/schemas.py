@@ -2,7 +2,7 @@
 数据计算 API 的 Pydantic 模型/Schema 定义
 """
 from pydantic import BaseModel
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Literal
 
 
 # ============================================
@@ -380,6 +380,11 @@ class DailyDeFiDataEntry(BaseModel):
     tsSellUsdt: float
 
 
+class DeFiRequest(DateRangeRequest):
+    """DeFi 计算请求"""
+    resolution: Literal['1m', '5m', '15m', '1h', '4h', '1d'] = '1h'  # K线周期
+
+
 class DeFiCalculateResponse(BaseModel):
     """DeFi 计算响应"""
     metrics: DeFiMetrics
@@ -403,6 +408,16 @@ class LoadDataResponse(BaseModel):
     cache_size_mb: Optional[float] = None
 
 
+class DBPoolStatsResponse(BaseModel):
+    """数据库连接池统计响应"""
+    pools: Dict[str, Dict[str, Any]]  # {database: {poolSize, checkedOut, overflow, checkouts, avgWaitMs, ...}}
+
+
+class QueryCacheStatsResponse(BaseModel):
+    """查询缓存统计响应"""
+    stats: Dict[str, Any]  # {hits, partialHits, misses, fetches, bytesServed, bytesFetched, evictions, segments, cachedBytes, budgetBytes}
+
+
 # ============================================
 # AI 总结模型
 # ============================================
@@ -440,6 +455,13 @@ class AnomalySummary(BaseModel):
     lowRiskCount: int
 
 
+class AnomalyAddressRequest(BaseModel):
+    """地址异常历史请求"""
+    address: str
+    start_date: Optional[str] = None  # YYYY-MM-DD，不传表示不限
+    end_date: Optional[str] = None    # YYYY-MM-DD，不传表示不限
+
+
 class AnomalyCalculateResponse(BaseModel):
     """异常检测计算响应"""
     summary: AnomalySummary
@@ -0,0 +1,10 @@
+"""
+pytest 配置: 把 backend 目录加入 sys.path，使测试与应用一样以 utils.* / calculators.* 导入
+
+用法 (在 backend 目录下):
+    python -m pytest -q
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,141 @@
+"""calculators.anomaly: 存储缺失的业务日按连续区间查询，后台回填按批次补齐缺口"""
+import asyncio
+import threading
+
+import pandas as pd
+import pytest
+
+from calculators import anomaly
+from calculators.anomaly import TS_DETECTOR
+from utils import anomaly_store
+
+# TS 业务日 2025-12-20 在 UTC 2025-12-21 00:00 关闭
+NOW_UTC = pd.Timestamp('2025-12-21 06:00')
+
+
+@pytest.fixture
+def calls(tmp_path, monkeypatch):
+    """记录 _detect 查询的区间，每个业务日返回一条异常"""
+    monkeypatch.setenv('ANOMALY_STORE', '1')
+    monkeypatch.setenv('ANOMALY_STORE_PATH', str(tmp_path / 'anomalies.sqlite'))
+    monkeypatch.delenv('ANOMALY_STORE_START', raising=False)
+    monkeypatch.setattr(anomaly, '_utc_now', lambda: NOW_UTC)
+    monkeypatch.setattr(anomaly, 'get_db_engine', lambda: object())
+    monkeypatch.setattr(anomaly, 'DETECTORS', [TS_DETECTOR])
+
+    recorded = []
+
+    def detect(engine, detector, start_date, end_date, time_limit):
+        recorded.append((start_date, end_date))
+        return [
+            {'date': day, 'address': 'A', 'type': 'TS_OVER_CLAIM', 'severity': 'medium', 'data': {}}
+            for day in pd.date_range(start_date, end_date).strftime('%Y-%m-%d')
+        ]
+
+    monkeypatch.setattr(anomaly, '_detect', detect)
+    return recorded
+
+
+def _store(*days: str) -> None:
+    anomaly_store.save_days(TS_DETECTOR.label, TS_DETECTOR.version, {day: [] for day in days})
+
+
+def test_contiguous_runs_split_gaps_and_batches():
+    days = ['2025-12-01', '2025-12-02', '2025-12-03', '2025-12-05', '2025-12-06', '2025-12-09']
+    assert anomaly._contiguous_runs(days) == [
+        ('2025-12-01', '2025-12-03'), ('2025-12-05', '2025-12-06'), ('2025-12-09', '2025-12-09')
+    ]
+    assert anomaly._contiguous_runs(days, 2) == [
+        ('2025-12-01', '2025-12-02'), ('2025-12-03', '2025-12-03'),
+        ('2025-12-05', '2025-12-06'), ('2025-12-09', '2025-12-09')
+    ]
+    assert anomaly._contiguous_runs([]) == []
+
+
+def test_detect_with_store_queries_only_missing_runs(calls):
+    _store('2025-12-03', '2025-12-04')
+    records = anomaly._detect_with_store(None, TS_DETECTOR, '2025-12-01', '2025-12-06', 30)
+
+    assert calls == [('2025-12-01', '2025-12-02'), ('2025-12-05', '2025-12-06')]
+    assert [r['date'] for r in records] == ['2025-12-01', '2025-12-02', '2025-12-05', '2025-12-06']
+
+
+def test_fill_backfills_gaps_below_an_early_stored_day(calls, monkeypatch):
+    monkeypatch.setenv('ANOMALY_STORE_BACKFILL_DAYS', '10')
+    # 首次填充前用户查询过很早的日期，不影响回填窗口
+    _store('2025-01-05', '2025-12-15')
+
+    (result,) = anomaly.fill_anomaly_store()
+
+    assert calls == [('2025-12-11', '2025-12-14'), ('2025-12-16', '2025-12-20')]
+    assert result == {'detector': 'TS', 'days': 9, 'anomalies': 9}
+    assert anomaly_store.stored_days('TS', TS_DETECTOR.version, '2025-12-11', '2025-12-20') == set(
+        pd.date_range('2025-12-11', '2025-12-20').strftime('%Y-%m-%d')
+    )
+
+    # 已补齐，再次填充不再查询
+    calls.clear()
+    assert anomaly.fill_anomaly_store() == [{'detector': 'TS', 'days': 0, 'anomalies': 0}]
+    assert calls == []
+
+
+def test_fill_from_configured_start_is_batched(calls, monkeypatch):
+    monkeypatch.setenv('ANOMALY_STORE_BACKFILL_DAYS', '7')
+    monkeypatch.setenv('ANOMALY_STORE_START', '2025-12-01')
+
+    anomaly.fill_anomaly_store()
+
+    assert calls == [
+        ('2025-12-01', '2025-12-07'), ('2025-12-08', '2025-12-14'), ('2025-12-15', '2025-12-20')
+    ]
+
+
+def test_time_limit_uses_max_statement_time_on_mariadb():
+    class Dialect:
+        is_mariadb = True
+
+    sql = "\n    SELECT a FROM t WHERE b = :b\n    "
+    assert anomaly._with_time_limit(sql, 30) == "\n    SELECT /*+ MAX_EXECUTION_TIME(30000) */ a FROM t WHERE b = :b\n    "
+    assert anomaly._with_time_limit(sql, 30, Dialect()) == "SET STATEMENT max_statement_time=30 FOR SELECT a FROM t WHERE b = :b"
+    assert anomaly._with_time_limit(sql, 2.5, Dialect()).startswith("SET STATEMENT max_statement_time=2.5 FOR SELECT")
+
+
+def test_range_runs_detectors_on_shared_fetch_executor(calls, monkeypatch):
+    monkeypatch.setenv('ANOMALY_STORE', '0')
+    threads = []
+    detect = anomaly._detect
+
+    def recording_detect(*args):
+        threads.append(threading.current_thread().name)
+        return detect(*args)
+
+    monkeypatch.setattr(anomaly, '_detect', recording_detect)
+    result = anomaly.calculate_anomalies_range('2025-12-01', '2025-12-02')
+
+    assert calls == [('2025-12-01', '2025-12-02')]
+    assert all(name.startswith('db-fetch') for name in threads)
+    assert result['summary']['totalCount'] == 2
+
+
+def test_async_range_cancels_slow_detector(monkeypatch):
+    monkeypatch.setenv('ANOMALY_STORE', '0')
+    monkeypatch.setenv('ANOMALY_DETECTOR_TIMEOUT', '0.05')
+    monkeypatch.setattr(anomaly, 'get_async_db_engine', lambda: object())
+    cancelled = []
+
+    async def detect_async(engine, detector, start_date, end_date, time_limit):
+        if detector is TS_DETECTOR:
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(detector.label)
+                raise
+        return [{'date': start_date, 'address': 'A', 'type': f'{detector.label}_X', 'severity': 'high', 'data': {}}]
+
+    monkeypatch.setattr(anomaly, '_detect_async', detect_async)
+    result = asyncio.run(anomaly.calculate_anomalies_range_async('2025-12-01', '2025-12-01'))
+
+    assert cancelled == ['TS']
+    assert [a['type'] for a in result['anomalies']] == [
+        f'{d.label}_X' for d in anomaly.DETECTORS if d is not TS_DETECTOR
+    ]
@@ -0,0 +1,134 @@
+"""calculators.anomaly: 规则的 SQL 谓词与 pandas 判定一致、规则分类与明细折叠"""
+import sqlite3
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from calculators.anomaly import (
+    DETECTORS,
+    TS_DETECTOR,
+    POS_DETECTOR,
+    STAKING_DETECTOR,
+    CROSS_MODULE_DETECTOR,
+    _classify,
+    _prepare_metrics,
+)
+
+
+def _rule_metrics(detector) -> list:
+    return sorted({metric for rule in detector.rules for clause in rule.when for metric, _, _ in clause})
+
+
+def _grid(metrics: list) -> pd.DataFrame:
+    """覆盖各阈值两侧的指标组合 (随机抽样，固定种子)"""
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({metric: rng.integers(0, 25, 2000) for metric in metrics})
+
+
+@pytest.mark.parametrize('detector', DETECTORS, ids=lambda d: d.label)
+def test_rule_sql_matches_evaluate(detector):
+    df = _grid(_rule_metrics(detector))
+    conn = sqlite3.connect(':memory:')
+    df.to_sql('m', conn, index=True, index_label='row')
+
+    for rule in detector.rules:
+        sql_rows = [row for (row,) in conn.execute(f"SELECT row FROM m WHERE {rule.to_sql()} ORDER BY row")]
+        assert sql_rows == np.flatnonzero(rule.evaluate(df)).tolist(), rule.type
+
+
+def test_ts_rule_boundaries():
+    claims, draws = zip(*itertools.product([4, 5, 9, 10, 19, 20, 21], [0, 1, 2, 3, 4]))
+    df = pd.DataFrame({'claims': claims, 'draws': draws})
+    hits = {rule.type: set(np.flatnonzero(rule.evaluate(df))) for rule in TS_DETECTOR.rules}
+
+    def rows(pred):
+        return {i for i, (c, d) in enumerate(zip(claims, draws)) if pred(c, d)}
+
+    assert hits['TS_LUCKY_DRAW_OVER'] == rows(lambda c, d: d > 3)
+    assert hits['TS_OVER_CLAIM'] == rows(lambda c, d: c > 20)
+    assert hits['TS_LOGIC_ERROR'] == rows(
+        lambda c, d: (c < 5 and d >= 1) or (5 <= c < 10 and d >= 2) or (10 <= c < 20 and d == 3)
+    )
+
+
+def test_exclusive_rule_blocks_later_rules():
+    df = pd.DataFrame({
+        'biz_date': ['2025-12-01', '2025-12-01'],
+        'address': ['A', 'B'],
+        'claims': [21, 21],
+        'draws': [4, 0],
+    })
+    records = _classify(df, TS_DETECTOR)
+    assert [(r['address'], r['type']) for r in records] == [
+        ('A', 'TS_LUCKY_DRAW_OVER'),
+        ('B', 'TS_OVER_CLAIM'),
+    ]
+    assert records[0]['description'] == "严重错误: 抽奖次数溢出 (4次, 标准上限3次)"
+    assert records[1]['data'] == {'luckyDraws': 0, 'claims': 21}
+
+
+def test_detail_rows_fold_to_concat_text_and_list():
+    # 查询返回每条明细一行 (CAST(amount AS CHAR))，折叠为每个 (业务日, 地址) 一行
+    df = pd.DataFrame({
+        'biz_date': ['2025-12-01'] * 3 + ['2025-12-02'] * 2,
+        'address': ['A', 'A', 'A', 'B', 'B'],
+        'count': [3, 3, 3, 2, 2],
+        'detail': ['10.5', None, '2', '7.25', '0.125'],
+    })
+    folded = _prepare_metrics(df, POS_DETECTOR)
+    records = _classify(folded, POS_DETECTOR)
+
+    assert [r['data'] for r in records] == [
+        {'count': 3, 'amounts': '10.5,2', 'amountList': [10.5, 2.0]},
+        {'count': 2, 'amounts': '7.25,0.125', 'amountList': [7.25, 0.125]},
+    ]
+    assert records[0]['description'] == "POS 同日重复领取: 3次 (金额: 10.5,2)"
+
+
+def test_cross_module_rules_require_anomalies_in_two_modules():
+    # 跨模块命中的 (业务日, 地址) 换算为单模块指标后，至少两个单模块检测器也命中；合规使用不会命中
+    grid = pd.DataFrame(
+        list(itertools.product([1, 2, 3, 4], range(0, 23), range(0, 6), [0, 1, 2, 3], [0, 1, 2, 3], [0, 1])),
+        columns=['modules', 'ts_claims', 'ts_draws', 'pos_claims', 'staking_claims', 'shitcode_claims']
+    )
+    singles = [
+        (TS_DETECTOR, grid.rename(columns={'ts_claims': 'claims', 'ts_draws': 'draws'})),
+        (POS_DETECTOR, grid.rename(columns={'pos_claims': 'count'})),
+        (STAKING_DETECTOR, grid.rename(columns={'staking_claims': 'count'})),
+    ]
+    anomalous_modules = sum(
+        np.logical_or.reduce([rule.evaluate(frame) for rule in detector.rules])
+        for detector, frame in singles
+    )
+
+    for rule in CROSS_MODULE_DETECTOR.rules:
+        hits = rule.evaluate(grid)
+        assert hits.any(), rule.type
+        assert (anomalous_modules[hits] >= 2).all(), rule.type
+
+    compliant = anomalous_modules == 0
+    assert compliant.any()
+    assert not np.logical_or.reduce([rule.evaluate(grid) for rule in CROSS_MODULE_DETECTOR.rules])[compliant].any()
+
+
+def test_cross_module_duplicate_takes_precedence():
+    df = pd.DataFrame({
+        'biz_date': ['2025-12-01'] * 3,
+        'address': ['A', 'B', 'C'],
+        'modules': [3, 2, 4],
+        'ts_claims': [21, 21, 20],
+        'ts_draws': [0, 0, 3],
+        'pos_claims': [2, 2, 1],
+        'staking_claims': [2, 0, 1],
+        'shitcode_claims': [1, 0, 1],
+    })
+    records = _classify(df, CROSS_MODULE_DETECTOR)
+    assert [(r['address'], r['type'], r['severity']) for r in records] == [
+        ('A', 'CROSS_MODULE_DUPLICATE', 'high'),
+        ('B', 'CROSS_MODULE_ANOMALY', 'medium'),
+    ]
+    assert records[1]['data'] == {
+        'modules': 2, 'claims': 21, 'luckyDraws': 0, 'posClaims': 2, 'stakingClaims': 0, 'shitcodeClaims': 0
+    }
@@ -0,0 +1,101 @@
+"""utils.anomaly_store: 按版本读写、旧版本清理、地址查询"""
+import sqlite3
+
+import pytest
+
+from utils import anomaly_store
+
+
+@pytest.fixture(autouse=True)
+def store_path(tmp_path, monkeypatch):
+    path = str(tmp_path / 'anomalies.sqlite')
+    monkeypatch.setenv('ANOMALY_STORE_PATH', path)
+    return path
+
+
+def _record(day: str, address: str, type: str = 'POS_DUPLICATE') -> dict:
+    return {'date': day, 'address': address, 'type': type, 'severity': 'high', 'data': {'count': 2}}
+
+
+def test_save_and_load_days_by_version():
+    anomaly_store.save_days('POS', 'v1', {
+        '2025-12-01': [_record('2025-12-01', 'A'), _record('2025-12-01', 'B')],
+        '2025-12-02': [],
+    })
+
+    assert anomaly_store.load_days('POS', 'v1', '2025-12-01', '2025-12-31') == {
+        '2025-12-01': [_record('2025-12-01', 'A'), _record('2025-12-01', 'B')],
+        '2025-12-02': [],
+    }
+    assert anomaly_store.load_days('POS', 'v2', '2025-12-01', '2025-12-31') == {}
+    assert anomaly_store.load_days('Staking', 'v1', '2025-12-01', '2025-12-31') == {}
+    assert anomaly_store.stored_days('POS', 'v1', '2025-12-01', '2025-12-31') == {'2025-12-01', '2025-12-02'}
+    assert anomaly_store.stored_days('POS', 'v1', '2025-12-02', '2025-12-31') == {'2025-12-02'}
+
+
+def test_save_overwrites_day():
+    anomaly_store.save_days('POS', 'v1', {'2025-12-01': [_record('2025-12-01', 'A'), _record('2025-12-01', 'B')]})
+    anomaly_store.save_days('POS', 'v1', {'2025-12-01': [_record('2025-12-01', 'C')]})
+
+    assert anomaly_store.load_days('POS', 'v1', '2025-12-01', '2025-12-01') == {
+        '2025-12-01': [_record('2025-12-01', 'C')]
+    }
+
+
+def test_new_version_prunes_superseded_results():
+    anomaly_store.save_days('POS', 'v1', {'2025-12-01': [_record('2025-12-01', 'A')]})
+    anomaly_store.save_days('Staking', 'v1', {'2025-12-01': [_record('2025-12-01', 'A', 'STAKING_DUPLICATE')]})
+    anomaly_store.save_days('POS', 'v2', {'2025-12-02': [_record('2025-12-02', 'A')]})
+
+    assert anomaly_store.load_days('POS', 'v1', '2025-12-01', '2025-12-31') == {}
+    assert anomaly_store.stored_days('POS', 'v1', '2025-12-01', '2025-12-31') == set()
+    assert anomaly_store.load_days('POS', 'v2', '2025-12-01', '2025-12-31') == {
+        '2025-12-02': [_record('2025-12-02', 'A')]
+    }
+    # 其他检测器不受影响
+    assert anomaly_store.stored_days('Staking', 'v1', '2025-12-01', '2025-12-31') == {'2025-12-01'}
+
+
+def test_load_address_filters_versions_and_days():
+    anomaly_store.save_days('TS', 't1', {
+        '2025-12-01': [_record('2025-12-01', 'A', 'TS_OVER_CLAIM'), _record('2025-12-01', 'B', 'TS_OVER_CLAIM')],
+        '2025-12-03': [_record('2025-12-03', 'A', 'TS_LOGIC_ERROR')],
+    })
+    anomaly_store.save_days('POS', 'p1', {
+        '2025-12-01': [_record('2025-12-01', 'A')],
+        '2025-12-02': [_record('2025-12-02', 'A')],
+    })
+
+    # 同一业务日内按 versions 中检测器的顺序排列
+    records = anomaly_store.load_address('A', {'POS': 'p1', 'TS': 't1'})
+    assert [(r['date'], r['type']) for r in records] == [
+        ('2025-12-01', 'POS_DUPLICATE'),
+        ('2025-12-01', 'TS_OVER_CLAIM'),
+        ('2025-12-02', 'POS_DUPLICATE'),
+        ('2025-12-03', 'TS_LOGIC_ERROR'),
+    ]
+
+    records = anomaly_store.load_address('A', {'TS': 't1', 'POS': 'p1'}, '2025-12-02', '2025-12-03')
+    assert [(r['date'], r['type']) for r in records] == [
+        ('2025-12-02', 'POS_DUPLICATE'),
+        ('2025-12-03', 'TS_LOGIC_ERROR'),
+    ]
+
+    # 非当前版本的结果不返回
+    assert [r['type'] for r in anomaly_store.load_address('A', {'TS': 't2', 'POS': 'p1'})] == ['POS_DUPLICATE'] * 2
+    assert anomaly_store.load_address('A', {}) == []
+    assert anomaly_store.load_address('Z', {'TS': 't1'}) == []
+
+
+def test_address_lookup_uses_address_index(store_path):
+    anomaly_store.save_days('TS', 't1', {'2025-12-01': [_record('2025-12-01', 'A', 'TS_OVER_CLAIM')]})
+    conn = sqlite3.connect(store_path)
+    try:
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT detector, record FROM anomaly_records "
+            "WHERE address = ? AND version IN (?, ?) AND day >= ? ORDER BY day, seq",
+            ('A', 't1', 'p1', '2025-12-01')
+        ).fetchall()
+    finally:
+        conn.close()
+    assert any('idx_anomaly_address' in row[-1] for row in plan)
@@ -0,0 +1,39 @@
+"""utils.async_db_loader: 异步连接按连接池容量限流"""
+import asyncio
+from contextlib import asynccontextmanager
+
+from utils.async_db_loader import async_connect
+
+
+class _Engine:
+    """记录同时持有的连接数"""
+
+    def __init__(self) -> None:
+        self.active = 0
+        self.peak = 0
+
+    @asynccontextmanager
+    async def connect(self):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            yield self
+        finally:
+            self.active -= 1
+
+
+def test_async_connect_never_exceeds_pool_capacity(monkeypatch):
+    monkeypatch.setenv('DB_POOL_SIZE', '2')
+    monkeypatch.setenv('DB_MAX_OVERFLOW', '1')
+    engine = _Engine()
+
+    async def query():
+        async with async_connect(engine):
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(*(query() for _ in range(20)))
+
+    asyncio.run(main())
+    assert engine.peak == 3
+    assert engine.active == 0
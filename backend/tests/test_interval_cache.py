@@ -0,0 +1,122 @@
+"""utils.interval_cache: 区间合并、只拉取缺失子区间、LRU 淘汰、返回结果与缓存隔离、可缓存上界"""
+import pandas as pd
+import pytest
+
+from utils.interval_cache import IntervalCache, TIMESTAMP_COL, get_stable_end
+
+DAY = pd.Timedelta(days=1)
+T0 = pd.Timestamp('2025-12-01')
+
+
+def _rows(start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+    ts = pd.date_range(start, end, freq='h', inclusive='left')
+    return pd.DataFrame({TIMESTAMP_COL: ts, 'value': range(len(ts))})
+
+
+class _Source:
+    """记录每次 fetch 的区间"""
+
+    def __init__(self) -> None:
+        self.calls = []
+
+    def __call__(self, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+        self.calls.append((start, end))
+        return _rows(start, end)
+
+
+def _segments(cache: IntervalCache, key: tuple) -> list:
+    return [(s.start, s.end) for s in cache._segments.get(key, [])]
+
+
+def test_adjacent_and_overlapping_intervals_merge():
+    cache = IntervalCache(10 ** 8)
+    source = _Source()
+    key = ('ts_log',)
+
+    cache.get_or_fetch(key, T0, T0 + DAY, source)
+    cache.get_or_fetch(key, T0 + DAY, T0 + 2 * DAY, source)
+    assert _segments(cache, key) == [(T0, T0 + 2 * DAY)]
+
+    cache.get_or_fetch(key, T0 + 3 * DAY, T0 + 4 * DAY, source)
+    assert _segments(cache, key) == [(T0, T0 + 2 * DAY), (T0 + 3 * DAY, T0 + 4 * DAY)]
+
+    # 覆盖空洞的请求把三段合并为一段，且只拉取缺失部分
+    source.calls.clear()
+    df = cache.get_or_fetch(key, T0 + DAY, T0 + 4 * DAY, source)
+    assert source.calls == [(T0 + 2 * DAY, T0 + 3 * DAY)]
+    assert _segments(cache, key) == [(T0, T0 + 4 * DAY)]
+    assert df[TIMESTAMP_COL].tolist() == list(pd.date_range(T0 + DAY, T0 + 4 * DAY, freq='h', inclusive='left'))
+
+
+def test_hit_partial_hit_and_miss_stats():
+    cache = IntervalCache(10 ** 8)
+    source = _Source()
+    key = ('pos_log',)
+
+    cache.get_or_fetch(key, T0, T0 + DAY, source)
+    cache.get_or_fetch(key, T0 + 6 * pd.Timedelta(hours=1), T0 + DAY, source)
+    cache.get_or_fetch(key, T0, T0 + 2 * DAY, source)
+
+    stats = cache.get_stats()
+    assert (stats['misses'], stats['hits'], stats['partialHits'], stats['fetches']) == (1, 1, 1, 2)
+    assert stats['bytesServed'] > 0
+    assert stats['cachedBytes'] == sum(s.nbytes for segs in cache._segments.values() for s in segs)
+
+
+def test_least_recently_used_segment_is_evicted():
+    # 单日数据的缓存大小，预算设为 2.5 段
+    probe = IntervalCache(10 ** 8)
+    probe.get_or_fetch(('probe',), T0, T0 + DAY, _Source())
+    segment_bytes = probe.get_stats()['cachedBytes']
+
+    cache = IntervalCache(int(segment_bytes * 2.5))
+    source = _Source()
+    cache.get_or_fetch(('a',), T0, T0 + DAY, source)
+    cache.get_or_fetch(('b',), T0, T0 + DAY, source)
+    cache.get_or_fetch(('a',), T0, T0 + DAY, source)   # a 变为最近使用
+    cache.get_or_fetch(('c',), T0, T0 + DAY, source)   # 超出预算，淘汰 b
+
+    assert _segments(cache, ('a',)) == [(T0, T0 + DAY)]
+    assert _segments(cache, ('b',)) == []
+    assert _segments(cache, ('c',)) == [(T0, T0 + DAY)]
+    assert cache.get_stats()['evictions'] == 1
+    assert cache.get_stats()['cachedBytes'] <= cache.budget_bytes
+
+
+def test_results_are_isolated_from_cached_data():
+    cache = IntervalCache(10 ** 8)
+    source = _Source()
+    key = ('ts_log',)
+
+    fetched = cache.get_or_fetch(key, T0, T0 + DAY, source)
+    fetched['value'] = -1
+    cached = cache.get_or_fetch(key, T0, T0 + DAY, source)
+    assert cached['value'].min() == 0
+
+    cached['value'] = -1
+    assert cache.get_or_fetch(key, T0, T0 + DAY, source)['value'].min() == 0
+    assert len(source.calls) == 1
+
+
+def test_failed_fetch_is_not_cached():
+    cache = IntervalCache(10 ** 8)
+
+    def failing(start, end):
+        raise RuntimeError('db down')
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_fetch(('ts_log',), T0, T0 + DAY, failing)
+    assert cache.get_stats()['segments'] == 0
+
+
+def test_stable_end_lag_defaults_to_mirror_overlap(monkeypatch):
+    monkeypatch.delenv('QUERY_CACHE_LAG_MINUTES', raising=False)
+    monkeypatch.delenv('PARQUET_MIRROR_OVERLAP_MINUTES', raising=False)
+    now_utc8 = pd.Timestamp.now(tz='UTC').tz_localize(None) + pd.Timedelta(hours=8)
+    assert now_utc8 - get_stable_end() >= pd.Timedelta(minutes=120)
+
+    monkeypatch.setenv('PARQUET_MIRROR_OVERLAP_MINUTES', '480')
+    assert now_utc8 - get_stable_end() >= pd.Timedelta(minutes=480)
+
+    monkeypatch.setenv('QUERY_CACHE_LAG_MINUTES', '10')
+    assert now_utc8 - get_stable_end() < pd.Timedelta(minutes=11)
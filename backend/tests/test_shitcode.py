@@ -0,0 +1,88 @@
+"""calculators.shitcode: 空地址 / 空金额记录计入周期总量，不计入独立地址数和排行"""
+import numpy as np
+import pandas as pd
+
+from calculators.shitcode import (
+    TIMESTAMP_COL,
+    _user_partials,
+    _merge_user_partials,
+    _finalize_period,
+    calculate_shitcode,
+    calculate_shitcode_chunked,
+)
+
+CURRENT_START = pd.Timestamp('2025-12-02')
+
+
+def _log() -> pd.DataFrame:
+    """按时间排序的 ShitCode_Log，含空地址、空金额"""
+    return pd.DataFrame({
+        TIMESTAMP_COL: pd.to_datetime([
+            '2025-12-01 10:00', '2025-12-01 11:00',
+            '2025-12-02 09:00', '2025-12-02 10:00', '2025-12-02 11:00',
+            '2025-12-03 09:00', '2025-12-03 10:00',
+        ]),
+        'Receiver Address': pd.Series(['A', None, 'A', 'B', None, 'A', None], dtype='category'),
+        'SHIT Sent': [1.0, 2.0, 10.0, np.nan, 5.0, 20.0, np.nan],
+        'SOL Received': [0.1] * 7,
+    })
+
+
+def test_user_partials_keep_null_address_group():
+    df = _log()
+    current, prev = _user_partials(df, df[TIMESTAMP_COL] >= CURRENT_START)
+
+    assert current.loc['A'].tolist() == [30.0, 2, 2]
+    assert current.loc['B'].tolist() == [0.0, 0, 1]
+    null_row = current[current.index.isna()]
+    assert null_row[['claimAmount', 'claimCount', 'rowCount']].iloc[0].tolist() == [5.0, 1, 2]
+
+    assert prev['rowCount'].sum() == 2
+    assert prev['claimAmount'].sum() == 3.0
+
+
+def test_period_counts_every_row_but_only_real_addresses():
+    df = _log()
+    current, prev = _user_partials(df, df[TIMESTAMP_COL] >= CURRENT_START)
+
+    assert _finalize_period(current) == {
+        'claimCount': 5,
+        'claimAmount': 35.0,
+        'uniqueAddresses': 2,
+        'avgClaimPerAddress': 17.5,
+    }
+    # 前一周期只有一个真实地址
+    assert _finalize_period(prev)['claimCount'] == 2
+    assert _finalize_period(prev)['uniqueAddresses'] == 1
+
+
+def test_only_null_addresses_has_no_average():
+    df = _log()
+    df['Receiver Address'] = pd.Series([None] * len(df), dtype='category')
+    current, _ = _user_partials(df, df[TIMESTAMP_COL] >= CURRENT_START)
+
+    metrics = _finalize_period(current)
+    assert metrics['claimCount'] == 5
+    assert metrics['uniqueAddresses'] == 0
+    assert metrics['avgClaimPerAddress'] is None
+
+
+def test_chunked_merge_matches_single_pass():
+    df = _log()
+    single = calculate_shitcode(df, CURRENT_START)
+    chunked = calculate_shitcode_chunked([df.iloc[:3], df.iloc[3:5], df.iloc[5:]], CURRENT_START)
+
+    assert chunked == single
+    assert single['metrics']['claimCountCurrent'] == 5
+    assert single['metrics']['claimCountPrev'] == 2
+    assert [user['fullAddress'] for user in single['topUsers']] == ['A', 'B']
+    assert sum(day['claimCount'] for day in single['dailyData']) == 5
+
+
+def test_merge_user_partials_sums_null_group_across_chunks():
+    df = _log()
+    parts = [_user_partials(chunk, chunk[TIMESTAMP_COL] >= CURRENT_START)[0] for chunk in (df.iloc[2:4], df.iloc[4:])]
+    merged = _merge_user_partials(parts)
+
+    assert merged['rowCount'].sum() == 5
+    assert int(merged.index.isna().sum()) == 1
@@ -0,0 +1,74 @@
+"""utils.sql_query: 同一条查询经同步 / 异步引擎执行得到相同结果，失败时按 on_error 返回默认值"""
+import asyncio
+from contextlib import asynccontextmanager
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, text
+
+from utils.sql_query import SqlQuery, run_queries, run_queries_async
+
+
+@pytest.fixture
+def engine(tmp_path):
+    # 查询在线程池中执行，使用文件数据库 (内存库每个连接各自独立)
+    engine = create_engine(f"sqlite:///{tmp_path / 'db.sqlite'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE t (day TEXT, amount REAL)"))
+        conn.execute(text("INSERT INTO t VALUES ('2025-12-01', 1.5), ('2025-12-01', 2), ('2025-12-02', 4)"))
+    return engine
+
+
+class _AsyncEngine:
+    """以同步引擎模拟 AsyncEngine.connect() / AsyncConnection.execute()"""
+
+    def __init__(self, engine) -> None:
+        self.engine = engine
+
+    @asynccontextmanager
+    async def connect(self):
+        with self.engine.connect() as conn:
+            yield _AsyncConnection(conn)
+
+
+class _AsyncConnection:
+
+    def __init__(self, conn) -> None:
+        self.conn = conn
+
+    async def execute(self, stmt, params=None):
+        return self.conn.execute(stmt, params)
+
+
+def _queries() -> dict:
+    return {
+        'total': SqlQuery("SELECT COUNT(*), SUM(amount) FROM t WHERE day >= :start", {'start': '2025-12-01'},
+                          lambda row: (int(row[0]), float(row[1])), one_row=True),
+        'daily': SqlQuery("SELECT day, SUM(amount) as amount FROM t GROUP BY day ORDER BY day", {},
+                          lambda df: df.to_dict('records')),
+        'broken': SqlQuery("SELECT * FROM missing", {}, lambda df: df, on_error=list),
+    }
+
+
+def test_sync_and_async_runs_share_queries_and_results(engine):
+    sync_results = run_queries(engine, _queries())
+    async_results = asyncio.run(run_queries_async(_AsyncEngine(engine), _queries()))
+
+    assert sync_results == async_results == {
+        'total': (3, 7.5),
+        'daily': [{'day': '2025-12-01', 'amount': 3.5}, {'day': '2025-12-02', 'amount': 4.0}],
+        'broken': [],
+    }
+
+
+def test_failed_query_without_default_raises(engine):
+    query = SqlQuery("SELECT * FROM missing", {}, lambda df: df)
+    with pytest.raises(Exception):
+        run_queries(engine, {'broken': query})
+
+
+def test_empty_result_keeps_columns(engine):
+    query = SqlQuery("SELECT day, amount FROM t WHERE day > :end", {'end': '2099-01-01'}, lambda df: df)
+    df = run_queries(engine, {'empty': query})['empty']
+    assert isinstance(df, pd.DataFrame) and df.empty
+    assert list(df.columns) == ['day', 'amount']
@@ -0,0 +1,242 @@
+"""
+已关闭业务日的异常检测结果持久化 (本地 SQLite)
+业务日关闭后其原始数据不再变化，检测结果按 (检测器, 检测器版本, 业务日) 存储一次，
+之后的请求直接读取，只有尚未关闭的业务日才实时查询 MySQL。
+
+检测器版本由规则定义计算得出，规则或阈值变更后旧结果自动失效 (不会被读取)，
+并在新版本首次写入时删除。
+
+表结构:
+    anomaly_days (detector, version, day, computed_at)       已完成检测的业务日 (包括无异常的日期)
+    anomaly_records (detector, version, day, seq, address, type, record)
+                                                             异常明细 (JSON)，seq 保持原输出顺序
+    idx_anomaly_address (address, day, type)                 地址 -> (业务日, 类型) 索引，地址历史为点查询
+"""
+import os
+import json
+import sqlite3
+import threading
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+_WRITE_LOCK = threading.RLock()
+
+# 已完成建表 / 升级的存储路径，以及已清理过旧版本的 (路径, 检测器, 版本)，每个进程只做一次
+_INITIALIZED_PATHS = set()
+_PRUNED_VERSIONS = set()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS anomaly_days (
+    detector TEXT NOT NULL,
+    version TEXT NOT NULL,
+    day TEXT NOT NULL,
+    computed_at TEXT NOT NULL,
+    PRIMARY KEY (detector, version, day)
+);
+CREATE TABLE IF NOT EXISTS anomaly_records (
+    detector TEXT NOT NULL,
+    version TEXT NOT NULL,
+    day TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    address TEXT,
+    type TEXT,
+    record TEXT NOT NULL,
+    PRIMARY KEY (detector, version, day, seq)
+);
+"""
+
+_INDEX = "CREATE INDEX IF NOT EXISTS idx_anomaly_address ON anomaly_records (address, day, type)"
+
+
+def is_store_enabled() -> bool:
+    """是否启用异常结果持久化 (ANOMALY_STORE，默认关闭)"""
+    return os.getenv("ANOMALY_STORE", "0").lower() in ("1", "true", "yes")
+
+
+def get_store_path() -> str:
+    return os.getenv("ANOMALY_STORE_PATH") or os.path.join(
+        os.path.dirname(os.path.dirname(__file__)), '.cache', 'anomalies.sqlite'
+    )
+
+
+def _connect() -> sqlite3.Connection:
+    """打开存储连接 (首次打开某路径时建表)"""
+    path = get_store_path()
+    if path not in _INITIALIZED_PATHS:
+        _initialize(path)
+    return sqlite3.connect(path, timeout=30)
+
+
+def _initialize(path: str) -> None:
+    """建表、升级旧版结构并启用 WAL (进程内每个路径只执行一次)"""
+    with _WRITE_LOCK:
+        if path in _INITIALIZED_PATHS:
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            _migrate(conn)
+            conn.execute(_INDEX)
+            conn.commit()
+        finally:
+            conn.close()
+        _INITIALIZED_PATHS.add(path)
+
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    """旧版存储没有 address / type 列: 补列并从 JSON 明细回填"""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(anomaly_records)")}
+    if 'address' in columns:
+        return
+    with conn:
+        conn.execute("ALTER TABLE anomaly_records ADD COLUMN address TEXT")
+        conn.execute("ALTER TABLE anomaly_records ADD COLUMN type TEXT")
+        conn.execute(
+            "UPDATE anomaly_records SET address = json_extract(record, '$.address'), "
+            "type = json_extract(record, '$.type')"
+        )
+    logger.info("异常存储已升级: 新增地址索引")
+
+
+def load_days(detector: str, version: str, start_day: str, end_day: str) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    读取 [start_day, end_day] 内已存储的业务日
+
+    Returns:
+        {业务日: 异常明细列表}，只包含已完成检测的日期 (无异常的日期为空列表)
+    """
+    conn = _connect()
+    try:
+        days = conn.execute(
+            "SELECT day FROM anomaly_days WHERE detector = ? AND version = ? AND day BETWEEN ? AND ?",
+            (detector, version, start_day, end_day)
+        ).fetchall()
+        result = {day: [] for (day,) in days}
+        rows = conn.execute(
+            "SELECT day, record FROM anomaly_records "
+            "WHERE detector = ? AND version = ? AND day BETWEEN ? AND ? ORDER BY day, seq",
+            (detector, version, start_day, end_day)
+        ).fetchall()
+    finally:
+        conn.close()
+
+    for day, record in rows:
+        if day in result:
+            result[day].append(json.loads(record))
+    return result
+
+
+def save_days(detector: str, version: str, records_by_day: Dict[str, List[Dict[str, Any]]]) -> None:
+    """
+    写入 (覆盖) 若干业务日的检测结果，单个事务内完成
+
+    同一检测器的旧版本结果已失效，在该版本首次写入时一并删除。
+    """
+    if not records_by_day:
+        return
+    computed_at = datetime.now().isoformat()
+    prune_key = (get_store_path(), detector, version)
+    with _WRITE_LOCK:
+        conn = _connect()
+        try:
+            with conn:
+                if prune_key not in _PRUNED_VERSIONS:
+                    _prune_versions(conn, detector, version)
+                for day, records in records_by_day.items():
+                    conn.execute(
+                        "DELETE FROM anomaly_records WHERE detector = ? AND version = ? AND day = ?",
+                        (detector, version, day)
+                    )
+                    conn.executemany(
+                        "INSERT INTO anomaly_records (detector, version, day, seq, address, type, record) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        [(detector, version, day, seq, record['address'], record['type'],
+                          json.dumps(record, ensure_ascii=False))
+                         for seq, record in enumerate(records)]
+                    )
+                    conn.execute(
+                        "INSERT OR REPLACE INTO anomaly_days (detector, version, day, computed_at) VALUES (?, ?, ?, ?)",
+                        (detector, version, day, computed_at)
+                    )
+        finally:
+            conn.close()
+        _PRUNED_VERSIONS.add(prune_key)
+
+
+def _prune_versions(conn: sqlite3.Connection, detector: str, version: str) -> None:
+    """删除检测器非当前版本的结果"""
+    removed = conn.execute(
+        "DELETE FROM anomaly_records WHERE detector = ? AND version <> ?", (detector, version)
+    ).rowcount
+    conn.execute("DELETE FROM anomaly_days WHERE detector = ? AND version <> ?", (detector, version))
+    if removed:
+        logger.info(f"异常存储已清理 {detector} 旧版本结果 {removed} 条")
+
+
+def stored_days(detector: str, version: str, start_day: str, end_day: str) -> Set[str]:
+    """该检测器版本在 [start_day, end_day] 内已完成检测的业务日"""
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            "SELECT day FROM anomaly_days WHERE detector = ? AND version = ? AND day BETWEEN ? AND ?",
+            (detector, version, start_day, end_day)
+        ).fetchall()
+    finally:
+        conn.close()
+    return {day for (day,) in rows}
+
+
+def load_address(
+    address: str,
+    versions: Dict[str, str],
+    start_day: Optional[str] = None,
+    end_day: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    按地址点查询已存储的异常明细 (走 idx_anomaly_address 索引)
+
+    Args:
+        address: 钱包地址
+        versions: {检测器: 当前版本}，只返回当前版本规则下的结果
+        start_day / end_day: 可选的业务日范围 (包含)
+
+    Returns:
+        按业务日、检测器、原输出顺序排列的异常明细
+    """
+    if not versions:
+        return []
+    # 版本哈希由检测器定义计算，按版本过滤即限定为各检测器的当前版本；
+    # 条件中不含 detector，保证查询走地址索引而不是主键
+    conditions = ["address = ?", f"version IN ({', '.join('?' * len(versions))})"]
+    params: List[Any] = [address, *versions.values()]
+    if start_day is not None:
+        conditions.append("day >= ?")
+        params.append(start_day)
+    if end_day is not None:
+        conditions.append("day <= ?")
+        params.append(end_day)
+
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            f"SELECT detector, record FROM anomaly_records "
+            f"WHERE {' AND '.join(conditions)} ORDER BY day, seq",
+            params
+        ).fetchall()
+    finally:
+        conn.close()
+
+    # 同一业务日内按检测器 (versions 的顺序) 排列
+    order = {detector: i for i, detector in enumerate(versions)}
+    records = [
+        (order[detector], json.loads(record))
+        for detector, record in rows
+        if detector in order
+    ]
+    records.sort(key=lambda item: (item[1]['date'], item[0]))
+    return [record for _, record in records]
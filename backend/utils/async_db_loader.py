@@ -0,0 +1,249 @@
+"""
+异步数据库加载层
+基于 SQLAlchemy AsyncEngine + aiomysql，等待 MySQL 返回期间不占用线程，
+大量并发请求只需要事件循环本身，而不是同等数量的线程。
+
+表规格、查询构造、规范化、镜像与查询缓存与同步加载器 (utils.db_loader) 共用。
+未安装 aiomysql 或设置 DB_ASYNC=0 时，自动回退到在线程中执行同步加载器。
+
+异步连接统一通过 async_connect 获取: 每个事件循环一个信号量，同时持有的连接数不超过
+连接池容量 (DB_POOL_SIZE + DB_MAX_OVERFLOW)，超出的查询在事件循环中排队，
+而不是在连接池中等待 DB_POOL_TIMEOUT 后失败。
+"""
+import os
+import ssl
+import asyncio
+import weakref
+import threading
+import logging
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any, List, Iterable, AsyncIterator
+import pandas as pd
+
+from utils.db_loader import (
+    TABLE_SPECS, TableSpec, load_table, use_arrow_backend,
+    _get_pool_config, _resolve_columns, _build_query, _normalize_frame, _empty_frame,
+    _mirror_split, _mirror_args, _read_kwargs, _cache_plan, _join_frames, _log_loaded
+)
+from utils.parquet_mirror import read_mirror
+from utils.interval_cache import query_cache
+
+logger = logging.getLogger(__name__)
+
+# 进程级异步引擎注册表: {database: AsyncEngine}
+_ASYNC_ENGINES: Dict[str, Any] = {}
+_ASYNC_ENGINES_LOCK = threading.Lock()
+_ASYNC_UNAVAILABLE = False
+
+# 每个事件循环一个连接信号量: {loop: Semaphore}
+_POOL_SEMAPHORES: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+def is_async_enabled() -> bool:
+    """是否启用异步数据库层 (DB_ASYNC，默认开启)"""
+    return os.getenv("DB_ASYNC", "1").lower() in ("1", "true", "yes")
+
+
+def _create_async_engine(database: str):
+    """创建 AsyncEngine (仅由注册表调用)，驱动不可用时返回 None"""
+    global _ASYNC_UNAVAILABLE
+    try:
+        import aiomysql  # noqa: F401
+        from sqlalchemy.ext.asyncio import create_async_engine
+    except ImportError as e:
+        _ASYNC_UNAVAILABLE = True
+        logger.warning(f"异步数据库驱动不可用，回退到线程池同步加载: {e}")
+        return None
+
+    host = os.getenv("DB_HOST")
+    port = os.getenv("DB_PORT", 3306)
+    user = os.getenv("DB_USER")
+    password = os.getenv("DB_PASSWORD") or os.getenv("DB_PASS")
+    ca_path = os.getenv("DB_SSL_CA")
+
+    if not all([host, user, password, database]):
+        logger.error(f"数据库配置缺失: host={host}, user={user}, password={'***' if password else None}, database={database}")
+        return None
+
+    connection_string = f"mysql+aiomysql://{user}:{password}@{host}:{port}/{database}?charset=utf8mb4"
+
+    connect_args = {}
+    if ca_path:
+        if os.path.exists(ca_path):
+            connect_args["ssl"] = ssl.create_default_context(cafile=ca_path)
+        else:
+            logger.warning(f"SSL CA 证书文件未找到: {ca_path}")
+
+    pool_config = _get_pool_config()
+    engine = create_async_engine(
+        connection_string,
+        connect_args=connect_args,
+        pool_pre_ping=True,
+        **pool_config
+    )
+    logger.info(f"已创建异步数据库引擎: {database} (pool_size={pool_config['pool_size']}, max_overflow={pool_config['max_overflow']})")
+    return engine
+
+
+def get_async_db_engine(database: Optional[str] = None):
+    """
+    返回进程级共享的 AsyncEngine (默认指向 TS_History 数据库)
+
+    未启用、驱动缺失或配置缺失时返回 None，调用方应回退到同步加载。
+    """
+    if _ASYNC_UNAVAILABLE or not is_async_enabled():
+        return None
+
+    database = database or os.getenv("DB_NAME_TS") or "TS_History"
+    engine = _ASYNC_ENGINES.get(database)
+    if engine is not None:
+        return engine
+
+    with _ASYNC_ENGINES_LOCK:
+        engine = _ASYNC_ENGINES.get(database)
+        if engine is None:
+            engine = _create_async_engine(database)
+            if engine is not None:
+                _ASYNC_ENGINES[database] = engine
+    return engine
+
+
+def _pool_semaphore() -> asyncio.Semaphore:
+    """当前事件循环的连接信号量，容量为连接池大小 + overflow"""
+    loop = asyncio.get_running_loop()
+    semaphore = _POOL_SEMAPHORES.get(loop)
+    if semaphore is None:
+        pool_config = _get_pool_config()
+        semaphore = asyncio.Semaphore(pool_config['pool_size'] + pool_config['max_overflow'])
+        _POOL_SEMAPHORES[loop] = semaphore
+    return semaphore
+
+
+@asynccontextmanager
+async def async_connect(engine) -> AsyncIterator[Any]:
+    """engine.connect() 的有界版本: 先取得连接信号量，再从连接池取出连接"""
+    async with _pool_semaphore():
+        async with engine.connect() as conn:
+            yield conn
+
+
+async def dispose_async_engines() -> None:
+    """关闭所有异步引擎的连接池 (应用关闭时调用)"""
+    engines = list(_ASYNC_ENGINES.items())
+    _ASYNC_ENGINES.clear()
+    for database, engine in engines:
+        await engine.dispose()
+        logger.info(f"已关闭异步数据库引擎: {database}")
+
+
+async def _load_range_async(
+    engine,
+    spec: TableSpec,
+    name: str,
+    start_dt: Optional[pd.Timestamp],
+    end_dt: Optional[pd.Timestamp],
+    source_cols: List[str],
+    derived: List[str],
+    filters: Optional[Dict[str, Any]]
+) -> pd.DataFrame:
+    """_load_range 的异步版本: 镜像文件在线程中读取，MySQL 尾部通过异步驱动查询"""
+    frames = []
+    watermark, tail_start, need_tail = _mirror_split(name, start_dt, end_dt)
+    if watermark is not None:
+        try:
+            utc_start, utc_end, source_filters = _mirror_args(spec, start_dt, end_dt, filters)
+            mirror_df = await asyncio.to_thread(
+                read_mirror, name, utc_start, utc_end, source_cols, source_filters, watermark, **_read_kwargs()
+            )
+            logger.info(f"从 {spec.label} 本地镜像读取了 {len(mirror_df)} 条记录 (水位线 {watermark})")
+            if not mirror_df.empty:
+                frames.append(mirror_df)
+        except Exception as e:
+            logger.error(f"读取 {spec.label} 本地镜像失败，回退到数据库: {e}")
+            frames, tail_start, need_tail = [], start_dt, True
+
+    if need_tail:
+        stmt, params, query = _build_query(spec, source_cols, tail_start, end_dt, filters)
+        logger.info(f"正在从 {spec.label} 数据库执行异步 SQL 查询: {query} 参数: {params}")
+        async with async_connect(engine) as conn:
+            result = await conn.execute(stmt, params)
+            df = pd.DataFrame(result.fetchall(), columns=list(result.keys()))
+        if not df.empty:
+            if use_arrow_backend():
+                df = df.convert_dtypes(dtype_backend='pyarrow')
+            frames.append(df)
+
+    if not frames:
+        return _empty_frame(spec, source_cols, derived)
+
+    df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+    return _normalize_frame(spec, df, derived)
+
+
+async def load_table_async(
+    name: str,
+    start_dt: Optional[pd.Timestamp] = None,
+    end_dt: Optional[pd.Timestamp] = None,
+    columns: Optional[Iterable[str]] = None,
+    filters: Optional[Dict[str, Any]] = None
+) -> pd.DataFrame:
+    """
+    load_table 的异步版本，参数与返回值相同
+
+    异步引擎不可用时在线程中执行同步的 load_table。
+    """
+    engine = get_async_db_engine()
+    if engine is None:
+        return await asyncio.to_thread(load_table, name, start_dt, end_dt, columns, filters)
+
+    spec = TABLE_SPECS[name]
+    source_cols, derived = _resolve_columns(spec, columns)
+
+    async def fetch(a: Optional[pd.Timestamp], b: Optional[pd.Timestamp]) -> pd.DataFrame:
+        return await _load_range_async(engine, spec, name, a, b, source_cols, derived, filters)
+
+    try:
+        key, cached, live = _cache_plan(name, start_dt, end_dt, columns, filters)
+        tasks = []
+        if cached is not None:
+            tasks.append(query_cache.aget_or_fetch(key, *cached, fetch))
+        if live is not None:
+            tasks.append(fetch(*live))
+        df = _join_frames(list(await asyncio.gather(*tasks)))
+    except Exception as e:
+        logger.error(f"从 {spec.label} 数据库异步加载数据失败: {e}")
+        return _empty_frame(spec, source_cols, derived)
+
+    return _log_loaded(spec, df, start_dt, end_dt)
+
+
+# ============================================
+# 各表异步加载入口
+# ============================================
+
+async def load_ts_log_async(start_dt: Optional[pd.Timestamp] = None, end_dt: Optional[pd.Timestamp] = None, columns: Optional[Iterable[str]] = None, filters: Optional[Dict[str, Any]] = None):
+    return await load_table_async('ts_log', start_dt, end_dt, columns, filters)
+
+
+async def load_pos_log_async(start_dt: Optional[pd.Timestamp] = None, end_dt: Optional[pd.Timestamp] = None, columns: Optional[Iterable[str]] = None, filters: Optional[Dict[str, Any]] = None):
+    return await load_table_async('pos_log', start_dt, end_dt, columns, filters)
+
+
+async def load_shitcode_log_async(start_dt: Optional[pd.Timestamp] = None, end_dt: Optional[pd.Timestamp] = None, columns: Optional[Iterable[str]] = None, filters: Optional[Dict[str, Any]] = None):
+    return await load_table_async('shitcode_log', start_dt, end_dt, columns, filters)
+
+
+async def load_staking_amount_async(start_dt: Optional[pd.Timestamp] = None, end_dt: Optional[pd.Timestamp] = None, columns: Optional[Iterable[str]] = None, filters: Optional[Dict[str, Any]] = None):
+    return await load_table_async('staking_amount', start_dt, end_dt, columns, filters)
+
+
+async def load_staking_reward_async(start_dt: Optional[pd.Timestamp] = None, end_dt: Optional[pd.Timestamp] = None, columns: Optional[Iterable[str]] = None, filters: Optional[Dict[str, Any]] = None):
+    return await load_table_async('staking_reward', start_dt, end_dt, columns, filters)
+
+
+async def load_defi_async(start_dt: Optional[pd.Timestamp] = None, end_dt: Optional[pd.Timestamp] = None, columns: Optional[Iterable[str]] = None, filters: Optional[Dict[str, Any]] = None):
+    return await load_table_async('defi', start_dt, end_dt, columns, filters)
+
+
+async def load_price_history_async(start_dt: Optional[pd.Timestamp] = None, end_dt: Optional[pd.Timestamp] = None, columns: Optional[Iterable[str]] = None, filters: Optional[Dict[str, Any]] = None):
+    return await load_table_async('price_history', start_dt, end_dt, columns, filters)
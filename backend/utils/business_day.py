@@ -0,0 +1,66 @@
+"""
+业务日分桶
+各模块的业务日以 UTC+8 的某个整点为界，边界之前的记录归入前一天:
+TS 08:00，POS / Staking 12:00，ShitCode / DeFi 00:00 (自然日)。
+
+对纳秒时间值整体减去边界小时后截断到天 (datetime64[D])，一次向量化运算完成分桶，
+聚合在日期键上进行，只在输出时把聚合后的 (去重) 日期格式化为 'YYYY-MM-DD' 字符串。
+"""
+from typing import List, Union
+import numpy as np
+import pandas as pd
+
+TIMESTAMP_COL = 'Timestamp(UTC+8)'
+
+BOUNDARY_TS = 8
+BOUNDARY_POS = 12
+BOUNDARY_STAKING = 12
+BOUNDARY_NATURAL = 0
+
+
+def business_days(ts: pd.Series, boundary_hour: int = BOUNDARY_NATURAL) -> np.ndarray:
+    """
+    UTC+8 时间列 -> 业务日数组 (datetime64[D])
+
+    Args:
+        ts: UTC+8 时间列
+        boundary_hour: 业务日起始整点 (0-23)
+
+    Returns:
+        与 ts 等长的 datetime64[D] 数组，NaT 保持为 NaT
+    """
+    values = ts.to_numpy(dtype='datetime64[ns]')
+    if boundary_hour:
+        values = values - np.timedelta64(boundary_hour, 'h')
+    return values.astype('datetime64[D]')
+
+
+def business_day_key(ts: pd.Series, boundary_hour: int = BOUNDARY_NATURAL) -> pd.Series:
+    """返回可直接用于 groupby 的业务日键 (名为 date，索引与 ts 对齐)"""
+    return pd.Series(business_days(ts, boundary_hour), index=ts.index, name='date')
+
+
+def format_days(days) -> np.ndarray:
+    """业务日 -> 'YYYY-MM-DD' 字符串数组"""
+    return np.datetime_as_string(np.asarray(days, dtype='datetime64[D]'), unit='D').astype(object)
+
+
+def format_day_index(obj: Union[pd.DataFrame, pd.Series]) -> Union[pd.DataFrame, pd.Series]:
+    """把以业务日为索引的聚合结果转换为字符串日期索引 (名为 date)"""
+    obj.index = pd.Index(format_days(obj.index), name='date')
+    return obj
+
+
+def daily_sum(
+    df: pd.DataFrame,
+    columns: Union[str, List[str]],
+    boundary_hour: int = BOUNDARY_NATURAL,
+    timestamp_col: str = TIMESTAMP_COL
+) -> Union[pd.DataFrame, pd.Series]:
+    """
+    按业务日 (基于 timestamp_col) 对 columns 求和
+
+    Returns:
+        索引为 'YYYY-MM-DD' 字符串 (已排序) 的聚合结果；columns 为字符串时返回 Series
+    """
+    return format_day_index(df.groupby(business_day_key(df[timestamp_col], boundary_hour))[columns].sum())
@@ -0,0 +1,63 @@
+"""
+并发加载多张表
+同一请求内互不依赖的查询 (如 calculate_*_sql 的各项聚合) 在进程级共享的有界线程池中并行执行，
+延迟从各查询耗时之和降为最慢一个查询的耗时；并发请求共用同一个池，数据库并发查询数不随请求数增长。
+
+线程数由 DB_FETCH_WORKERS 控制 (默认 8)，应不大于连接池大小 + overflow。
+异步加载 (fetch_all_async) 的并发上限在取连接处: 每条查询经 async_db_loader.async_connect
+取得与连接池容量相同的信号量后才占用连接，gather 的任务数不受限制也不会超出连接池。
+"""
+import os
+import time
+import asyncio
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Awaitable
+
+logger = logging.getLogger(__name__)
+
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def get_fetch_executor() -> ThreadPoolExecutor:
+    """获取进程级共享线程池 (首次调用时创建)"""
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        with _EXECUTOR_LOCK:
+            if _EXECUTOR is None:
+                _EXECUTOR = ThreadPoolExecutor(
+                    max_workers=int(os.getenv("DB_FETCH_WORKERS", 8)),
+                    thread_name_prefix="db-fetch"
+                )
+    return _EXECUTOR
+
+
+async def fetch_all_async(tasks: Dict[str, Awaitable[Any]]) -> Dict[str, Any]:
+    """
+    在事件循环中并发等待多个加载协程
+
+    Args:
+        tasks: {名称: 加载协程}，如 {'ts': load_ts_log_async(...)}
+
+    Returns:
+        {名称: 加载结果}，任一任务失败时抛出第一个异常
+
+    各加载协程内部经 async_connect 按连接池容量限流，这里不再嵌套信号量
+    (一个加载任务可能同时占用两条连接，在任务层限流既不准确也可能互相等待)。
+    """
+    t0 = time.time()
+    results = await asyncio.gather(*tasks.values())
+    if len(tasks) > 1:
+        logger.info(f"[Perf] 并发加载 {', '.join(tasks)} 耗时: {time.time() - t0:.2f}s")
+    return dict(zip(tasks.keys(), results))
+
+
+def shutdown_fetch_executor() -> None:
+    """关闭共享线程池 (应用关闭时调用)"""
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is not None:
+            _EXECUTOR.shutdown(wait=False, cancel_futures=True)
+            _EXECUTOR = None
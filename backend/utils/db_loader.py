@@ -1,18 +1,97 @@
 import os
+import time
+import threading
+import numpy as np
 import pandas as pd
 import logging
-from typing import Optional
-from sqlalchemy import create_engine, text
+from typing import Optional, Dict, Any, List, Iterable, Iterator
+from pandas.api.types import union_categoricals
+from sqlalchemy import create_engine, text, bindparam, exc
+from sqlalchemy.pool import QueuePool
+from utils.parquet_mirror import is_mirror_enabled, get_watermark, iter_mirror, read_mirror
+from utils.interval_cache import query_cache, get_stable_end
 
 logger = logging.getLogger(__name__)
 
-def get_db_engine():
-    """创建并返回 SQLAlchemy 数据库引擎 (指向 TS_History 数据库)"""
+# 进程级引擎注册表: {database: Engine}
+# 每个数据库只创建一次引擎，连接池在所有请求间复用，避免每次请求重新建立 TLS 连接
+_ENGINES: Dict[str, Any] = {}
+_ENGINES_LOCK = threading.Lock()
+
+
+class PoolStats:
+    """连接池统计 (checkout 次数、等待耗时、超时次数)"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait: float, timed_out: bool = False) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            attempts = self.checkouts + self.timeouts
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'totalWaitMs': round(self.total_wait * 1000, 2),
+                'avgWaitMs': round(self.total_wait / attempts * 1000, 2) if attempts else 0.0,
+                'maxWaitMs': round(self.max_wait * 1000, 2),
+            }
+
+
+class _InstrumentedQueuePool(QueuePool):
+    """记录 checkout 等待时间的 QueuePool (包含溢出连接的建连耗时)"""
+
+    _stats: Optional[PoolStats] = None
+
+    def connect(self):
+        t0 = time.perf_counter()
+        try:
+            conn = super().connect()
+        except exc.TimeoutError:
+            if self._stats is not None:
+                self._stats.record(time.perf_counter() - t0, timed_out=True)
+            raise
+        if self._stats is not None:
+            self._stats.record(time.perf_counter() - t0)
+        return conn
+
+    def recreate(self):
+        # dispose() 后会重建连接池，保留统计对象
+        new_pool = super().recreate()
+        new_pool._stats = self._stats
+        return new_pool
+
+
+def _get_pool_config(**overrides) -> Dict[str, int]:
+    """读取连接池配置 (环境变量，可被参数覆盖)"""
+    config = {
+        'pool_size': int(os.getenv("DB_POOL_SIZE", 10)),
+        'max_overflow': int(os.getenv("DB_MAX_OVERFLOW", 20)),
+        'pool_timeout': int(os.getenv("DB_POOL_TIMEOUT", 30)),
+        'pool_recycle': int(os.getenv("DB_POOL_RECYCLE", 3600)),
+    }
+    config.update({k: v for k, v in overrides.items() if v is not None})
+    return config
+
+
+def _create_db_engine(database: str, **pool_overrides):
+    """创建 SQLAlchemy 引擎 (仅由注册表调用)"""
     host = os.getenv("DB_HOST")
     port = os.getenv("DB_PORT", 3306)
     user = os.getenv("DB_USER")
     password = os.getenv("DB_PASSWORD") or os.getenv("DB_PASS")
-    database = os.getenv("DB_NAME_TS") or "TS_History"
     ca_path = os.getenv("DB_SSL_CA")
     
     if not all([host, user, password, database]):
@@ -31,426 +110,661 @@ def get_db_engine():
             }
         else:
             logger.warning(f"SSL CA 证书文件未找到: {ca_path}")
-            
-    return create_engine(
+
+    pool_config = _get_pool_config(**pool_overrides)
+    engine = create_engine(
         connection_string, 
         connect_args=connect_args,
-        pool_size=10,
-        max_overflow=20,
-        pool_recycle=3600,
-        pool_pre_ping=True
+        poolclass=_InstrumentedQueuePool,
+        pool_pre_ping=True,
+        **pool_config
     )
+    engine.pool._stats = PoolStats()
+    logger.info(f"已创建数据库引擎: {database} (pool_size={pool_config['pool_size']}, max_overflow={pool_config['max_overflow']})")
+    return engine
 
-def load_ts_log_from_db(start_dt: Optional[pd.Timestamp] = None, end_dt: Optional[pd.Timestamp] = None):
+
+def get_db_engine(database: Optional[str] = None, pool_size: Optional[int] = None, max_overflow: Optional[int] = None):
     """
-    直接从数据库的 take_a_SHIT 表加载 TS_Log 数据。
+    返回进程级共享的 SQLAlchemy 数据库引擎 (默认指向 TS_History 数据库)
+    
+    引擎在首次调用时懒加载创建，之后按数据库名复用。
+    pool_size / max_overflow 仅在首次创建时生效，默认读取 DB_POOL_SIZE / DB_MAX_OVERFLOW。
     """
-    engine = get_db_engine()
-    if engine is None:
-        return pd.DataFrame()
-        
-    query = "SELECT block_time_dt, to_user, amount, SolSentToTreasury FROM take_a_SHIT"
-    params = {}
+    database = database or os.getenv("DB_NAME_TS") or "TS_History"
+    engine = _ENGINES.get(database)
+    if engine is not None:
+        return engine
     
-    if start_dt is not None and end_dt is not None:
-        # 将 UTC+8 时间转换为 UTC+0 字符串进行过滤 (数据库中 block_time_dt 通常存的是 UTC)
-        utc_start = start_dt - pd.Timedelta(hours=8)
-        utc_end = end_dt - pd.Timedelta(hours=8)
-        
-        query += " WHERE block_time_dt >= :start AND block_time_dt < :end"
-        params = {
-            "start": utc_start.strftime('%Y-%m-%d %H:%M:%S'),
-            "end": utc_end.strftime('%Y-%m-%d %H:%M:%S')
+    with _ENGINES_LOCK:
+        engine = _ENGINES.get(database)
+        if engine is None:
+            engine = _create_db_engine(database, pool_size=pool_size, max_overflow=max_overflow)
+            if engine is not None:
+                _ENGINES[database] = engine
+    return engine
+
+
+def get_pool_stats() -> Dict[str, Dict[str, Any]]:
+    """获取所有已创建引擎的连接池状态及统计"""
+    result = {}
+    for database, engine in list(_ENGINES.items()):
+        pool = engine.pool
+        stats = pool._stats.snapshot() if getattr(pool, '_stats', None) else {}
+        result[database] = {
+            'poolSize': pool.size(),
+            'checkedOut': pool.checkedout(),
+            'checkedIn': pool.checkedin(),
+            'overflow': pool.overflow(),
+            **stats
         }
+    return result
+
+
+def dispose_engines() -> None:
+    """关闭所有引擎的连接池 (应用关闭时调用)"""
+    with _ENGINES_LOCK:
+        for database, engine in _ENGINES.items():
+            engine.dispose()
+            logger.info(f"已关闭数据库引擎: {database}")
+        _ENGINES.clear()
+
+# ============================================
+# 声明式表规格 (Table Spec)
+# ============================================
+
+TIMESTAMP_COL = 'Timestamp(UTC+8)'
+
+
+class TableSpec:
+    """
+    单张源表的加载规格
     
-    try:
-        logger.info(f"正在执行 TS SQL 查询: {query} 参数: {params}")
-        with engine.connect() as conn:
-            df = pd.read_sql(text(query), conn, params=params)
-        
-        if df.empty:
-            logger.warning(f"数据库返回数据为空 (范围: {start_dt} 到 {end_dt})")
-            return pd.DataFrame()
-            
-        # 1. 时区转换: block_time_dt (UTC) -> Timestamp(UTC+8)
-        # 数据库中 block_time_dt 如果是 DATETIME 类型且存的是 UTC
-        df['block_time_dt'] = pd.to_datetime(df['block_time_dt'])
-        
-        # 处理时区感知的 datetime
-        if df['block_time_dt'].dt.tz is None:
-            df['block_time_dt'] = df['block_time_dt'].dt.tz_localize('UTC')
-        else:
-            df['block_time_dt'] = df['block_time_dt'].dt.tz_convert('UTC')
-            
-        df['Timestamp(UTC+8)'] = df['block_time_dt'].dt.tz_convert('Asia/Shanghai').dt.tz_localize(None)
-        
-        # 2. 字段映射
-        df = df.rename(columns={
-            'to_user': 'Receiver Address',
-            'amount': 'SHIT Sent',
-            'SolSentToTreasury': 'SOL_Received'
-        })
-        
-        # 3. 类型转换
-        df['SHIT Sent'] = df['SHIT Sent'].astype(float)
-        df['SOL_Received'] = df['SOL_Received'].astype(float)
-        
-        # 4. 根据金额重新计算 TS_Category
-        # 规则与之前保持一致：500/1500 -> 0, 50/150 -> 1, 25/75 -> 2, 其他 -> 3
-        df['TS_Category'] = 3  # 默认为 3 (Lucky Draw)
-        df.loc[df['SHIT Sent'].isin([500.0, 1500.0]), 'TS_Category'] = 0
-        df.loc[df['SHIT Sent'].isin([50.0, 150.0]), 'TS_Category'] = 1
-        df.loc[df['SHIT Sent'].isin([25.0, 75.0]), 'TS_Category'] = 2
-        
-        logger.info(f"从 RDS 成功加载了 {len(df)} 条 TS_Log 数据")
-        return df
-        
-    except Exception as e:
-        logger.error(f"从 RDS 加载数据失败: {e}")
-        return pd.DataFrame()
+    Args:
+        table: 数据库表名
+        time_col: 过滤用的时间列 (UTC)
+        columns: 源列名 -> 输出列名 的映射
+        dtypes: 输出列名 -> 目标类型
+        label: 日志中使用的名称
+        local_time_col: 若表中已存在 UTC+8 时间列，直接使用而不做时区转换
+        derived: 派生列 {输出列名: (依赖的输出列列表, 计算函数)}
+    """
+
+    def __init__(
+        self,
+        table: str,
+        time_col: str,
+        columns: Dict[str, str],
+        dtypes: Optional[Dict[str, Any]] = None,
+        label: Optional[str] = None,
+        local_time_col: Optional[str] = None,
+        derived: Optional[Dict[str, tuple]] = None
+    ) -> None:
+        self.table = table
+        self.time_col = time_col
+        self.columns = columns
+        self.dtypes = dtypes or {}
+        self.label = label or table
+        self.local_time_col = local_time_col
+        self.derived = derived or {}
+        # 输出列名 -> 源列名
+        self.source_of = {dst: src for src, dst in columns.items()}
+
+    @property
+    def output_columns(self) -> List[str]:
+        return list(self.columns.values()) + list(self.derived.keys())
+
+
+# Asia/Shanghai 无夏令时，固定 UTC+8
+_UTC8_OFFSET_NS = np.int64(8 * 3600 * 10**9)
+
+
+def to_utc8(ts: pd.Series) -> pd.Series:
+    """
+    UTC 时间列 -> UTC+8 (无时区) 时间列
     
-def load_pos_log_from_db(start_dt: Optional[pd.Timestamp] = None, end_dt: Optional[pd.Timestamp] = None):
+    直接对 int64 纳秒值加固定偏移，避免 tz_localize / tz_convert 的逐元素时区计算。
+    NaT 保持不变。
     """
-    直接从数据库的 shit_pos_rewards 表加载 POS_Log 数据。
+    if not pd.api.types.is_datetime64_any_dtype(ts):
+        ts = pd.to_datetime(ts)
+    if ts.dt.tz is not None:
+        ts = ts.dt.tz_convert('UTC').dt.tz_localize(None)
+    
+    values = ts.to_numpy(dtype='datetime64[ns]')
+    shifted = values.view('i8') + _UTC8_OFFSET_NS
+    nat = np.isnat(values)
+    if nat.any():
+        shifted[nat] = np.iinfo(np.int64).min
+    return pd.Series(shifted.view('datetime64[ns]'), index=ts.index, name=TIMESTAMP_COL)
+
+
+def _derive_ts_category(df: pd.DataFrame) -> pd.Series:
+    """根据金额重新计算 TS_Category: 500/1500 -> 0, 50/150 -> 1, 25/75 -> 2, 其他 -> 3 (Lucky Draw)"""
+    category = pd.Series(3, index=df.index)
+    category[df['SHIT Sent'].isin([500.0, 1500.0])] = 0
+    category[df['SHIT Sent'].isin([50.0, 150.0])] = 1
+    category[df['SHIT Sent'].isin([25.0, 75.0])] = 2
+    return category
+
+
+def use_arrow_backend() -> bool:
+    """是否以 PyArrow 作为列存储 (DB_ARROW_BACKEND=1)，默认使用 NumPy"""
+    return os.getenv("DB_ARROW_BACKEND", "0").lower() in ("1", "true", "yes")
+
+
+def _read_kwargs() -> Dict[str, Any]:
+    """pd.read_sql / pd.read_parquet 的后端参数"""
+    return {'dtype_backend': 'pyarrow'} if use_arrow_backend() else {}
+
+
+# Arrow 模式下数值列直接使用 Arrow 类型，避免先构造 NumPy 列再转换
+_ARROW_DTYPES = {float: 'double[pyarrow]', int: 'int64[pyarrow]'}
+
+
+def _target_dtype(dtype: Any) -> Any:
+    return _ARROW_DTYPES.get(dtype, dtype) if use_arrow_backend() else dtype
+
+
+# 地址列 (44 位 base58 字符串) 以分类类型加载: 每行只存整数编码，groupby 按编码分组
+ADDRESS_DTYPE = 'category'
+
+TABLE_SPECS: Dict[str, TableSpec] = {
+    'ts_log': TableSpec(
+        table='take_a_SHIT',
+        time_col='block_time_dt',
+        columns={'to_user': 'Receiver Address', 'amount': 'SHIT Sent', 'SolSentToTreasury': 'SOL_Received'},
+        dtypes={'Receiver Address': ADDRESS_DTYPE, 'SHIT Sent': float, 'SOL_Received': float, 'TS_Category': int},
+        label='TS',
+        derived={'TS_Category': (['SHIT Sent'], _derive_ts_category)}
+    ),
+    'pos_log': TableSpec(
+        table='shit_pos_rewards',
+        time_col='block_time_dt',
+        columns={'to_user': 'Receiver Address', 'amount': 'SHIT Sent', 'SolSentToTreasury': 'SOL Received'},
+        dtypes={'Receiver Address': ADDRESS_DTYPE, 'SHIT Sent': float, 'SOL Received': float},
+        label='POS'
+    ),
+    'shitcode_log': TableSpec(
+        table='SHIT_code',
+        time_col='block_time_dt',
+        columns={'to_user': 'Receiver Address', 'amount': 'SHIT Sent', 'SolSentToTreasury': 'SOL Received'},
+        dtypes={'Receiver Address': ADDRESS_DTYPE, 'SHIT Sent': float, 'SOL Received': float},
+        label='ShitCode'
+    ),
+    'staking_amount': TableSpec(
+        table='shit_staking_events',
+        time_col='block_time_dt',
+        columns={'user_address': 'Address', 'amount': 'SHIT Amount', 'event_type': 'Type'},
+        dtypes={'Address': ADDRESS_DTYPE, 'SHIT Amount': float},
+        label='Staking event'
+    ),
+    'staking_reward': TableSpec(
+        table='shit_staking_rewards',
+        time_col='block_time_dt',
+        columns={'to_user': 'Receiver Address', 'amount': 'SHIT Sent', 'SolSentToTreasury': 'SOL Received'},
+        dtypes={'Receiver Address': ADDRESS_DTYPE, 'SHIT Sent': float, 'SOL Received': float},
+        label='Staking Reward'
+    ),
+    'defi': TableSpec(
+        table='liq_pool_activity',
+        time_col='timestamp_utc',
+        columns={'from_address': 'FromAddress', 'activity': 'Activity', 'shit_change': 'SHIT Change', 'usdt_change': 'USDT Change'},
+        dtypes={'FromAddress': ADDRESS_DTYPE, 'SHIT Change': float, 'USDT Change': float},
+        label='DeFi'
+    ),
+    'price_history': TableSpec(
+        table='shit_price_history',
+        time_col='timestamp_utc',
+        columns={'price': 'Price'},
+        dtypes={'Price': float},
+        label='价格',
+        local_time_col='timestamp_utc8'
+    ),
+}
+
+
+def _resolve_columns(spec: TableSpec, columns: Optional[Iterable[str]]) -> tuple:
     """
-    engine = get_db_engine()
-    if engine is None:
-        return pd.DataFrame()
-        
-    query = "SELECT block_time_dt, to_user, amount, SolSentToTreasury FROM shit_pos_rewards"
-    params = {}
+    解析调用方请求的输出列
     
-    if start_dt is not None and end_dt is not None:
-        # 将 UTC+8 时间转换为 UTC+0 字符串进行过滤
-        utc_start = start_dt - pd.Timedelta(hours=8)
-        utc_end = end_dt - pd.Timedelta(hours=8)
-        
-        query += " WHERE block_time_dt >= :start AND block_time_dt < :end"
-        params = {
-            "start": utc_start.strftime('%Y-%m-%d %H:%M:%S'),
-            "end": utc_end.strftime('%Y-%m-%d %H:%M:%S')
-        }
+    Returns:
+        (需要查询的源列列表, 需要计算的派生列列表)
+    """
+    requested = spec.output_columns if columns is None else [c for c in columns if c != TIMESTAMP_COL]
+    unknown = [c for c in requested if c not in spec.source_of and c not in spec.derived]
+    if unknown:
+        raise ValueError(f"{spec.table} 不存在列: {unknown}")
     
-    try:
-        logger.info(f"正在从 POS 数据库执行 SQL 查询: {query} 参数: {params}")
-        with engine.connect() as conn:
-            df = pd.read_sql(text(query), conn, params=params)
-        
-        if df.empty:
-            logger.warning(f"POS 数据库返回数据为空 (范围: {start_dt} 到 {end_dt})")
-            return pd.DataFrame()
-            
-        # 1. 时区转换: block_time_dt (UTC) -> Timestamp(UTC+8)
-        df['block_time_dt'] = pd.to_datetime(df['block_time_dt'])
-        if df['block_time_dt'].dt.tz is None:
-            df['block_time_dt'] = df['block_time_dt'].dt.tz_localize('UTC')
+    derived = [c for c in requested if c in spec.derived]
+    needed = [c for c in requested if c in spec.source_of]
+    for name in derived:
+        needed += [dep for dep in spec.derived[name][0] if dep not in needed]
+    
+    # 时间列只查询一列：已有 UTC+8 列时直接使用，否则查询 UTC 列后做固定偏移
+    source_cols = [spec.local_time_col or spec.time_col]
+    source_cols += [spec.source_of[c] for c in needed]
+    return source_cols, derived
+
+
+def _build_where(spec: TableSpec, filters: Optional[Dict[str, Any]], params: Dict[str, Any]) -> tuple:
+    """
+    将过滤条件 {输出列名: 值 或 值列表} 编译为 SQL 谓词
+    
+    Returns:
+        (谓词列表, 需要 expanding 的参数名列表)
+    """
+    clauses = []
+    expanding = []
+    for i, (col, value) in enumerate((filters or {}).items()):
+        if col not in spec.source_of:
+            raise ValueError(f"{spec.table} 不支持过滤列: {col}")
+        name = f"f{i}"
+        if isinstance(value, (list, tuple, set, frozenset)):
+            clauses.append(f"{spec.source_of[col]} IN :{name}")
+            params[name] = list(value)
+            expanding.append(name)
         else:
-            df['block_time_dt'] = df['block_time_dt'].dt.tz_convert('UTC')
-            
-        df['Timestamp(UTC+8)'] = df['block_time_dt'].dt.tz_convert('Asia/Shanghai').dt.tz_localize(None)
-        
-        # 2. 字段映射，适配现有 POS 计算逻辑
-        df = df.rename(columns={
-            'to_user': 'Receiver Address',
-            'amount': 'SHIT Sent',
-            'SolSentToTreasury': 'SOL Received'
-        })
-        
-        # 3. 类型转换
-        df['SHIT Sent'] = df['SHIT Sent'].astype(float)
-        df['SOL Received'] = df['SOL Received'].astype(float)
-        
-        logger.info(f"从 POS 数据库成功加载了 {len(df)} 条记录")
-        return df
-        
-    except Exception as e:
-        logger.error(f"从 POS 数据库加载数据失败: {e}")
-        return pd.DataFrame()
+            clauses.append(f"{spec.source_of[col]} = :{name}")
+            params[name] = value
+    return clauses, expanding
 
-def load_shitcode_log_from_db(start_dt: Optional[pd.Timestamp] = None, end_dt: Optional[pd.Timestamp] = None):
+
+def concat_frames(frames: List[pd.DataFrame]) -> pd.DataFrame:
     """
-    直接从数据库的 shit_code 表加载 ShitCode_Log 数据。
+    纵向合并多个 DataFrame，分类列 (地址) 先统一类别再合并
+    
+    各分块的类别集合不同，直接 pd.concat 会退化为 object 列，这里用并集类别重新编码后保持 category 类型。
     """
-    engine = get_db_engine()
-    if engine is None:
-        return pd.DataFrame()
-        
-    query = "SELECT block_time_dt, to_user, amount, SolSentToTreasury FROM SHIT_code"
-    params = {}
+    if len(frames) == 1:
+        return frames[0]
     
-    if start_dt is not None and end_dt is not None:
-        # 将 UTC+8 时间转换为 UTC+0 字符串进行过滤
-        utc_start = start_dt - pd.Timedelta(hours=8)
-        utc_end = end_dt - pd.Timedelta(hours=8)
-        
-        query += " WHERE block_time_dt >= :start AND block_time_dt < :end"
-        params = {
-            "start": utc_start.strftime('%Y-%m-%d %H:%M:%S'),
-            "end": utc_end.strftime('%Y-%m-%d %H:%M:%S')
-        }
+    categorical = [col for col, dtype in frames[0].dtypes.items() if isinstance(dtype, pd.CategoricalDtype)]
+    if categorical:
+        frames = [frame.copy(deep=False) for frame in frames]
+        for col in categorical:
+            parts = [frame[col] for frame in frames if isinstance(frame[col].dtype, pd.CategoricalDtype)]
+            dtype = pd.CategoricalDtype(union_categoricals(parts, sort_categories=True).categories)
+            for frame in frames:
+                frame[col] = frame[col].astype(dtype)
+    return pd.concat(frames, ignore_index=True)
+
+
+def _empty_frame(spec: TableSpec, source_cols: List[str], derived: List[str]) -> pd.DataFrame:
+    """构造带有正确列名的空 DataFrame"""
+    frame = {TIMESTAMP_COL: pd.Series(dtype='datetime64[ns]')}
+    for col in [spec.columns[c] for c in source_cols if c in spec.columns] + derived:
+        frame[col] = pd.Series(dtype=_target_dtype(spec.dtypes.get(col, object)))
+    return pd.DataFrame(frame)
+
+
+def _build_query(
+    spec: TableSpec,
+    source_cols: List[str],
+    start_dt: Optional[pd.Timestamp],
+    end_dt: Optional[pd.Timestamp],
+    filters: Optional[Dict[str, Any]]
+) -> tuple:
+    """
+    构造 SELECT 语句
     
-    try:
-        logger.info(f"正在从 ShitCode 数据库执行 SQL 查询: {query} 参数: {params}")
-        with engine.connect() as conn:
-            df = pd.read_sql(text(query), conn, params=params)
-        
-        if df.empty:
-            logger.warning(f"ShitCode 数据库返回数据为空 (范围: {start_dt} 到 {end_dt})")
-            return pd.DataFrame()
-            
-        # 1. 时区转换: block_time_dt (UTC) -> Timestamp(UTC+8)
-        df['block_time_dt'] = pd.to_datetime(df['block_time_dt'])
-        if df['block_time_dt'].dt.tz is None:
-            df['block_time_dt'] = df['block_time_dt'].dt.tz_localize('UTC')
-        else:
-            df['block_time_dt'] = df['block_time_dt'].dt.tz_convert('UTC')
-            
-        df['Timestamp(UTC+8)'] = df['block_time_dt'].dt.tz_convert('Asia/Shanghai').dt.tz_localize(None)
-        
-        # 2. 字段映射
-        df = df.rename(columns={
-            'to_user': 'Receiver Address',
-            'amount': 'SHIT Sent',
-            'SolSentToTreasury': 'SOL Received'
-        })
-        
-        # 3. 类型转换
-        df['SHIT Sent'] = df['SHIT Sent'].astype(float)
-        df['SOL Received'] = df['SOL Received'].astype(float)
-        
-        logger.info(f"从 ShitCode 数据库成功加载了 {len(df)} 条记录")
-        return df
-        
-    except Exception as e:
-        logger.error(f"从 ShitCode 数据库加载数据失败: {e}")
-        return pd.DataFrame()
+    Returns:
+        (TextClause, 参数字典, 原始 SQL 字符串)
+    """
+    query = f"SELECT {', '.join(source_cols)} FROM {spec.table}"
+    params: Dict[str, Any] = {}
+    clauses = []
+    
+    # 将 UTC+8 时间转换为 UTC+0 字符串进行过滤 (数据库中存的是 UTC)
+    if start_dt is not None:
+        clauses.append(f"{spec.time_col} >= :start")
+        params["start"] = (start_dt - pd.Timedelta(hours=8)).strftime('%Y-%m-%d %H:%M:%S')
+    if end_dt is not None:
+        clauses.append(f"{spec.time_col} < :end")
+        params["end"] = (end_dt - pd.Timedelta(hours=8)).strftime('%Y-%m-%d %H:%M:%S')
+    
+    filter_clauses, expanding = _build_where(spec, filters, params)
+    clauses += filter_clauses
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
     
-def load_staking_amount_from_db(start_dt: Optional[pd.Timestamp] = None, end_dt: Optional[pd.Timestamp] = None):
+    # 按时间列排序 (走时间索引)，加载结果与流式分块均按时间升序
+    query += f" ORDER BY {spec.time_col}"
+    
+    stmt = text(query)
+    if expanding:
+        stmt = stmt.bindparams(*[bindparam(p, expanding=True) for p in expanding])
+    return stmt, params, query
+
+
+def _mirror_split(
+    name: str,
+    start_dt: Optional[pd.Timestamp],
+    end_dt: Optional[pd.Timestamp]
+) -> tuple:
     """
-    直接从数据库加载 Staking_Amount_Log 数据 (来自事件表)。
+    按本地镜像水位线拆分查询范围
+    
+    Returns:
+        (水位线 或 None, MySQL 实时尾部的起始时间 (UTC+8), 是否还需要查询 MySQL)
+        水位线为 None 表示整个范围都走 MySQL
     """
-    engine = get_db_engine()
-    if engine is None:
-        return pd.DataFrame()
-        
-    table_name = "shit_staking_events"
-    query = f"SELECT block_time_dt, user_address, amount, event_type FROM {table_name}"
-    params = {}
-    
-    if start_dt is not None and end_dt is not None:
-        # 将 UTC+8 时间转换为 UTC+0 字符串进行过滤
-        utc_start = start_dt - pd.Timedelta(hours=8)
-        utc_end = end_dt - pd.Timedelta(hours=8)
-        
-        query += " WHERE block_time_dt >= :start AND block_time_dt < :end"
-        params = {
-            "start": utc_start.strftime('%Y-%m-%d %H:%M:%S'),
-            "end": utc_end.strftime('%Y-%m-%d %H:%M:%S')
-        }
+    if not is_mirror_enabled():
+        return None, start_dt, True
     
-    try:
-        logger.info(f"正在从 Staking event 数据库执行 SQL 查询: {query} 参数: {params}")
-        with engine.connect() as conn:
-            df = pd.read_sql(text(query), conn, params=params)
-        
-        if df.empty:
-            logger.warning(f"Staking event 数据库返回数据为空 (范围: {start_dt} 到 {end_dt})")
-            return pd.DataFrame()
-            
-        # 1. 时区转换: block_time_dt (UTC) -> Timestamp(UTC+8)
-        df['block_time_dt'] = pd.to_datetime(df['block_time_dt'])
-        if df['block_time_dt'].dt.tz is None:
-            df['block_time_dt'] = df['block_time_dt'].dt.tz_localize('UTC')
-        else:
-            df['block_time_dt'] = df['block_time_dt'].dt.tz_convert('UTC')
-            
-        df['Timestamp(UTC+8)'] = df['block_time_dt'].dt.tz_convert('Asia/Shanghai').dt.tz_localize(None)
-        
-        # 2. 字段映射
-        # Staking 计算逻辑期望的字段: Type (STAKE/UNSTAKE), SHIT Amount, Address
-        df = df.rename(columns={
-            'user_address': 'Address',
-            'amount': 'SHIT Amount',
-            'event_type': 'Type'
-        })
-        
-        # 3. 类型转换
-        df['SHIT Amount'] = df['SHIT Amount'].astype(float)
-        
-        logger.info(f"从 Staking event 数据库成功加载了 {len(df)} 条记录")
-        return df
+    watermark = get_watermark(name)
+    if watermark is None:
+        return None, start_dt, True
+    
+    # 水位线为 UTC，转换为 UTC+8 与调用方的时间对齐
+    watermark_local = watermark + pd.Timedelta(hours=8)
+    if start_dt is not None and start_dt >= watermark_local:
+        return None, start_dt, True
+    
+    need_tail = end_dt is None or end_dt > watermark_local
+    return watermark, watermark_local, need_tail
+
+
+def _mirror_args(spec: TableSpec, start_dt, end_dt, filters) -> tuple:
+    """将 UTC+8 范围和输出列过滤条件转换为镜像使用的 UTC 范围和源列过滤条件"""
+    utc_start = start_dt - pd.Timedelta(hours=8) if start_dt is not None else None
+    utc_end = end_dt - pd.Timedelta(hours=8) if end_dt is not None else None
+    source_filters = {spec.source_of[col]: value for col, value in (filters or {}).items()}
+    return utc_start, utc_end, source_filters
+
+
+def _freeze(value: Any) -> Any:
+    """把过滤条件转换为可哈希的缓存键"""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(sorted(value))
+    return value
+
+
+def _load_range(
+    spec: TableSpec,
+    name: str,
+    start_dt: Optional[pd.Timestamp],
+    end_dt: Optional[pd.Timestamp],
+    source_cols: List[str],
+    derived: List[str],
+    filters: Optional[Dict[str, Any]]
+) -> pd.DataFrame:
+    """加载 [start_dt, end_dt) 并完成规范化，数据库失败时抛出异常 (供查询缓存判断是否写入)"""
+    frames = []
+    watermark, tail_start, need_tail = _mirror_split(name, start_dt, end_dt)
+    if watermark is not None:
+        try:
+            utc_start, utc_end, source_filters = _mirror_args(spec, start_dt, end_dt, filters)
+            mirror_df = read_mirror(name, utc_start, utc_end, source_cols, source_filters, watermark, **_read_kwargs())
+            logger.info(f"从 {spec.label} 本地镜像读取了 {len(mirror_df)} 条记录 (水位线 {watermark})")
+            if not mirror_df.empty:
+                frames.append(mirror_df)
+        except Exception as e:
+            logger.error(f"读取 {spec.label} 本地镜像失败，回退到数据库: {e}")
+            frames, tail_start, need_tail = [], start_dt, True
+    
+    if need_tail:
+        engine = get_db_engine()
+        if engine is None:
+            raise RuntimeError("数据库引擎不可用")
         
-    except Exception as e:
-        logger.error(f"从 Staking event 数据库加载数据失败: {e}")
-        return pd.DataFrame()
+        stmt, params, query = _build_query(spec, source_cols, tail_start, end_dt, filters)
+        logger.info(f"正在从 {spec.label} 数据库执行 SQL 查询: {query} 参数: {params}")
+        with engine.connect() as conn:
+            df = pd.read_sql(stmt, conn, params=params, **_read_kwargs())
+        if not df.empty:
+            frames.append(df)
+    
+    if not frames:
+        return _empty_frame(spec, source_cols, derived)
+    
+    df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+    return _normalize_frame(spec, df, derived)
+
 
-def load_staking_reward_from_db(start_dt: Optional[pd.Timestamp] = None, end_dt: Optional[pd.Timestamp] = None):
+def load_table(
+    name: str,
+    start_dt: Optional[pd.Timestamp] = None,
+    end_dt: Optional[pd.Timestamp] = None,
+    columns: Optional[Iterable[str]] = None,
+    filters: Optional[Dict[str, Any]] = None
+) -> pd.DataFrame:
     """
-    直接从数据库加载 Staking_Reward_Log 数据。
-    符合 POS 格式: 无 type, 包含 SolSentToTreasury。
+    按规格加载一张表 (列投影 + 谓词下推)
+    
+    启用本地 Parquet 镜像时，水位线之前的部分从镜像读取，只有实时尾部查询 MySQL。
+    起止时间都给定时，已关闭的时间段经过区间查询缓存，只拉取缺失的子区间。
+    
+    Args:
+        name: TABLE_SPECS 中的表名
+        start_dt: 起始时间 (UTC+8, 包含)
+        end_dt: 结束时间 (UTC+8, 不包含)
+        columns: 需要的输出列 (不含 Timestamp(UTC+8)，始终返回)，None 表示全部
+        filters: 额外过滤条件 {输出列名: 值 或 值列表}，如 {'Activity': ['BUY', 'SELL']}
+    
+    Returns:
+        含 Timestamp(UTC+8) 及所需列的 DataFrame，按时间升序排列
     """
-    engine = get_db_engine()
-    if engine is None:
-        return pd.DataFrame()
-        
-    query = f"SELECT block_time_dt, to_user, amount, SolSentToTreasury FROM shit_staking_rewards"
-    params = {}
+    spec = TABLE_SPECS[name]
+    source_cols, derived = _resolve_columns(spec, columns)
     
-    if start_dt is not None and end_dt is not None:
-        # 将 UTC+8 时间转换为 UTC+0 字符串进行过滤
-        utc_start = start_dt - pd.Timedelta(hours=8)
-        utc_end = end_dt - pd.Timedelta(hours=8)
-        
-        query += " WHERE block_time_dt >= :start AND block_time_dt < :end"
-        params = {
-            "start": utc_start.strftime('%Y-%m-%d %H:%M:%S'),
-            "end": utc_end.strftime('%Y-%m-%d %H:%M:%S')
-        }
+    def fetch(a: Optional[pd.Timestamp], b: Optional[pd.Timestamp]) -> pd.DataFrame:
+        return _load_range(spec, name, a, b, source_cols, derived, filters)
     
     try:
-        logger.info(f"正在从 Staking Reward 数据库执行 SQL 查询: {query} 参数: {params}")
-        with engine.connect() as conn:
-            df = pd.read_sql(text(query), conn, params=params)
-        
-        if df.empty:
-            logger.warning(f"Staking Reward 数据库返回数据为空 (范围: {start_dt} 到 {end_dt})")
-            return pd.DataFrame()
-            
-        # 1. 时区转换: block_time_dt (UTC) -> Timestamp(UTC+8)
-        df['block_time_dt'] = pd.to_datetime(df['block_time_dt'])
-        if df['block_time_dt'].dt.tz is None:
-            df['block_time_dt'] = df['block_time_dt'].dt.tz_localize('UTC')
-        else:
-            df['block_time_dt'] = df['block_time_dt'].dt.tz_convert('UTC')
-            
-        df['Timestamp(UTC+8)'] = df['block_time_dt'].dt.tz_convert('Asia/Shanghai').dt.tz_localize(None)
-        
-        # 2. 字段映射
-        df = df.rename(columns={
-            'to_user': 'Receiver Address',
-            'amount': 'SHIT Sent',
-            'SolSentToTreasury': 'SOL Received'
-        })
-        
-        # 3. 类型转换
-        df['SHIT Sent'] = df['SHIT Sent'].astype(float)
-        df['SOL Received'] = df['SOL Received'].astype(float)
-        
-        logger.info(f"从 Staking Reward 数据库成功加载了 {len(df)} 条记录")
-        return df
-        
+        key, cached, live = _cache_plan(name, start_dt, end_dt, columns, filters)
+        frames = []
+        if cached is not None:
+            frames.append(query_cache.get_or_fetch(key, *cached, fetch))
+        if live is not None:
+            frames.append(fetch(*live))
+        df = _join_frames(frames)
     except Exception as e:
-        logger.error(f"从 Staking Reward 数据库加载数据失败: {e}")
-        return pd.DataFrame()
+        logger.error(f"从 {spec.label} 数据库加载数据失败: {e}")
+        return _empty_frame(spec, source_cols, derived)
     
+    return _log_loaded(spec, df, start_dt, end_dt)
 
-def load_defi_from_db(start_dt: Optional[pd.Timestamp] = None, end_dt: Optional[pd.Timestamp] = None):
+
+def _cache_plan(
+    name: str,
+    start_dt: Optional[pd.Timestamp],
+    end_dt: Optional[pd.Timestamp],
+    columns: Optional[Iterable[str]],
+    filters: Optional[Dict[str, Any]]
+) -> tuple:
     """
-    直接从数据库的 liq_pool_activity 表加载 DeFi 数据。
+    拆分请求区间: 已关闭部分走查询缓存，实时尾部直接查询
+    
+    Returns:
+        (缓存键, 缓存区间 (a, b) 或 None, 直接查询区间 (a, b) 或 None)
     """
-    engine = get_db_engine()
-    if engine is None:
-        return pd.DataFrame()
-        
-    query = "SELECT timestamp_utc, from_address, activity, shit_change, usdt_change FROM liq_pool_activity"
-    params = {}
+    if not (query_cache.enabled and start_dt is not None and end_dt is not None and start_dt < end_dt):
+        return None, None, (start_dt, end_dt)
     
-    if start_dt is not None and end_dt is not None:
-        # 将 UTC+8 时间转换为 UTC+0 字符串进行过滤
-        utc_start = start_dt - pd.Timedelta(hours=8)
-        utc_end = end_dt - pd.Timedelta(hours=8)
-        
-        query += " WHERE timestamp_utc >= :start AND timestamp_utc < :end"
-        params = {
-            "start": utc_start.strftime('%Y-%m-%d %H:%M:%S'),
-            "end": utc_end.strftime('%Y-%m-%d %H:%M:%S')
-        }
+    stable_end = min(end_dt, get_stable_end())
+    key = (name, tuple(sorted(columns)) if columns is not None else None, _freeze(filters or {}))
+    cached = (start_dt, stable_end) if start_dt < stable_end else None
+    live = (max(start_dt, stable_end), end_dt) if max(start_dt, stable_end) < end_dt else None
+    return key, cached, live
+
+
+def _join_frames(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """合并缓存部分与实时部分，全部为空时返回第一个 (带类型的) 空表"""
+    non_empty = [f for f in frames if not f.empty]
+    if not non_empty:
+        return frames[0]
+    return sort_by_time(concat_frames(non_empty))
+
+
+def sort_by_time(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    保证按 Timestamp(UTC+8) 升序 (稳定排序，同一时间点保持原有顺序)
     
-    try:
-        logger.info(f"正在从 DeFi 数据库执行 SQL 查询: {query} 参数: {params}")
-        with engine.connect() as conn:
-            df = pd.read_sql(text(query), conn, params=params)
-        
-        if df.empty:
-            logger.warning(f"DeFi 数据库返回数据为空 (范围: {start_dt} 到 {end_dt})")
-            return pd.DataFrame()
-            
-        # 1. 时区转换: timestamp_utc (UTC) -> Timestamp(UTC+8)
-        df['timestamp_utc'] = pd.to_datetime(df['timestamp_utc'])
-        if df['timestamp_utc'].dt.tz is None:
-            df['timestamp_utc'] = df['timestamp_utc'].dt.tz_localize('UTC')
-        else:
-            df['timestamp_utc'] = df['timestamp_utc'].dt.tz_convert('UTC')
-            
-        df['Timestamp(UTC+8)'] = df['timestamp_utc'].dt.tz_convert('Asia/Shanghai').dt.tz_localize(None)
-        
-        # 2. 字段映射
-        df = df.rename(columns={
-            'from_address': 'FromAddress',
-            'activity': 'Activity',
-            'shit_change': 'SHIT Change',
-            'usdt_change': 'USDT Change'
-        })
-        
-        # 3. 类型转换
-        df['SHIT Change'] = df['SHIT Change'].astype(float)
-        df['USDT Change'] = df['USDT Change'].astype(float)
-        
-        logger.info(f"从 DeFi 数据库成功加载了 {len(df)} 条记录")
+    load_table / load_table_async 的返回值都经过此函数，调用方可以用
+    utils.time_index 的 searchsorted 切片取时间窗口视图。已有序时只做一次单调性检查。
+    """
+    if df[TIMESTAMP_COL].is_monotonic_increasing:
         return df
-        
-    except Exception as e:
-        logger.error(f"从 DeFi 数据库加载数据失败: {e}")
-        return pd.DataFrame()
+    return df.sort_values(TIMESTAMP_COL, kind='stable', ignore_index=True)
+
+
+def _log_loaded(spec: TableSpec, df: pd.DataFrame, start_dt: Optional[pd.Timestamp], end_dt: Optional[pd.Timestamp]) -> pd.DataFrame:
+    if df.empty:
+        logger.warning(f"{spec.label} 数据库返回数据为空 (范围: {start_dt} 到 {end_dt})")
+    else:
+        logger.info(f"从 {spec.label} 数据库成功加载了 {len(df)} 条记录")
+    return df
+
 
-def load_price_history_from_db(start_dt: Optional[pd.Timestamp] = None, end_dt: Optional[pd.Timestamp] = None):
+def get_stream_chunksize() -> int:
+    """流式加载每个分块的行数"""
+    return int(os.getenv("DB_STREAM_CHUNKSIZE", 50000))
+
+
+def use_streaming(start_dt: pd.Timestamp, end_dt: pd.Timestamp) -> bool:
+    """时间跨度 (含环比周期) 达到 DB_STREAM_MIN_DAYS 时使用流式加载"""
+    min_days = int(os.getenv("DB_STREAM_MIN_DAYS", 60))
+    return min_days > 0 and (end_dt - start_dt) >= pd.Timedelta(days=min_days)
+
+
+def iter_table_chunks(
+    name: str,
+    start_dt: Optional[pd.Timestamp] = None,
+    end_dt: Optional[pd.Timestamp] = None,
+    columns: Optional[Iterable[str]] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    chunksize: Optional[int] = None
+) -> Iterator[pd.DataFrame]:
     """
-    直接从数据库的 shit_price_history 表加载价格数据。
+    流式加载一张表，按固定行数逐块产出已规范化的 DataFrame
+    
+    使用服务端游标 (pymysql SSCursor, stream_results=True)，结果集不会在客户端整体缓冲，
+    峰值内存只与 chunksize 有关，与查询的时间跨度无关。
+    启用本地镜像时，先逐个分片产出镜像数据，再流式读取 MySQL 实时尾部。
+    
+    Args:
+        与 load_table 相同；chunksize 默认读取 DB_STREAM_CHUNKSIZE
+    
+    Yields:
+        与 load_table 返回格式一致的 DataFrame 分块
     """
+    spec = TABLE_SPECS[name]
+    source_cols, derived = _resolve_columns(spec, columns)
+    chunksize = chunksize or get_stream_chunksize()
+    total = 0
+    
+    watermark, tail_start, need_tail = _mirror_split(name, start_dt, end_dt)
+    if watermark is not None:
+        utc_start, utc_end, source_filters = _mirror_args(spec, start_dt, end_dt, filters)
+        for part in iter_mirror(name, utc_start, utc_end, source_cols, source_filters, watermark, **_read_kwargs()):
+            for offset in range(0, len(part), chunksize):
+                chunk = part.iloc[offset:offset + chunksize]
+                total += len(chunk)
+                yield _normalize_frame(spec, chunk.copy(), derived)
+        logger.info(f"从 {spec.label} 本地镜像流式读取了 {total} 条记录 (水位线 {watermark})")
+    
+    if not need_tail:
+        return
+    
     engine = get_db_engine()
     if engine is None:
-        return pd.DataFrame()
-        
-    query = "SELECT timestamp_utc, timestamp_utc8, price FROM shit_price_history"
-    params = {}
+        return
     
-    if start_dt is not None and end_dt is not None:
-        # 数据库中通常存的是 UTC 时间
-        utc_start = start_dt - pd.Timedelta(hours=8)
-        utc_end = end_dt - pd.Timedelta(hours=8)
-        
-        query += " WHERE timestamp_utc >= :start AND timestamp_utc < :end"
-        params = {
-            "start": utc_start.strftime('%Y-%m-%d %H:%M:%S'),
-            "end": utc_end.strftime('%Y-%m-%d %H:%M:%S')
-        }
+    stmt, params, query = _build_query(spec, source_cols, tail_start, end_dt, filters)
     
+    logger.info(f"正在从 {spec.label} 数据库流式查询 (chunksize={chunksize}): {query} 参数: {params}")
     try:
-        logger.info(f"正在从价格数据库执行 SQL 查询: {query} 参数: {params}")
         with engine.connect() as conn:
-            df = pd.read_sql(text(query), conn, params=params)
-        
-        if df.empty:
-            logger.warning(f"价格数据库返回数据为空 (范围: {start_dt} 到 {end_dt})")
-            return pd.DataFrame()
-            
-        # 1. 字段映射和时区处理
-        # 计算逻辑期望的字段是 Timestamp(UTC+8) 和 Price
-        df['Timestamp(UTC+8)'] = pd.to_datetime(df['timestamp_utc8'])
-        df = df.rename(columns={
-            'price': 'Price'
-        })
-        
-        # 3. 类型转换
-        df['Price'] = df['Price'].astype(float)
-        
-        # 只保留需要的列
-        df = df[['Timestamp(UTC+8)', 'Price']]
-        
-        logger.info(f"从价格数据库成功加载了 {len(df)} 条记录")
-        return df
-        
+            conn = conn.execution_options(stream_results=True, max_row_buffer=chunksize)
+            for chunk in pd.read_sql(stmt, conn, params=params, chunksize=chunksize, **_read_kwargs()):
+                if chunk.empty:
+                    continue
+                total += len(chunk)
+                yield _normalize_frame(spec, chunk, derived)
     except Exception as e:
-        logger.error(f"从价格数据库加载数据失败: {e}")
-        return pd.DataFrame()
+        # 中途失败时不能静默返回部分结果，交由调用方处理
+        logger.error(f"从 {spec.label} 数据库流式加载失败 (已读取 {total} 条): {e}")
+        raise
+    
+    logger.info(f"从 {spec.label} 数据库流式加载了 {total} 条记录")
+
+
+def _normalize_frame(spec: TableSpec, df: pd.DataFrame, derived: List[str]) -> pd.DataFrame:
+    """时区转换、字段映射、类型转换、派生列"""
+    # 1. 时间列: time_col (UTC) -> Timestamp(UTC+8)，原始时间列不保留
+    #    Arrow 模式下时间列同样转为 datetime64[ns]，.dt / floor / searchsorted 行为与 NumPy 模式一致
+    if spec.local_time_col:
+        df[TIMESTAMP_COL] = pd.to_datetime(df.pop(spec.local_time_col)).astype('datetime64[ns]')
+    else:
+        df[TIMESTAMP_COL] = to_utc8(df.pop(spec.time_col))
+    
+    # 2. 字段映射
+    df = df.rename(columns=spec.columns)
     
+    # 3. 类型转换
+    for col, dtype in spec.dtypes.items():
+        if col in df.columns:
+            df[col] = df[col].astype(_target_dtype(dtype))
+    
+    # 4. 派生列
+    for col in derived:
+        df[col] = spec.derived[col][1](df)
+    
+    return df
+
+
+# ============================================
+# 各表加载入口
+# ============================================
+
+def load_ts_log_from_db(start_dt: Optional[pd.Timestamp] = None, end_dt: Optional[pd.Timestamp] = None, columns: Optional[Iterable[str]] = None, filters: Optional[Dict[str, Any]] = None):
+    """
+    直接从数据库的 take_a_SHIT 表加载 TS_Log 数据。
+    """
+    return load_table('ts_log', start_dt, end_dt, columns, filters)
+
+
+def load_pos_log_from_db(start_dt: Optional[pd.Timestamp] = None, end_dt: Optional[pd.Timestamp] = None, columns: Optional[Iterable[str]] = None, filters: Optional[Dict[str, Any]] = None):
+    """
+    直接从数据库的 shit_pos_rewards 表加载 POS_Log 数据。
+    """
+    return load_table('pos_log', start_dt, end_dt, columns, filters)
+
+
+def load_shitcode_log_from_db(start_dt: Optional[pd.Timestamp] = None, end_dt: Optional[pd.Timestamp] = None, columns: Optional[Iterable[str]] = None, filters: Optional[Dict[str, Any]] = None):
+    """
+    直接从数据库的 shit_code 表加载 ShitCode_Log 数据。
+    """
+    return load_table('shitcode_log', start_dt, end_dt, columns, filters)
+
+
+def load_staking_amount_from_db(start_dt: Optional[pd.Timestamp] = None, end_dt: Optional[pd.Timestamp] = None, columns: Optional[Iterable[str]] = None, filters: Optional[Dict[str, Any]] = None):
+    """
+    直接从数据库加载 Staking_Amount_Log 数据 (来自事件表)。
+    """
+    return load_table('staking_amount', start_dt, end_dt, columns, filters)
+
+
+def load_staking_reward_from_db(start_dt: Optional[pd.Timestamp] = None, end_dt: Optional[pd.Timestamp] = None, columns: Optional[Iterable[str]] = None, filters: Optional[Dict[str, Any]] = None):
+    """
+    直接从数据库加载 Staking_Reward_Log 数据。
+    符合 POS 格式: 无 type, 包含 SolSentToTreasury。
+    """
+    return load_table('staking_reward', start_dt, end_dt, columns, filters)
+
+
+def load_defi_from_db(start_dt: Optional[pd.Timestamp] = None, end_dt: Optional[pd.Timestamp] = None, columns: Optional[Iterable[str]] = None, filters: Optional[Dict[str, Any]] = None):
+    """
+    直接从数据库的 liq_pool_activity 表加载 DeFi 数据。
+    """
+    return load_table('defi', start_dt, end_dt, columns, filters)
+
+
+def load_price_history_from_db(start_dt: Optional[pd.Timestamp] = None, end_dt: Optional[pd.Timestamp] = None, columns: Optional[Iterable[str]] = None, filters: Optional[Dict[str, Any]] = None):
+    """
+    直接从数据库的 shit_price_history 表加载价格数据。
+    """
+    return load_table('price_history', start_dt, end_dt, columns, filters)
@@ -0,0 +1,233 @@
+"""
+时间区间查询结果缓存
+按 (表, 列, 过滤条件) 记录已加载的 [start, end) 区间，相邻或重叠区间自动合并。
+新请求只从数据库拉取缺失的子区间，按内存预算以 LRU 方式淘汰。
+
+只缓存已关闭的时间段 (早于 当前时间 - QUERY_CACHE_LAG_MINUTES)，实时尾部始终走数据库。
+缓存段不会再失效，lag 默认与本地镜像的迟到数据核对窗口 (PARQUET_MIRROR_OVERLAP_MINUTES，默认 120) 相同，
+在该窗口内迟到入库的行不会被缓存遗漏。
+返回给调用方的 DataFrame 不与缓存共享数据，调用方修改结果不会影响缓存。
+字节统计统一按 memory_usage(deep=True) 计算。
+"""
+import os
+import time
+import asyncio
+import threading
+import logging
+from typing import Optional, Dict, Any, List, Tuple, Callable, Awaitable
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+TIMESTAMP_COL = 'Timestamp(UTC+8)'
+
+
+class _Segment:
+    """一段连续已加载区间 [start, end) 及其数据"""
+
+    def __init__(self, start: pd.Timestamp, end: pd.Timestamp, df: pd.DataFrame) -> None:
+        self.start = start
+        self.end = end
+        self.df = df
+        self.nbytes = int(df.memory_usage(deep=True).sum())
+        self.last_used = time.monotonic()
+
+    def slice(self, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+        """[start, end) 内的行，覆盖整段时返回缓存数据本身 (由 _assemble 负责复制)"""
+        if start <= self.start and end >= self.end:
+            return self.df
+        ts = self.df[TIMESTAMP_COL]
+        return self.df[(ts >= start) & (ts < end)]
+
+
+class IntervalCache:
+    """按时间区间缓存查询结果的 LRU 缓存 (线程安全)"""
+
+    def __init__(self, budget_bytes: int) -> None:
+        self.budget_bytes = budget_bytes
+        self._segments: Dict[tuple, List[_Segment]] = {}
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+        self._stats = {
+            'hits': 0,           # 请求完全由缓存满足
+            'partialHits': 0,    # 请求部分由缓存满足
+            'misses': 0,         # 请求完全未命中
+            'fetches': 0,        # 向数据库拉取的子区间数
+            'bytesServed': 0,    # 从缓存返回的字节数
+            'bytesFetched': 0,   # 从数据库拉取并写入缓存的字节数
+            'evictions': 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.budget_bytes > 0
+
+    def get_or_fetch(
+        self,
+        key: tuple,
+        start: pd.Timestamp,
+        end: pd.Timestamp,
+        fetch: Callable[[pd.Timestamp, pd.Timestamp], pd.DataFrame]
+    ) -> pd.DataFrame:
+        """
+        返回 [start, end) 的数据，缺失的子区间调用 fetch(a, b) 拉取并写入缓存
+
+        Args:
+            key: 缓存键 (表名, 列, 过滤条件)
+            start / end: 请求区间
+            fetch: 拉取函数，失败时应抛出异常 (失败结果不会被缓存)
+
+        Returns:
+            独立于缓存的 DataFrame，调用方可以直接修改
+        """
+        pieces, missing = self._lookup(key, start, end)
+
+        for a, b in missing:
+            df = fetch(a, b)
+            self._put(key, a, b, df)
+            pieces.append((a, df))
+
+        return self._assemble(pieces, missing)
+
+    async def aget_or_fetch(
+        self,
+        key: tuple,
+        start: pd.Timestamp,
+        end: pd.Timestamp,
+        fetch: Callable[[pd.Timestamp, pd.Timestamp], Awaitable[pd.DataFrame]]
+    ) -> pd.DataFrame:
+        """get_or_fetch 的异步版本，fetch 为协程函数，缺失的子区间并发拉取"""
+        pieces, missing = self._lookup(key, start, end)
+
+        frames = await asyncio.gather(*(fetch(a, b) for a, b in missing))
+        for (a, b), df in zip(missing, frames):
+            self._put(key, a, b, df)
+            pieces.append((a, df))
+
+        return self._assemble(pieces, missing)
+
+    def _assemble(self, pieces: List[tuple], missing: List[tuple]) -> pd.DataFrame:
+        """记录命中统计，并按起点顺序拼接缓存片段与新拉取的数据 (结果不与缓存共享数据)"""
+        with self._lock:
+            if not missing:
+                self._stats['hits'] += 1
+            elif len(pieces) > len(missing):
+                self._stats['partialHits'] += 1
+            else:
+                self._stats['misses'] += 1
+            self._stats['fetches'] += len(missing)
+
+        frames = [df for _, df in sorted(pieces, key=lambda p: p[0]) if not df.empty]
+        if not frames:
+            return pieces[0][1].copy() if pieces else pd.DataFrame()
+        if len(frames) == 1:
+            # 单个片段可能就是缓存中的 DataFrame (或刚写入缓存的拉取结果)
+            return frames[0].copy()
+        from utils.db_loader import concat_frames
+        return concat_frames(frames)
+
+    def _lookup(self, key: tuple, start: pd.Timestamp, end: pd.Timestamp) -> Tuple[List[tuple], List[tuple]]:
+        """返回 (已缓存片段 [(起点, df)], 缺失区间 [(a, b)])"""
+        pieces = []
+        missing = []
+        cursor = start
+        served = 0
+        with self._lock:
+            for segment in self._segments.get(key, []):
+                if segment.end <= cursor or segment.start >= end:
+                    continue
+                if segment.start > cursor:
+                    missing.append((cursor, segment.start))
+                lo, hi = max(cursor, segment.start), min(end, segment.end)
+                piece = segment.slice(lo, hi)
+                pieces.append((lo, piece))
+                # 按行数比例折算段的 deep 字节数，与 cachedBytes / bytesFetched 口径一致
+                served += segment.nbytes * len(piece) // max(len(segment.df), 1)
+                segment.last_used = time.monotonic()
+                cursor = hi
+                if cursor >= end:
+                    break
+            self._stats['bytesServed'] += served
+        if cursor < end:
+            missing.append((cursor, end))
+        return pieces, missing
+
+    def _put(self, key: tuple, start: pd.Timestamp, end: pd.Timestamp, df: pd.DataFrame) -> None:
+        """写入区间，并与相邻 / 重叠的已有区间合并"""
+        new_segment = _Segment(start, end, df)
+        if new_segment.nbytes > self.budget_bytes:
+            return
+
+        from utils.db_loader import concat_frames
+        with self._lock:
+            segments = self._segments.setdefault(key, [])
+            keep, merge = [], []
+            for segment in segments:
+                if segment.end < start or segment.start > end:
+                    keep.append(segment)
+                else:
+                    merge.append(segment)
+
+            if merge:
+                frames = []
+                for segment in merge:
+                    # 并发请求可能重复拉取同一区间，以新数据为准
+                    ts = segment.df[TIMESTAMP_COL]
+                    outside = segment.df[(ts < start) | (ts >= end)]
+                    if not outside.empty:
+                        frames.append(outside)
+                    self._total_bytes -= segment.nbytes
+                if not df.empty:
+                    frames.append(df)
+                merged = concat_frames(frames).sort_values(TIMESTAMP_COL, kind='stable', ignore_index=True) if frames else df
+                new_segment = _Segment(
+                    min([start] + [s.start for s in merge]),
+                    max([end] + [s.end for s in merge]),
+                    merged
+                )
+
+            keep.append(new_segment)
+            keep.sort(key=lambda s: s.start)
+            self._segments[key] = keep
+            self._total_bytes += new_segment.nbytes
+            self._stats['bytesFetched'] += int(df.memory_usage(deep=True).sum())
+            self._evict()
+
+    def _evict(self) -> None:
+        """按最近使用时间淘汰，直到总大小低于预算 (需持有锁)"""
+        while self._total_bytes > self.budget_bytes:
+            candidates = [(s.last_used, key, s) for key, segs in self._segments.items() for s in segs]
+            if not candidates:
+                break
+            _, key, victim = min(candidates, key=lambda c: c[0])
+            self._segments[key].remove(victim)
+            if not self._segments[key]:
+                del self._segments[key]
+            self._total_bytes -= victim.nbytes
+            self._stats['evictions'] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._segments.clear()
+            self._total_bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """命中 / 未命中 / 字节统计"""
+        with self._lock:
+            return {
+                **self._stats,
+                'segments': sum(len(segs) for segs in self._segments.values()),
+                'cachedBytes': self._total_bytes,
+                'budgetBytes': self.budget_bytes,
+            }
+
+
+def get_stable_end() -> pd.Timestamp:
+    """可缓存的上界 (UTC+8)：早于此时间的数据视为不再变化"""
+    minutes = os.getenv("QUERY_CACHE_LAG_MINUTES") or os.getenv("PARQUET_MIRROR_OVERLAP_MINUTES", 120)
+    lag = pd.Timedelta(minutes=int(minutes))
+    return (pd.Timestamp.now(tz='UTC').tz_localize(None) + pd.Timedelta(hours=8) - lag).floor('s')
+
+
+# 全局单例 (QUERY_CACHE_MB=0 关闭)
+query_cache = IntervalCache(int(float(os.getenv("QUERY_CACHE_MB", 256)) * 1024 * 1024))
@@ -0,0 +1,364 @@
+"""
+链上数据表的本地 Parquet 镜像
+按 UTC 日期分区存储原始行，通过水位线 (watermark) 增量同步，
+已关闭的时间段直接从本地读取，只有实时尾部才查询 MySQL。
+
+目录结构:
+    <PARQUET_MIRROR_DIR>/<table>/_watermark.json
+    <PARQUET_MIRROR_DIR>/<table>/date=YYYY-MM-DD/part-<lo>-<hi>.parquet
+
+每个分片文件覆盖 [lo, hi) 的 UTC 时间段，水位线是已完整同步的上界 (不包含)。
+读取时忽略 hi 超过水位线的分片，因此同步中途失败不会产生重复或残缺数据。
+
+晚于 lag 才入库的行: 每次同步先核对水位线前 PARQUET_MIRROR_OVERLAP_MINUTES 内涉及的
+UTC 日期，行数与 MySQL 不一致的日期整日重新拉取，写成一个覆盖整日的分片。
+时间段被同日期内另一个分片完全覆盖的分片视为已被替换，读取时忽略并在之后删除。
+
+用法:
+    python -m utils.parquet_mirror            # 同步所有表
+    python -m utils.parquet_mirror ts_log     # 只同步指定表
+"""
+import os
+import sys
+import json
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List, Iterator, Tuple
+import pandas as pd
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+_TS_FORMAT = '%Y%m%dT%H%M%S'
+
+
+def is_mirror_enabled() -> bool:
+    """是否启用本地镜像 (PARQUET_MIRROR=1)"""
+    return os.getenv("PARQUET_MIRROR", "0").lower() in ("1", "true", "yes")
+
+
+def get_mirror_dir() -> str:
+    return os.getenv("PARQUET_MIRROR_DIR") or os.path.join(os.path.dirname(os.path.dirname(__file__)), '.mirror')
+
+
+def _table_dir(name: str) -> str:
+    return os.path.join(get_mirror_dir(), name)
+
+
+def _watermark_path(name: str) -> str:
+    return os.path.join(_table_dir(name), '_watermark.json')
+
+
+def get_watermark(name: str) -> Optional[pd.Timestamp]:
+    """读取表的同步水位线 (UTC，不包含)，未同步过返回 None"""
+    path = _watermark_path(name)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return pd.Timestamp(json.load(f)['watermark'])
+    except Exception as e:
+        logger.warning(f"读取镜像水位线失败 ({name}): {e}")
+        return None
+
+
+def _set_watermark(name: str, watermark: pd.Timestamp) -> None:
+    path = _watermark_path(name)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'watermark': watermark.strftime('%Y-%m-%d %H:%M:%S'),
+            'synced_at': datetime.now().isoformat()
+        }, f)
+    os.replace(tmp_path, path)
+
+
+def _mirror_columns(name: str) -> List[str]:
+    """镜像保存的源列 (规格中的全部源列)"""
+    from utils.db_loader import TABLE_SPECS
+    spec = TABLE_SPECS[name]
+    columns = [spec.time_col]
+    if spec.local_time_col:
+        columns.append(spec.local_time_col)
+    return columns + list(spec.columns.keys())
+
+
+def _part_range(filename: str) -> Tuple[pd.Timestamp, pd.Timestamp]:
+    """分片文件名 part-<lo>-<hi>.parquet -> (lo, hi)"""
+    _, lo, hi = filename[:-len('.parquet')].split('-')
+    return pd.Timestamp(datetime.strptime(lo, _TS_FORMAT)), pd.Timestamp(datetime.strptime(hi, _TS_FORMAT))
+
+
+def _partition_parts(partition_dir: str, watermark: pd.Timestamp) -> Tuple[List[str], List[str]]:
+    """
+    日期分区内已被水位线覆盖的分片
+
+    Returns:
+        (有效分片, 已被更大分片完全覆盖的分片)
+    """
+    parts = []
+    for filename in sorted(os.listdir(partition_dir)):
+        if not filename.startswith('part-') or not filename.endswith('.parquet'):
+            continue
+        lo, hi = _part_range(filename)
+        if hi > watermark:
+            # 水位线之后的分片属于未完成的同步
+            continue
+        parts.append((lo, hi, os.path.join(partition_dir, filename)))
+
+    active, superseded = [], []
+    for lo, hi, path in parts:
+        covered = any(
+            other_lo <= lo and hi <= other_hi and (other_lo, other_hi) != (lo, hi)
+            for other_lo, other_hi, _ in parts
+        )
+        (superseded if covered else active).append(path)
+    return active, superseded
+
+
+def _list_parts(name: str, utc_start: Optional[pd.Timestamp], utc_end: Optional[pd.Timestamp], watermark: pd.Timestamp) -> List[str]:
+    """列出与 [utc_start, utc_end) 相交且已被水位线覆盖的分片文件"""
+    table_dir = _table_dir(name)
+    if not os.path.isdir(table_dir):
+        return []
+
+    start_day = utc_start.normalize() if utc_start is not None else None
+    paths = []
+    for partition in sorted(os.listdir(table_dir)):
+        if not partition.startswith('date='):
+            continue
+        day = pd.Timestamp(partition[len('date='):])
+        if start_day is not None and day < start_day:
+            continue
+        if utc_end is not None and day >= utc_end:
+            continue
+        active, _ = _partition_parts(os.path.join(table_dir, partition), watermark)
+        paths.extend(active)
+    return paths
+
+
+def iter_mirror(
+    name: str,
+    utc_start: Optional[pd.Timestamp],
+    utc_end: Optional[pd.Timestamp],
+    source_cols: List[str],
+    source_filters: Optional[Dict[str, Any]],
+    watermark: pd.Timestamp,
+    **read_kwargs: Any
+) -> Iterator[pd.DataFrame]:
+    """
+    逐个分片读取镜像中 [utc_start, min(utc_end, watermark)) 的原始行
+
+    Args:
+        name: TABLE_SPECS 中的表名
+        utc_start / utc_end: UTC 时间范围，None 表示不限
+        source_cols: 需要的源列
+        source_filters: {源列名: 值 或 值列表}
+        watermark: 调用方读取到的水位线 (保证同一次读取内一致)
+        read_kwargs: 透传给 pd.read_parquet，如 dtype_backend='pyarrow'
+    """
+    from utils.db_loader import TABLE_SPECS
+    time_col = TABLE_SPECS[name].time_col
+    upper = min(utc_end, watermark) if utc_end is not None else watermark
+    if utc_start is not None and utc_start >= upper:
+        return
+
+    # 下推到 Parquet 的行过滤条件
+    filters = [(time_col, '<', upper.to_pydatetime())]
+    if utc_start is not None:
+        filters.append((time_col, '>=', utc_start.to_pydatetime()))
+    for col, value in (source_filters or {}).items():
+        if isinstance(value, (list, tuple, set, frozenset)):
+            filters.append((col, 'in', list(value)))
+        else:
+            filters.append((col, '==', value))
+
+    for path in _list_parts(name, utc_start, upper, watermark):
+        part = pd.read_parquet(path, columns=source_cols, filters=filters, **read_kwargs)
+        if not part.empty:
+            yield part
+
+
+def read_mirror(
+    name: str,
+    utc_start: Optional[pd.Timestamp],
+    utc_end: Optional[pd.Timestamp],
+    source_cols: List[str],
+    source_filters: Optional[Dict[str, Any]],
+    watermark: pd.Timestamp,
+    **read_kwargs: Any
+) -> pd.DataFrame:
+    """读取镜像中 [utc_start, min(utc_end, watermark)) 的原始行 (合并为一个 DataFrame)"""
+    frames = list(iter_mirror(name, utc_start, utc_end, source_cols, source_filters, watermark, **read_kwargs))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=source_cols)
+
+
+def _partition_dir(name: str, day: pd.Timestamp) -> str:
+    return os.path.join(_table_dir(name), f"date={day.strftime('%Y-%m-%d')}")
+
+
+def _write_part(name: str, df: pd.DataFrame, lo: pd.Timestamp, hi: pd.Timestamp) -> None:
+    """写入覆盖 [lo, hi) 的分片 (同一 UTC 日期内)"""
+    partition_dir = _partition_dir(name, lo)
+    os.makedirs(partition_dir, exist_ok=True)
+    path = os.path.join(partition_dir, f"part-{lo.strftime(_TS_FORMAT)}-{hi.strftime(_TS_FORMAT)}.parquet")
+    tmp_path = path + '.tmp'
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def _fetch(engine, spec, columns: List[str], lo: pd.Timestamp, hi: pd.Timestamp) -> pd.DataFrame:
+    """从 MySQL 拉取 [lo, hi) 的原始行并统一时间 / 浮点列类型"""
+    query = text(
+        f"SELECT {', '.join(columns)} FROM {spec.table} "
+        f"WHERE {spec.time_col} >= :start AND {spec.time_col} < :end"
+    )
+    with engine.connect() as conn:
+        df = pd.read_sql(query, conn, params={
+            "start": lo.strftime('%Y-%m-%d %H:%M:%S'),
+            "end": hi.strftime('%Y-%m-%d %H:%M:%S')
+        })
+    if not df.empty:
+        df[spec.time_col] = pd.to_datetime(df[spec.time_col])
+        if spec.local_time_col:
+            df[spec.local_time_col] = pd.to_datetime(df[spec.local_time_col])
+        for src, dst in spec.columns.items():
+            if spec.dtypes.get(dst) is float:
+                df[src] = df[src].astype(float)
+    return df
+
+
+def _resync_late_rows(name: str, engine, watermark: pd.Timestamp, overlap: pd.Timedelta) -> int:
+    """
+    核对 [watermark - overlap, watermark) 涉及的 UTC 日期，行数与 MySQL 不一致的日期整日重新同步
+
+    新分片覆盖 [当日 0 点, min(次日 0 点, watermark))，写入后同日期的旧分片即被替换。
+
+    Returns:
+        重新同步的行数
+    """
+    import pyarrow.parquet as pq
+    from utils.db_loader import TABLE_SPECS
+    spec = TABLE_SPECS[name]
+    columns = _mirror_columns(name)
+
+    total = 0
+    day = (watermark - overlap).normalize()
+    while day < watermark:
+        hi = min(day + pd.Timedelta(days=1), watermark)
+        partition_dir = _partition_dir(name, day)
+        active = _partition_parts(partition_dir, watermark)[0] if os.path.isdir(partition_dir) else []
+        mirrored = sum(pq.ParquetFile(path).metadata.num_rows for path in active)
+        with engine.connect() as conn:
+            expected = conn.execute(
+                text(f"SELECT COUNT(*) FROM {spec.table} WHERE {spec.time_col} >= :start AND {spec.time_col} < :end"),
+                {"start": day.strftime('%Y-%m-%d %H:%M:%S'), "end": hi.strftime('%Y-%m-%d %H:%M:%S')}
+            ).scalar()
+        if expected != mirrored:
+            logger.info(f"镜像重新同步: {name} {day.date()} 本地 {mirrored} 条 / MySQL {expected} 条")
+            df = _fetch(engine, spec, columns, day, hi)
+            if df.empty:
+                # MySQL 中已无数据，直接删除本地分片
+                for path in active:
+                    os.remove(path)
+            else:
+                _write_part(name, df, day, hi)
+                total += len(df)
+        if os.path.isdir(partition_dir):
+            for path in _partition_parts(partition_dir, watermark)[1]:
+                os.remove(path)
+        day = hi
+    return total
+
+
+def _initial_start(name: str, engine) -> Optional[pd.Timestamp]:
+    """首次同步的起点: PARQUET_MIRROR_START 或表中最早时间"""
+    configured = os.getenv("PARQUET_MIRROR_START")
+    if configured:
+        return pd.Timestamp(configured)
+
+    from utils.db_loader import TABLE_SPECS
+    spec = TABLE_SPECS[name]
+    with engine.connect() as conn:
+        earliest = conn.execute(text(f"SELECT MIN({spec.time_col}) FROM {spec.table}")).scalar()
+    return pd.Timestamp(earliest).normalize() if earliest is not None else None
+
+
+def sync_table(name: str, lag_minutes: Optional[int] = None) -> Dict[str, Any]:
+    """
+    增量同步一张表：追加水位线之后、(当前时间 - lag) 之前的行，按 UTC 日期逐日写入分片
+
+    留出 lag 是为了让迟到入库的链上数据有机会落库，之后的时间段由 MySQL 实时查询。
+    超过 lag 才入库的行由水位线前的重叠窗口核对补齐 (PARQUET_MIRROR_OVERLAP_MINUTES)。
+
+    Returns:
+        同步结果 {'table', 'rows', 'resynced', 'watermark'}
+    """
+    from utils.db_loader import TABLE_SPECS, get_db_engine
+    spec = TABLE_SPECS[name]
+    engine = get_db_engine()
+    if engine is None:
+        return {'table': name, 'rows': 0, 'resynced': 0, 'watermark': None}
+
+    lag = pd.Timedelta(minutes=lag_minutes if lag_minutes is not None else int(os.getenv("PARQUET_MIRROR_LAG_MINUTES", 10)))
+    cutoff = (pd.Timestamp(datetime.now(timezone.utc)).tz_localize(None) - lag).floor('s')
+
+    watermark = get_watermark(name)
+    resynced = 0
+    if watermark is not None:
+        overlap = pd.Timedelta(minutes=int(os.getenv("PARQUET_MIRROR_OVERLAP_MINUTES", 120)))
+        resynced = _resync_late_rows(name, engine, watermark, overlap)
+
+    lower = watermark if watermark is not None else _initial_start(name, engine)
+    if lower is None or lower >= cutoff:
+        return {'table': name, 'rows': 0, 'resynced': resynced, 'watermark': watermark}
+
+    columns = _mirror_columns(name)
+    total = 0
+    lo = lower
+    while lo < cutoff:
+        hi = min(lo.normalize() + pd.Timedelta(days=1), cutoff)
+        df = _fetch(engine, spec, columns, lo, hi)
+        if not df.empty:
+            _write_part(name, df, lo, hi)
+            total += len(df)
+        # 分片写入成功后再推进水位线
+        _set_watermark(name, hi)
+        lo = hi
+
+    logger.info(f"镜像同步完成: {name} 新增 {total} 条，补齐 {resynced} 条，水位线 {lo}")
+    return {'table': name, 'rows': total, 'resynced': resynced, 'watermark': lo}
+
+
+def sync_all(names: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """同步所有 (或指定) 表，单表失败不影响其他表"""
+    from utils.db_loader import TABLE_SPECS
+    results = []
+    for name in names or list(TABLE_SPECS.keys()):
+        try:
+            results.append(sync_table(name))
+        except Exception as e:
+            logger.error(f"镜像同步失败 ({name}): {e}")
+            results.append({'table': name, 'rows': 0, 'resynced': 0, 'error': str(e)})
+    return results
+
+
+async def run_sync_loop() -> None:
+    """后台定期同步任务 (间隔 PARQUET_MIRROR_INTERVAL 秒)"""
+    interval = int(os.getenv("PARQUET_MIRROR_INTERVAL", 300))
+    while True:
+        try:
+            await asyncio.to_thread(sync_all)
+        except Exception as e:
+            logger.error(f"镜像后台同步异常: {e}")
+        await asyncio.sleep(interval)
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    from dotenv import load_dotenv
+    load_dotenv(".env.production" if os.getenv("ENVIRONMENT", "local") == "production" else ".env.local")
+    for item in sync_all(sys.argv[1:] or None):
+        print(item)
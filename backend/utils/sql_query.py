@@ -0,0 +1,146 @@
+"""
+SQL 聚合查询
+calculate_*_sql 把每个模块的聚合拆成若干条互不依赖的只读查询 (SqlQuery)。
+同一组查询既可经同步引擎在共享线程池中并行执行 (run_sql_calculation)，
+也可经异步引擎在事件循环中并发执行 (run_sql_calculation_async)，两条路径使用同一条 text() 查询和同一个结果处理函数。
+
+异步引擎不可用时 (未安装 aiomysql 或 DB_ASYNC=0)，异步入口在线程中执行同步版本。
+"""
+import time
+import asyncio
+import logging
+import traceback
+from typing import Optional, Dict, Any, Callable
+import pandas as pd
+from sqlalchemy import text
+from utils.db_loader import get_db_engine
+from utils.async_db_loader import get_async_db_engine, async_connect
+from utils.concurrent_fetch import get_fetch_executor
+
+logger = logging.getLogger(__name__)
+
+
+class SqlQuery:
+    """
+    一条只读聚合查询及其结果处理
+
+    Args:
+        sql: 带命名参数的 SQL 文本
+        params: 查询参数
+        finalize: 结果处理函数；one_row=True 时接收第一行 (无结果时为 None)，否则接收 DataFrame
+        one_row: 是否只取第一行
+        on_error: 查询失败时返回默认值的函数；为 None 时异常向上抛出
+    """
+
+    def __init__(
+        self,
+        sql: str,
+        params: Dict[str, Any],
+        finalize: Callable[[Any], Any],
+        one_row: bool = False,
+        on_error: Optional[Callable[[], Any]] = None
+    ) -> None:
+        self.sql = sql
+        self.params = params
+        self.finalize = finalize
+        self.one_row = one_row
+        self.on_error = on_error
+
+    def _finalize(self, keys: list, rows: list) -> Any:
+        if self.one_row:
+            return self.finalize(rows[0] if rows else None)
+        # 与 pd.read_sql 相同: Decimal 转为 float
+        return self.finalize(pd.DataFrame.from_records(rows, columns=keys, coerce_float=True))
+
+    def _failed(self, e: Exception) -> Any:
+        if self.on_error is None:
+            raise e
+        logger.error(f"SQL 聚合查询失败，使用默认值: {e}")
+        return self.on_error()
+
+    def run(self, engine) -> Any:
+        """经同步引擎执行"""
+        try:
+            with engine.connect() as conn:
+                result = conn.execute(text(self.sql), self.params)
+                keys, rows = list(result.keys()), result.fetchall()
+            return self._finalize(keys, rows)
+        except Exception as e:
+            return self._failed(e)
+
+    async def run_async(self, engine) -> Any:
+        """经异步引擎执行 (连接数按连接池容量限流)"""
+        try:
+            async with async_connect(engine) as conn:
+                result = await conn.execute(text(self.sql), self.params)
+                keys, rows = list(result.keys()), result.fetchall()
+            return self._finalize(keys, rows)
+        except Exception as e:
+            return self._failed(e)
+
+
+def run_queries(engine, queries: Dict[str, SqlQuery]) -> Dict[str, Any]:
+    """在共享线程池中并行执行一组查询，返回 {名称: 处理后的结果}"""
+    executor = get_fetch_executor()
+    futures = {name: executor.submit(query.run, engine) for name, query in queries.items()}
+    return {name: future.result() for name, future in futures.items()}
+
+
+async def run_queries_async(engine, queries: Dict[str, SqlQuery]) -> Dict[str, Any]:
+    """在事件循环中并发执行一组查询，返回 {名称: 处理后的结果}"""
+    results = await asyncio.gather(*(query.run_async(engine) for query in queries.values()))
+    return dict(zip(queries.keys(), results))
+
+
+def run_sql_calculation(
+    label: str,
+    build_queries: Callable[[], Dict[str, SqlQuery]],
+    assemble: Callable[[Dict[str, Any]], Dict[str, Any]],
+    empty: Callable[[], Dict[str, Any]]
+) -> Dict[str, Any]:
+    """
+    经同步引擎执行一个模块的全部聚合查询并组装响应
+
+    Args:
+        label: 模块名 (用于日志)
+        build_queries: 构造 {名称: SqlQuery}
+        assemble: {名称: 结果} -> 响应
+        empty: 数据库不可用或查询失败时的空响应
+    """
+    engine = get_db_engine()
+    if engine is None:
+        return empty()
+
+    start_total = time.time()
+    try:
+        results = run_queries(engine, build_queries())
+        logger.info(f"[Perf] {label} 并行查询耗时: {time.time() - start_total:.2f}s")
+        response = assemble(results)
+        logger.info(f"[Perf] {label} 总计耗时: {time.time() - start_total:.2f}s")
+        return response
+    except Exception as e:
+        logger.error(f"SQL 计算 {label} 数据失败: {str(e)}\n{traceback.format_exc()}")
+        return empty()
+
+
+async def run_sql_calculation_async(
+    label: str,
+    build_queries: Callable[[], Dict[str, SqlQuery]],
+    assemble: Callable[[Dict[str, Any]], Dict[str, Any]],
+    empty: Callable[[], Dict[str, Any]]
+) -> Dict[str, Any]:
+    """run_sql_calculation 的异步版本，参数与返回值相同"""
+    engine = get_async_db_engine()
+    if engine is None:
+        return await asyncio.to_thread(run_sql_calculation, label, build_queries, assemble, empty)
+
+    start_total = time.time()
+    try:
+        results = await run_queries_async(engine, build_queries())
+        logger.info(f"[Perf] {label} 异步并发查询耗时: {time.time() - start_total:.2f}s")
+        response = assemble(results)
+        logger.info(f"[Perf] {label} 总计耗时: {time.time() - start_total:.2f}s")
+        return response
+    except Exception as e:
+        logger.error(f"SQL 计算 {label} 数据失败: {str(e)}\n{traceback.format_exc()}")
+        return empty()
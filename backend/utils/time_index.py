@@ -0,0 +1,58 @@
+"""
+按时间窗口切片
+加载器 (load_table / load_table_async) 返回的 DataFrame 按 Timestamp(UTC+8) 升序排列，
+时间窗口用 searchsorted 二分定位行号后 iloc 切片，得到共享底层数据的视图，
+不再对整列做布尔比较，也不复制整张表。
+
+视图只读使用；需要修改时由调用方显式 .copy()。
+输入未排序时 (如外部构造的 DataFrame) 回退到布尔掩码，结果正确但会复制。
+"""
+from typing import Optional, Tuple
+import numpy as np
+import pandas as pd
+
+TIMESTAMP_COL = 'Timestamp(UTC+8)'
+
+
+def _is_sorted(df: pd.DataFrame, timestamp_col: str) -> bool:
+    return df[timestamp_col].is_monotonic_increasing
+
+
+def time_bounds(
+    df: pd.DataFrame,
+    start: Optional[pd.Timestamp] = None,
+    end: Optional[pd.Timestamp] = None,
+    timestamp_col: str = TIMESTAMP_COL
+) -> Tuple[int, int]:
+    """
+    在已排序的 DataFrame 中定位 [start, end) 的行号区间
+
+    Returns:
+        (起始行号, 结束行号)，可直接用于 df.iloc[i:j]
+    """
+    values = df[timestamp_col].to_numpy(dtype='datetime64[ns]')
+    i = int(np.searchsorted(values, np.datetime64(pd.Timestamp(start)), side='left')) if start is not None else 0
+    j = int(np.searchsorted(values, np.datetime64(pd.Timestamp(end)), side='left')) if end is not None else len(values)
+    return i, max(i, j)
+
+
+def time_slice(
+    df: pd.DataFrame,
+    start: Optional[pd.Timestamp] = None,
+    end: Optional[pd.Timestamp] = None,
+    timestamp_col: str = TIMESTAMP_COL
+) -> pd.DataFrame:
+    """返回 [start, end) 时间窗口内的行 (已排序时为不复制的视图)"""
+    if len(df) == 0:
+        return df
+    if not _is_sorted(df, timestamp_col):
+        ts = df[timestamp_col]
+        mask = pd.Series(True, index=df.index)
+        if start is not None:
+            mask &= ts >= start
+        if end is not None:
+            mask &= ts < end
+        return df[mask]
+    i, j = time_bounds(df, start, end, timestamp_col)
+    return df.iloc[i:j]
+
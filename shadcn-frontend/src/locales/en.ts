@@ -166,6 +166,8 @@ export const enTranslations = {
             TS_LOGIC_ERROR: 'TS Logic Discrepancy',
             POS_DUPLICATE: 'POS Duplicate Claim',
             STAKING_DUPLICATE: 'Staking Duplicate Claim',
+            CROSS_MODULE_DUPLICATE: 'Cross-Module Duplicate Claim',
+            CROSS_MODULE_ANOMALY: 'Cross-Module Same-Day Anomaly',
         },
         typeDescriptions: {
             TS_LUCKY_DRAW_OVER: 'Critical Error: Lucky draws {draws} (Limit: 3)',
@@ -173,6 +175,8 @@ export const enTranslations = {
             TS_LOGIC_ERROR: 'Logic Error: {claims} claims with {draws} draws',
             POS_DUPLICATE: 'POS duplicate claims: {count} times (Amounts: {amounts})',
             STAKING_DUPLICATE: 'Staking duplicate claims: {count} times (Amounts: {amounts})',
+            CROSS_MODULE_DUPLICATE: 'Duplicate claims in POS ({posClaims}) and Staking ({stakingClaims}) on the same day (TS {claims} claims / {draws} draws, ShitCode {shitcodeClaims})',
+            CROSS_MODULE_ANOMALY: 'Duplicate reward claims (POS {posClaims}, Staking {stakingClaims}) with TS over limit ({claims} claims / {draws} draws)',
         },
         levels: {
             high: 'High',
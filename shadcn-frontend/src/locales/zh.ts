@@ -166,6 +166,8 @@ export const zhTranslations = {
             TS_LOGIC_ERROR: 'TS 抽奖逻辑不匹配',
             POS_DUPLICATE: 'POS 当日重复领取',
             STAKING_DUPLICATE: '质押奖励重复领取',
+            CROSS_MODULE_DUPLICATE: '跨模块重复领取',
+            CROSS_MODULE_ANOMALY: '跨模块同日异常',
         },
         typeDescriptions: {
             TS_LUCKY_DRAW_OVER: '严重错误: 抽奖次数溢出 ({draws}次, 标准上限3次)',
@@ -173,6 +175,8 @@ export const zhTranslations = {
             TS_LOGIC_ERROR: '抽奖逻辑不匹配: 领取{claims}次但抽奖{draws}次 (未达预期收益)',
             POS_DUPLICATE: 'POS 同日重复领取: {count}次 (金额: {amounts})',
             STAKING_DUPLICATE: '质押奖励同日重复领取: {count}次 (金额: {amounts})',
+            CROSS_MODULE_DUPLICATE: '跨模块重复领取: 同日 POS {posClaims}次、质押 {stakingClaims}次 (TS 领取{claims}次/抽奖{draws}次, ShitCode {shitcodeClaims}次)',
+            CROSS_MODULE_ANOMALY: '跨模块同日异常: 奖励重复领取 (POS {posClaims}次, 质押 {stakingClaims}次) 且 TS 超限 (领取{claims}次/抽奖{draws}次)',
         },
         levels: {
             high: '高风险',